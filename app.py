@@ -1,38 +1,79 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_file, abort
 import os
-import socket
+import re
+import base64
+import hmac
+import io
+import multiprocessing
+import queue
 from datetime import datetime
 from werkzeug.utils import secure_filename
+import sys
 import threading
 import time
-from qr_window import show_qr_code
-from update_checker import check_for_updates, prompt_update
-from ebay_config import load_config, save_config, is_configured, load_defaults, save_defaults
-from ebay_uploader import eBayUploader
+from ebay_config import load_config, save_config, is_configured, load_defaults, save_defaults, load_storage_settings, save_storage_settings, list_accounts, default_account, set_default_account, delete_account, load_network_settings, save_network_settings
+from ebay_accounts import get_account_pool, UnknownAccountError
+from listing_validator import validate_listing, MAX_DESCRIPTION_LENGTH, MAX_IMAGES
+from ebay_taxonomy import get_taxonomy_cache
+from image_catalog import ImageCatalog
+from card_grouping import DraftGrouper
+from storage_maintenance import StorageMaintenance
+from image_serving import ImageServer, CACHE_MAX_AGE
+from image_quality import QualityAnalyzer, WARNINGS as QUALITY_WARNINGS
+from card_crop import CropProcessor, crop_path
+from duplicate_index import DuplicateIndex
+from listing_outbox import ListingOutbox, is_connectivity_error
+from listing_revisions import ListingReviser
+from listing_templates import TemplateError, compile_template, render_batch, templates_from_defaults
+from lot_collage import CollageBuilder, collage_path
+from listing_dedup import SingleFlight, listing_fingerprint
+from live_profiler import LiveProfiler
+from network_identity import NetworkIdentity
+from price_comps import get_price_comps, SOLD_HISTORY_FILE
 app = Flask(__name__)
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
+PORT = 5000
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'heic', 'heif'}
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
 
+# Phones downscale and re-encode before uploading (see /upload/config)
+CLIENT_MAX_DIMENSION = 2400  # Longest edge in pixels, plenty for eBay zoom
+CLIENT_JPEG_QUALITY = 0.85
+CLIENT_UPLOAD_CONCURRENCY = 3
+
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
 # Create uploads directory if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Index of uploaded images and the per-card draft queue built from them
+catalog = ImageCatalog(UPLOAD_FOLDER)
+grouper = DraftGrouper(catalog)
+maintenance = StorageMaintenance(catalog, grouper)
+image_server = ImageServer(catalog)
+quality = QualityAnalyzer(catalog)
+cropper = CropProcessor(catalog)
+duplicates = DuplicateIndex(catalog)
+reviser = ListingReviser(catalog)
+# Listings recorded before multi-account support belong to the default account
+catalog.assign_default_account(default_account())
+collages = CollageBuilder(catalog, image_server)
+submissions = SingleFlight()
+profiler = LiveProfiler(UPLOAD_FOLDER)
+
+# LAN address, detected once and kept current by a background watcher
+network_settings = load_network_settings()
+network = NetworkIdentity(PORT, network_settings['mdns_hostname'] if network_settings.get('mdns_enabled') else None)
+# Listings accepted while eBay is unreachable, sent when it comes back; their
+# image URLs are built from the LAN address at send time
+outbox = ListingOutbox(catalog, grouper, network.ip_url)
+
 def get_local_ip():
-    """Get the local IP address of the machine"""
-    try:
-        # Create a socket to determine the local IP
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except Exception:
-        return "127.0.0.1"
+    """Get the local IP address of the machine (cached; no socket calls)"""
+    return network.address
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -45,6 +86,16 @@ def index():
 def settings():
     return render_template('settings.html')
 
+@app.route('/upload/config')
+def upload_config():
+    """Target size and concurrency the phone page should upload with"""
+    return jsonify({
+        'max_dimension': CLIENT_MAX_DIMENSION,
+        'quality': CLIENT_JPEG_QUALITY,
+        'concurrency': CLIENT_UPLOAD_CONCURRENCY,
+        'max_bytes': MAX_CONTENT_LENGTH
+    })
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     if 'file' not in request.files:
@@ -62,8 +113,23 @@ def upload_file():
         name, ext = os.path.splitext(original_filename)
         filename = f"{timestamp}_{name}{ext}"
         
+        # Parallel uploads often share a name (e.g. image.jpg) within the same second
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        counter = 1
+        while True:
+            try:
+                with open(filepath, 'xb') as f:
+                    file.save(f)
+                break
+            except FileExistsError:
+                filename = f"{timestamp}_{name}_{counter}{ext}"
+                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+                counter += 1
+        
+        catalog.add_image(filename)
+        grouper.submit(filename)
+        quality.submit(filename)
+        duplicates.submit(filename)
         
         return jsonify({'success': True, 'filename': filename}), 200
     
@@ -71,41 +137,174 @@ def upload_file():
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """Serve an upload with strong validators so clients only download it once
+
+    send_file handles If-None-Match / If-Modified-Since (304) and Range
+    (206) requests. Clients that accept WebP get a smaller derivative
+    once it has been generated in the background.
+    """
+    filename = secure_filename(filename)
+    filepath = os.path.abspath(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+    if not os.path.isfile(filepath):
+        abort(404)
+    
+    etag = image_server.content_hash(filename, filepath)
+    webp_path = image_server.webp_variant(filename, request.headers.get('Accept'))
+    if webp_path:
+        path, mimetype, etag = os.path.abspath(webp_path), 'image/webp', f"{etag}-webp"
+    else:
+        path, mimetype = filepath, None
+    
+    # While a WebP is being generated, let the client come back for it soon
+    final = not image_server.is_pending(filename)
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=etag,
+                         last_modified=os.path.getmtime(filepath),
+                         max_age=CACHE_MAX_AGE if final else 60)
+    response.cache_control.public = True
+    response.cache_control.immutable = final
+    response.vary.add('Accept')
+    return response
+
+@app.route('/uploads/crops/<filename>')
+def cropped_file(filename):
+    """Deskewed card crop written by the crop processor"""
+    filename = secure_filename(filename)
+    path = os.path.abspath(crop_path(app.config['UPLOAD_FOLDER'], filename))
+    if not os.path.isfile(path):
+        abort(404)
+    return send_file(path, mimetype='image/jpeg', conditional=True, max_age=3600)
+
+@app.route('/uploads/collages/<filename>')
+def collage_file(filename):
+    """Lot collage written by the collage builder"""
+    filename = secure_filename(filename)
+    path = os.path.abspath(collage_path(app.config['UPLOAD_FOLDER'], filename))
+    if not os.path.isfile(path):
+        abort(404)
+    # Names are content hashes, so a collage never changes once written
+    return send_file(path, mimetype='image/jpeg', conditional=True, max_age=CACHE_MAX_AGE)
+
+@app.route('/collages', methods=['POST'])
+def build_collage():
+    """Grid collage of the given images for a lot listing
+
+    Body: {images: [...], labels: true | false | [...], columns: N (optional)}
+    """
+    data = request.json or {}
+    images = [secure_filename(name) for name in data.get('images') or []]
+    try:
+        result = collages.build(images, columns=data.get('columns'), labels=data.get('labels', True))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"Collage error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    return jsonify({'success': True, **result})
+
+@app.route('/crops', methods=['GET', 'POST'])
+def crops():
+    """GET: crop batch status. POST: crop every image not processed yet"""
+    if request.method == 'POST':
+        data = request.json if request.is_json else {}
+        images = data.get('images')
+        if images is not None and not isinstance(images, list):
+            return jsonify({'success': False, 'error': 'images must be a list of filenames'}), 400
+        try:
+            started = cropper.start(filenames=images, force=bool(data.get('force')))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if not started:
+            return jsonify({'success': False, 'error': 'A crop batch is already running'}), 409
+        return jsonify({'success': True})
+    return jsonify({'running': cropper.running, 'pending': len(cropper.pending()),
+                    'last_summary': cropper.last_summary})
 
 @app.route('/images')
 def list_images():
-    files = []
-    if os.path.exists(UPLOAD_FOLDER):
-        files = [f for f in os.listdir(UPLOAD_FOLDER) 
-                if allowed_file(f)]
-        files.sort(reverse=True)  # Most recent first
-    return jsonify({'images': files})
+    """List uploads from the catalog, most recent first
+
+    ?since=<token>  only the additions/updates/deletions after a previous token
+                    (reset: true means the client must reload everything)
+    ?limit=N&cursor=<cursor>  one page of the full list; pass next_cursor
+                    back to continue
+    Every response carries the current change token.
+    """
+    since = request.args.get('since', type=int)
+    if since is not None:
+        delta = catalog.changes_since(since)
+        if delta is None:
+            return jsonify({'reset': True, 'token': catalog.change_token()})
+        added, updated, deleted, token = delta
+        return jsonify({'reset': False, 'added': added, 'updated': updated, 'deleted': deleted, 'token': token})
+    
+    # Read the token first so changes made while paging show up in the next delta
+    token = catalog.change_token()
+    limit = request.args.get('limit', type=int)
+    if not limit:
+        return jsonify({'images': catalog.list_filenames(), 'token': token})
+    
+    limit = max(1, min(limit, 1000))
+    cursor = request.args.get('cursor')
+    try:
+        after = base64.urlsafe_b64decode(cursor.encode()).decode() if cursor else None
+    except (ValueError, UnicodeDecodeError):
+        return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+    files = catalog.page(limit, after)
+    next_cursor = None
+    if len(files) == limit:
+        next_cursor = base64.urlsafe_b64encode(files[-1].encode()).decode()
+    return jsonify({'images': files, 'next_cursor': next_cursor, 'token': token})
+
+@app.route('/images/quality')
+def images_quality():
+    """Quality scores for ?names=a,b or every image with warnings"""
+    names = request.args.get('names')
+    scores = catalog.get_quality(names.split(',') if names else None)
+    return jsonify({'quality': scores, 'messages': QUALITY_WARNINGS})
+
+@app.route('/images/<filename>/similar')
+def similar_images(filename):
+    """Near-duplicate photos (current and archived) by perceptual hash"""
+    filename = secure_filename(filename)
+    if duplicates.hash_of(filename) is None:
+        return jsonify({'success': False, 'error': 'Image not indexed yet'}), 404
+    radius = max(0, min(request.args.get('radius', 10, type=int), 20))
+    return jsonify({'success': True, 'similar': duplicates.similar(filename, radius=radius)})
 
 @app.route('/delete/<filename>', methods=['DELETE'])
 def delete_file(filename):
     try:
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(filename))
+        filename = secure_filename(filename)
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         if os.path.exists(filepath):
             os.remove(filepath)
+            grouper.remove_image(filename)
+            image_server.remove_derivatives(filename)
+            duplicates.remove(filename)
             return jsonify({'success': True}), 200
         return jsonify({'success': False, 'error': 'File not found'}), 404
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def account_status(account):
+    config = load_config(account)
+    # Don't send sensitive data to client, just check if configured
+    return {
+        'account': account,
+        'configured': is_configured(account),
+        'authenticated': bool(config.get('user_token')),
+        'environment': config.get('environment', 'sandbox')
+    }
+
 @app.route('/ebay/config', methods=['GET', 'POST'])
 def ebay_config():
+    """GET/POST one seller account's credentials; ?account= (or "account" in the body) picks it"""
     if request.method == 'GET':
-        config = load_config()
-        # Don't send sensitive data to client, just check if configured
-        return jsonify({
-            'configured': is_configured(),
-            'authenticated': bool(config.get('user_token')),
-            'environment': config.get('environment', 'sandbox')
-        })
+        return jsonify(account_status(request.args.get('account') or default_account()))
     
     elif request.method == 'POST':
         data = request.json
+        account = (data.get('account') or default_account()).strip()
         config = {
             'app_id': data.get('app_id'),
             'dev_id': data.get('dev_id'),
@@ -113,16 +312,45 @@ def ebay_config():
             'environment': data.get('environment', 'sandbox')
         }
         
-        if save_config(config):
+        if save_config(config, account):
+            get_account_pool().forget(account)
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'error': 'Failed to save config'}), 500
 
+@app.route('/ebay/accounts', methods=['GET', 'POST'])
+def ebay_accounts():
+    """GET: every seller account with its status and call budget use
+    
+    POST {name, default: true} makes an account the default, creating it if needed.
+    """
+    if request.method == 'POST':
+        data = request.json or {}
+        name = (data.get('name') or '').strip()
+        if not name:
+            return jsonify({'success': False, 'error': 'No account name given'}), 400
+        if data.get('default'):
+            if not set_default_account(name):
+                return jsonify({'success': False, 'error': 'Failed to save config'}), 500
+        elif name not in list_accounts() and not save_config(load_config(name), name):
+            return jsonify({'success': False, 'error': 'Failed to save config'}), 500
+        return jsonify({'success': True})
+    budgets = get_account_pool().stats()
+    accounts = [{**account_status(name), 'budget': budgets.get(name)} for name in list_accounts()]
+    return jsonify({'default': default_account(), 'accounts': accounts})
+
+@app.route('/ebay/accounts/<name>', methods=['DELETE'])
+def remove_ebay_account(name):
+    if not delete_account(name):
+        return jsonify({'success': False, 'error': 'Account not found or is the default'}), 400
+    get_account_pool().forget(name)
+    return jsonify({'success': True})
+
 @app.route('/ebay/login')
 def ebay_login():
     """Initiate eBay OAuth login"""
     try:
-        uploader = eBayUploader()
+        uploader = get_account_pool().uploader(request.args.get('account'))
         auth_url = uploader.get_auth_url()
         return jsonify({'success': True, 'auth_url': auth_url})
     except Exception as e:
@@ -143,7 +371,12 @@ def exchange_token():
         if not code:
             return jsonify({'success': False, 'error': 'No code provided'}), 400
         
-        uploader = eBayUploader()
+        # The login page may only know the OAuth state; find the account that issued it
+        account = data.get('account')
+        if not account and data.get('state'):
+            account = next((name for name in list_accounts()
+                            if load_config(name).get('oauth_state') == data['state']), None)
+        uploader = get_account_pool().uploader(account)
         uploader.exchange_code_for_token(code)
         
         return jsonify({'success': True})
@@ -154,40 +387,343 @@ def exchange_token():
 
 @app.route('/ebay/create-listing', methods=['POST'])
 def create_ebay_listing():
-    if not is_configured():
+    data = request.json or {}
+    try:
+        # Listings go out on the chosen seller account, or the default one
+        account = get_account_pool().resolve(data.get('account'))
+    except UnknownAccountError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not is_configured(account):
         return jsonify({'success': False, 'error': 'eBay not configured'}), 400
     
     try:
-        data = request.json
         print(f"Received listing data: {data}")  # Debug log
         
-        # Get image URLs (convert local paths to URLs)
-        image_filenames = data.get('images', [])
-        image_urls = [f"http://{get_local_ip()}:5000/uploads/{img}" for img in image_filenames]
+        # Reject bad payloads locally before any eBay round trip
+        cleaned, errors = validate_listing(data)
+        if not errors:
+            # Required item specifics are only checked when the category is cached
+            missing = get_taxonomy_cache().missing_required_aspects(cleaned['category_id'], cleaned['aspects'])
+            if missing:
+                errors['aspects'] = f"Missing required item specifics: {', '.join(missing)}"
+        if errors:
+            return jsonify({'success': False, 'error': 'Invalid listing', 'errors': errors}), 400
+        
+        # Image paths on this server; the outbox keeps these and rebuilds the URLs when it sends
+        image_filenames = cleaned['images']
+        image_paths = [cropper.listing_path(img) for img in image_filenames]
+        if data.get('collage'):
+            # Lots lead with the collage; eBay keeps at most MAX_IMAGES photos
+            collage = secure_filename(data['collage'])
+            if not collages.exists(collage):
+                return jsonify({'success': False, 'error': 'Collage not found; build it again'}), 400
+            image_paths = [f"uploads/collages/{collage}"] + image_paths[:MAX_IMAGES - 1]
+        base_url = network.ip_url()
         
         listing_data = {
-            'title': data.get('title'),
-            'description': data.get('description'),
-            'price': float(data.get('price')),
-            'quantity': int(data.get('quantity', 1)),
-            'category_id': data.get('category_id'),
-            'condition': data.get('condition', 'NEW'),
-            'image_urls': image_urls
+            'title': cleaned['title'],
+            'description': cleaned['description'],
+            'price': cleaned['price'],
+            'quantity': cleaned['quantity'],
+            'category_id': cleaned['category_id'],
+            'condition': cleaned['condition'],
+            'aspects': cleaned['aspects'],
+            'image_paths': image_paths,
+            'image_urls': [f"{base_url}/{path}" for path in image_paths]
         }
         
-        print(f"Creating listing with data: {listing_data}")  # Debug log
-        
-        uploader = eBayUploader()
-        result = uploader.create_listing(listing_data)
-        
-        print(f"Listing created successfully: {result}")  # Debug log
-        return jsonify({'success': True, 'result': result})
+        # Identical submissions (double taps, client retries) share one eBay pipeline run
+        image_hashes = listing_image_hashes(image_filenames)
+        if data.get('collage'):
+            image_hashes.insert(0, secure_filename(data['collage']))  # Named by content already
+        key = listing_fingerprint({**listing_data, 'account': account}, image_hashes)
+        (payload, status), shared = submissions.do(
+            key, lambda: submit_listing(listing_data, image_filenames, data, account),
+            cacheable=lambda result: result[1] < 400)
+        if shared:
+            print(f"Duplicate submission answered from the first one: {payload}")  # Debug log
+            payload = {**payload, 'duplicate_submission': True}
+        return jsonify(payload), status
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
         print(f"Error creating listing:\n{error_trace}")  # Full error log
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def listing_image_hashes(image_filenames):
+    """Content hashes of the photos, falling back to the name for missing files"""
+    hashes = []
+    for img in image_filenames:
+        path = os.path.join(app.config['UPLOAD_FOLDER'], img)
+        hashes.append(image_server.content_hash(img, path) if os.path.isfile(path) else img)
+    return hashes
+
+def submit_listing(listing_data, image_filenames, data, account):
+    """Run the eBay pipeline for a validated listing; returns (payload, status)"""
+    # Warn before listing a card whose photos match an earlier listing
+    if not data.get('allow_duplicates'):
+        matches = duplicates.listed_duplicates(image_filenames)
+        if matches:
+            return {'success': False, 'error': 'Possible duplicate listing', 'duplicates': matches}, 409
+    
+    print(f"Creating listing with data: {listing_data}")  # Debug log
+    
+    # Don't make the operator wait on timeouts while we know eBay is unreachable
+    if outbox.offline:
+        return queue_listing(listing_data, data.get('draft_id'), account)
+    
+    uploader = get_account_pool().uploader(account)
+    # Steps that succeeded, so the outbox resumes instead of creating a second offer
+    progress = {}
+    try:
+        result = uploader.create_listing(listing_data, progress)
+    except Exception as e:
+        if not is_connectivity_error(e):
+            raise
+        print(f"eBay unreachable, queueing listing: {e}")
+        outbox.offline = True
+        return queue_listing(listing_data, data.get('draft_id'), account, progress)
+    
+    print(f"Listing created successfully: {result}")  # Debug log
+    catalog.record_listing(listing_data, result, data.get('draft_id'), account=account)
+    if data.get('draft_id'):
+        grouper.set_status(data['draft_id'], 'listed')
+    return {'success': True, 'result': result}, 200
+
+def queue_listing(listing_data, draft_id, account, progress=None):
+    entry_id = outbox.enqueue(listing_data, draft_id, account, progress)
+    return {'success': True, 'queued': True, 'outbox_id': entry_id}, 202
+
+@app.route('/outbox')
+def outbox_status():
+    """Listings waiting for connectivity, plus recent sends and failures"""
+    return jsonify(outbox.status(limit=min(request.args.get('limit', 50, type=int), 500)))
+
+@app.route('/outbox/flush', methods=['POST'])
+def flush_outbox():
+    """Try every pending listing now instead of waiting out the backoff"""
+    threading.Thread(target=outbox.flush, kwargs={'force': True}, daemon=True).start()
+    return jsonify({'success': True})
+
+@app.route('/outbox/<int:entry_id>', methods=['POST'])
+def update_outbox_entry(entry_id):
+    action = (request.json or {}).get('action')
+    if action == 'retry':
+        changed = outbox.retry(entry_id)
+    elif action == 'discard':
+        changed = outbox.discard(entry_id)
+    else:
+        return jsonify({'success': False, 'error': 'action must be retry or discard'}), 400
+    if not changed:
+        return jsonify({'success': False, 'error': 'Outbox entry not found or already sent'}), 404
+    return jsonify({'success': True})
+
+@app.route('/listings')
+def list_listings():
+    """Listings published from this app, used as the input for bulk revisions"""
+    return jsonify({'listings': catalog.list_listings()})
+
+@app.route('/listings/revise', methods=['POST'])
+def revise_listings():
+    """Apply price/quantity rules to recorded listings; dry_run (default) only returns the diff"""
+    data = request.json or {}
+    rules = data.get('rules') or []
+    if not rules:
+        return jsonify({'success': False, 'error': 'No rules given'}), 400
+    try:
+        # Revise one seller account's listings, or every account's
+        account = get_account_pool().resolve(data['account']) if data.get('account') else None
+        if data.get('dry_run', True):
+            return jsonify({'success': True, 'dry_run': True, **reviser.preview(rules, account)})
+        return jsonify({'success': True, 'dry_run': False, **reviser.apply(rules, account)})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/drafts')
+def list_drafts():
+    """Per-card drafts waiting to be listed, oldest first"""
+    statuses = request.args.get('status', 'open,ready').split(',')
+    return jsonify({'drafts': grouper.list_drafts(statuses)})
+
+@app.route('/drafts/<int:draft_id>', methods=['POST'])
+def update_draft(draft_id):
+    """Review actions: set card fields or status, or merge this draft into another one"""
+    data = request.json or {}
+    try:
+        if isinstance(data.get('fields'), dict) and not grouper.set_fields(draft_id, data['fields']):
+            return jsonify({'success': False, 'error': 'Draft not found'}), 404
+        if data.get('merge_into'):
+            grouper.merge(draft_id, int(data['merge_into']))
+        if data.get('status') and not grouper.set_status(draft_id, data['status']):
+            return jsonify({'success': False, 'error': 'Draft not found'}), 404
+        return jsonify({'success': True})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/drafts/render', methods=['GET', 'POST'])
+def render_drafts():
+    """Titles and descriptions for the whole draft queue from the saved templates
+
+    POST may pass title_template/description_template to preview unsaved ones.
+    """
+    data = request.json if request.method == 'POST' else {}
+    title_template, description_template = templates_from_defaults({**load_defaults(), **(data or {})})
+    statuses = request.args.get('status', 'open,ready').split(',')
+    drafts = grouper.list_drafts(statuses)
+    try:
+        started = time.perf_counter()
+        rendered = render_batch([d['fields'] for d in drafts], title_template, description_template)
+        seconds = time.perf_counter() - started
+    except TemplateError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'drafts': [{'id': d['id'], **r} for d, r in zip(drafts, rendered)],
+        'render_ms': round(seconds * 1000, 3)
+    })
+
+@app.route('/drafts/move', methods=['POST'])
+def move_draft_image():
+    """Move an image to another draft, or into a new draft of its own"""
+    data = request.json or {}
+    if not catalog.get_image(data.get('filename', '')):
+        return jsonify({'success': False, 'error': 'File not found'}), 404
+    try:
+        draft_id = grouper.move_image(data['filename'], data.get('draft_id'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    return jsonify({'success': True, 'draft_id': draft_id})
+
+def sync_catalog():
+    """Index files added or removed while the app wasn't running"""
+    added, removed = catalog.sync_folder(allowed_file)
+    for filename in removed:
+        grouper.remove_image(filename)
+    for filename in added:
+        grouper.submit(filename)
+    grouper.start()
+    for filename in quality.pending():
+        quality.submit(filename)
+    for filename in duplicates.pending():
+        duplicates.submit(filename)
+
+@app.route('/ebay/categories')
+def search_categories():
+    """Autocomplete categories from the local taxonomy cache"""
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify({'categories': get_taxonomy_cache().search(query, limit=limit)})
+
+@app.route('/ebay/categories/<category_id>')
+def category_details(category_id):
+    """Category info plus item aspects (fetched once, then served from cache)"""
+    cache = get_taxonomy_cache()
+    fetch = is_configured() and request.args.get('fetch', '1') != '0'
+    return jsonify({
+        'category': cache.get_category(category_id),
+        'aspects': cache.get_aspects(category_id, fetch=fetch)
+    })
+
+@app.route('/ebay/categories/refresh', methods=['POST'])
+def refresh_categories():
+    try:
+        force = bool((request.json or {}).get('force')) if request.is_json else False
+        updated = get_taxonomy_cache().refresh(force=force)
+        return jsonify({'success': True, 'updated': updated, 'status': get_taxonomy_cache().status()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/ebay/categories/status')
+def categories_status():
+    return jsonify(get_taxonomy_cache().status())
+
+def refresh_taxonomy_in_background():
+    """Keep the category cache warm without delaying startup"""
+    try:
+        if is_configured() and load_config().get('user_token'):
+            get_taxonomy_cache().refresh()
+    except Exception as e:
+        print(f"Could not refresh category cache: {e}")
+
+@app.route('/storage')
+def storage_status():
+    """Disk usage of the uploads folder and the last maintenance report"""
+    return jsonify({'usage': maintenance.usage(), 'last_report': maintenance.last_report})
+
+@app.route('/storage/maintenance', methods=['POST'])
+def run_storage_maintenance():
+    try:
+        return jsonify({'success': True, 'report': maintenance.run()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/settings/storage', methods=['GET', 'POST'])
+def settings_storage():
+    if request.method == 'GET':
+        return jsonify(load_storage_settings())
+    
+    data = request.json or {}
+    settings = load_storage_settings()
+    try:
+        for key in settings:
+            if key in data:
+                settings[key] = max(0, int(data[key]))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Storage settings must be whole numbers'}), 400
+    
+    if save_storage_settings(settings):
+        return jsonify({'success': True})
+    return jsonify({'success': False, 'error': 'Failed to save storage settings'}), 500
+
+@app.route('/network')
+def network_status():
+    """Current LAN address and upload URL; phones and the QR window follow changes"""
+    return jsonify(network.status())
+
+@app.route('/settings/network', methods=['GET', 'POST'])
+def settings_network():
+    """mDNS hostname settings; changes apply on the next start"""
+    if request.method == 'GET':
+        return jsonify(load_network_settings())
+    
+    data = request.json or {}
+    settings = load_network_settings()
+    if 'mdns_enabled' in data:
+        settings['mdns_enabled'] = bool(data['mdns_enabled'])
+    if 'mdns_hostname' in data:
+        hostname = str(data['mdns_hostname']).strip().lower()
+        if not re.fullmatch(r'[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?', hostname):
+            return jsonify({'success': False, 'error': 'Hostname may only use letters, digits and dashes'}), 400
+        settings['mdns_hostname'] = hostname
+    
+    if save_network_settings(settings):
+        return jsonify({'success': True})
+    return jsonify({'success': False, 'error': 'Failed to save network settings'}), 500
+
+@app.route('/comps/import', methods=['POST'])
+def import_sold_history():
+    """Import a sold-listing CSV uploaded as 'file' (the desktop window imports directly)"""
+    if 'file' not in request.files:
+        return jsonify({'success': False, 'error': 'No CSV file provided'}), 400
+    upload = request.files['file']
+    try:
+        text = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        result = get_price_comps().import_csv(text, secure_filename(upload.filename or '') or 'upload')
+    except (ValueError, UnicodeDecodeError, OSError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, **result})
+
+@app.route('/comps/suggest')
+def suggest_price():
+    """Price range of past sales matching ?title=; cheap enough to call per keystroke"""
+    return jsonify(get_price_comps().suggest(request.args.get('title', '')))
+
+@app.route('/comps/status')
+def comps_status():
+    return jsonify(get_price_comps().status())
+
 @app.route('/settings/defaults', methods=['GET', 'POST'])
 def settings_defaults():
     if request.method == 'GET':
@@ -196,39 +732,149 @@ def settings_defaults():
     
     elif request.method == 'POST':
         data = request.json
+        # Reject broken templates now rather than when the queue is rendered
+        try:
+            if data.get('title_template'):
+                compile_template(data['title_template'])
+            if data.get('description_template'):
+                compile_template(data['description_template'], MAX_DESCRIPTION_LENGTH)
+        except TemplateError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         if save_defaults(data):
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'error': 'Failed to save defaults'}), 500
 
+# Profiling endpoints answer the machine itself only, unless PROFILING_TOKEN
+# is set and the caller sends it in an X-Profiling-Token header
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN')
+
+def profiling_allowed():
+    if PROFILING_TOKEN:
+        token = request.headers.get('X-Profiling-Token')
+        if not token:
+            return False
+        # Constant-time, so response timing doesn't leak the token
+        return hmac.compare_digest(token.encode('utf-8'), PROFILING_TOKEN.encode('utf-8'))
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@app.before_request
+def profile_request_start():
+    if request.path.startswith('/debug/'):
+        if not profiling_allowed():
+            abort(403)
+        return None
+    profiler.request_started()
+
+@app.teardown_request
+def profile_request_end(exc):
+    profiler.request_finished()
+
+@app.route('/debug/profile', methods=['GET', 'POST'])
+def debug_profile():
+    """GET: session status and saved files. POST {seconds, mode: sample|cprofile}: start a session"""
+    if request.method == 'GET':
+        return jsonify(profiler.status())
+    data = request.json or {}
+    try:
+        started = profiler.start(data.get('seconds', 30), mode=data.get('mode', 'sample'),
+                                 interval=data.get('interval', 0.005))
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not started:
+        return jsonify({'success': False, 'error': 'A profiling session is already running'}), 409
+    return jsonify({'success': True, **profiler.status()})
+
+@app.route('/debug/profile/stop', methods=['POST'])
+def debug_profile_stop():
+    """End the running session now; poll GET /debug/profile for its result"""
+    profiler.stop()
+    return jsonify({'success': True})
+
+@app.route('/debug/memory', methods=['POST'])
+def debug_memory():
+    """{action: snapshot (default) | stop}: top allocation growth since the previous snapshot"""
+    action = (request.json or {}).get('action', 'snapshot') if request.is_json else 'snapshot'
+    if action == 'stop':
+        profiler.stop_tracemalloc()
+        return jsonify({'success': True})
+    if action != 'snapshot':
+        return jsonify({'success': False, 'error': 'action must be snapshot or stop'}), 400
+    return jsonify({'success': True, **profiler.snapshot()})
+
+@app.route('/debug/stacks')
+def debug_stacks():
+    """Every thread's current stack; ?download=1 returns the saved text file"""
+    result = profiler.dump_stacks()
+    if request.args.get('download'):
+        return send_file(profiler.path(result['file']), mimetype='text/plain', as_attachment=True)
+    return app.response_class(result['text'], mimetype='text/plain')
+
+@app.route('/debug/files/<filename>')
+def debug_file(filename):
+    """Download a profile, memory report or stack dump"""
+    path = os.path.abspath(profiler.path(secure_filename(filename)))
+    if not os.path.isfile(path):
+        abort(404)
+    mimetype = 'application/octet-stream' if path.endswith('.prof') else 'text/plain'
+    return send_file(path, mimetype=mimetype, as_attachment=True)
+
 def run_flask():
     """Run Flask server in background thread"""
-    app.run(debug=False, host='0.0.0.0', port=5000, use_reloader=False)
+    app.run(debug=False, host='0.0.0.0', port=PORT, use_reloader=False)
 
-if __name__ == '__main__':
-    # Check for updates on startup
+def check_for_updates_in_background(results):
+    """Check GitHub for a newer release without holding up startup
+
+    Puts the update info (None if there's nothing newer) on results; the Tk
+    window asks the user, since a prompt can't be shown from this thread.
+    """
+    from update_checker import check_for_updates
     print("\n🔍 Checking for updates...")
     update_info = check_for_updates()
     if update_info and update_info.get('available'):
-        prompt_update(update_info)
+        results.put(update_info)
     else:
         print("✅ You're running the latest version!\n")
+        results.put(None)
+
+if __name__ == '__main__':
+    # Required for the crop process pool in the packaged app
+    multiprocessing.freeze_support()
+    # --headless serves without the window or update check (startup benchmark, servers)
+    headless = '--headless' in sys.argv
     
-    # Get local IP address
-    local_ip = get_local_ip()
-    port = 5000
-    url = f"http://{local_ip}:{port}"
+    # Watch for network changes (and advertise the mDNS name if enabled)
+    network.start()
+    url = network.url()
     
     print(f"\n{'='*50}")
     print(f"🚀 Server starting at: {url}")
     print(f"{'='*50}\n")
     
+    threading.Thread(target=refresh_taxonomy_in_background, daemon=True).start()
+    sync_catalog()
+    maintenance.start()
+    outbox.start()
+    # Build the comps index now so the first price lookup doesn't wait for it
+    if SOLD_HISTORY_FILE.exists():
+        get_price_comps().rebuild()
+    
+    if headless:
+        run_flask()
+        sys.exit(0)
+    
     # Run Flask in a background thread
     flask_thread = threading.Thread(target=run_flask, daemon=True)
     flask_thread.start()
+    update_results = queue.Queue()
+    threading.Thread(target=check_for_updates_in_background, args=(update_results,), daemon=True).start()
+    
+    # tkinter, qrcode and PIL.ImageTk load while Flask binds instead of before it
+    from qr_window import show_qr_code
     
     # Give Flask a moment to start
     time.sleep(1)
     
-    # Show QR code window on main thread
-    show_qr_code(url)
\ No newline at end of file
+    # Show QR code window on main thread; it follows network changes and offers updates
+    show_qr_code(url, network, update_results)
\ No newline at end of file
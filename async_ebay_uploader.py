@@ -0,0 +1,243 @@
+import asyncio
+import json
+from ebay_uploader import eBayUploader, BULK_UPDATE_LIMIT, REQUEST_TIMEOUT
+from listing_validator import validate_listing, ListingValidationError
+from lazy_imports import lazy_import
+
+aiohttp = lazy_import('aiohttp')
+
+# One pool for every request; eBay keeps connections alive, so reusing them
+# skips a TLS handshake per call
+POOL_SIZE = 100
+POOL_SIZE_PER_HOST = 20
+# Listings created at once by create_listings (each is 3 sequential calls)
+MAX_CONCURRENCY = 10
+
+
+class eBayAPIError(Exception):
+    def __init__(self, status, text):
+        super().__init__(f"{status}: {text}")
+        self.status = status
+        self.text = text
+
+
+class AsyncEBayUploader(eBayUploader):
+    """asyncio version of eBayUploader for batch listing
+
+    All requests share one aiohttp session and connection pool. A 401
+    triggers a single token refresh that concurrent requests wait on,
+    after which each retries once with the new token.
+
+    Use as an async context manager so the pool is closed:
+
+        async with AsyncEBayUploader() as uploader:
+            results = await uploader.create_listings(listings)
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, pool_size=POOL_SIZE, transport=None, account=None):
+        super().__init__(transport, account)
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self._session = None
+        self._refresh_lock = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def open(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=POOL_SIZE_PER_HOST,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+            self._refresh_lock = asyncio.Lock()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _send(self, method, url, **kwargs):
+        """One HTTP round trip returning (status, text), through the cassette if one is set"""
+        if hasattr(self.http, 'arequest'):
+            return await self.http.arequest(self._send_direct, method, url, **kwargs)
+        return await self._send_direct(method, url, **kwargs)
+
+    async def _send_direct(self, method, url, **kwargs):
+        session = await self.open()
+        async with session.request(method, url, **kwargs) as response:
+            return response.status, await response.text()
+
+    async def _request(self, method, url, retry_auth=True, **kwargs):
+        """Authorized request returning parsed JSON (or {} for empty bodies)"""
+        headers = dict(kwargs.pop('headers', {}))
+        token = self.token
+        headers["Authorization"] = f"Bearer {token}"
+        status, text = await self._send(method, url, headers=headers, **kwargs)
+        if status == 401 and retry_auth and await self._refresh_after(token):
+            return await self._request(method, url, retry_auth=False, headers=headers, **kwargs)
+        if status >= 400:
+            raise eBayAPIError(status, text)
+        if not text:
+            return {}
+        return json.loads(text)
+
+    async def _refresh_after(self, stale_token):
+        """Refresh once per expired token; callers that lost the race reuse the result"""
+        async with self._refresh_lock:
+            if self.token != stale_token:
+                return True
+            return await self.refresh_access_token_async()
+
+    async def _token_request(self, data):
+        status, text = await self._send("POST", self._token_url(), headers=self._token_headers(), data=data)
+        if status != 200:
+            raise eBayAPIError(status, text)
+        token_data = json.loads(text)
+        # save_config writes a file; keep it off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self._store_tokens, token_data)
+        return token_data
+
+    async def exchange_code_for_token_async(self, code, redirect_uri="Zach_Russell-ZachRuss-kcctes-xcritru"):
+        if not all([self.config.get("app_id"), self.config.get("cert_id")]):
+            raise Exception("eBay credentials not configured")
+        try:
+            await self._token_request({
+                "grant_type": "authorization_code",
+                "code": code,
+                "redirect_uri": redirect_uri
+            })
+            return True
+        except Exception as e:
+            raise Exception(f"Failed to exchange code for token: {str(e)}")
+
+    async def refresh_access_token_async(self):
+        if not self.refresh_token:
+            raise Exception("No refresh token available")
+        try:
+            await self._token_request(self._refresh_request_data())
+            return True
+        except Exception as e:
+            print(f"Token refresh failed: {e}")
+            return False
+
+    async def upload_image_async(self, image_path):
+        """Upload image to eBay Picture Services (EPS)"""
+        url = f"{self.base_url}/sell/inventory/v1/offer/upload_picture"
+        loop = asyncio.get_running_loop()
+        try:
+            data = await loop.run_in_executor(None, _read_file, image_path)
+            return await self._request("POST", url, data=data,
+                                       headers={"Content-Type": "application/octet-stream"})
+        except Exception as e:
+            raise Exception(f"Failed to upload image: {str(e)}")
+
+    async def create_listing_async(self, listing_data, progress=None):
+        """Create an eBay listing; same contract as eBayUploader.create_listing
+
+        progress is an optional dict updated in place with the sku and
+        offer_id as the steps complete. Passing the same dict back after a
+        failure resumes from the failed step, so a listing whose publish
+        failed is published from its existing offer instead of creating a
+        second one.
+        """
+        _, errors = validate_listing(listing_data, image_field='image_urls')
+        if errors:
+            raise ListingValidationError(errors)
+
+        progress = progress if progress is not None else {}
+        sku = progress.get("sku") or self._listing_sku(listing_data)
+        progress["sku"] = sku
+        try:
+            offer_id = progress.get("offer_id")
+            if not offer_id:
+                await self._request(
+                    "PUT", f"{self.base_url}/sell/inventory/v1/inventory_item/{sku}",
+                    json=self._inventory_item_payload(listing_data),
+                    headers={"Content-Type": "application/json", "Content-Language": "en-US"})
+                offer_id = progress["offer_id"] = await self._create_offer_async(sku, listing_data)
+            result = await self._publish_offer_async(offer_id)
+            result.setdefault("sku", sku)
+            result.setdefault("offerId", offer_id)
+            return result
+        except Exception as e:
+            raise Exception(f"Failed to create listing: {str(e)}")
+
+    async def _create_offer_async(self, sku, listing_data):
+        try:
+            response = await self._request(
+                "POST", f"{self.base_url}/sell/inventory/v1/offer",
+                json=self._offer_payload(sku, listing_data),
+                headers={"Content-Type": "application/json"})
+            return response.get("offerId")
+        except Exception as e:
+            raise Exception(f"Failed to create offer: {str(e)}")
+
+    async def _publish_offer_async(self, offer_id):
+        try:
+            return await self._request(
+                "POST", f"{self.base_url}/sell/inventory/v1/offer/{offer_id}/publish",
+                headers={"Content-Type": "application/json"})
+        except Exception as e:
+            raise Exception(f"Failed to publish offer: {str(e)}")
+
+    async def create_listings(self, listings, progress=None):
+        """Create many listings concurrently, at most max_concurrency at a time
+
+        Returns one entry per listing, in order: the publish response, or the
+        exception that listing raised. progress, if given, is one dict per
+        listing, as for create_listing_async.
+        """
+        await self.open()
+        progress = progress if progress is not None else [{} for _ in listings]
+
+        async def limited(listing_data, listing_progress):
+            async with self._semaphore:
+                return await self.create_listing_async(listing_data, listing_progress)
+
+        return await asyncio.gather(*(limited(listing, listing_progress)
+                                      for listing, listing_progress in zip(listings, progress)),
+                                    return_exceptions=True)
+
+    async def bulk_update_price_quantity_async(self, updates):
+        """Revise any number of offers, BULK_UPDATE_LIMIT per call, calls run concurrently
+
+        Returns eBay's per-item responses in update order. A batch whose
+        call fails gets one synthesized response per item carrying the error.
+        """
+        await self.open()
+        url = f"{self.base_url}/sell/inventory/v1/bulk_update_price_quantity"
+        batches = [updates[i:i + BULK_UPDATE_LIMIT] for i in range(0, len(updates), BULK_UPDATE_LIMIT)]
+
+        async def send(batch):
+            async with self._semaphore:
+                try:
+                    response = await self._request("POST", url, json=self._bulk_update_payload(batch),
+                                                   headers={"Content-Type": "application/json"})
+                    return response.get("responses", [])
+                except Exception as e:
+                    return [{"sku": u["sku"], "offerId": u["offer_id"], "statusCode": getattr(e, 'status', 0),
+                             "errors": [{"message": str(e)}]} for u in batch]
+
+        results = await asyncio.gather(*(send(batch) for batch in batches))
+        return [response for batch in results for response in batch]
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def create_listings(listings, max_concurrency=MAX_CONCURRENCY):
+    """Blocking helper for callers outside an event loop (Flask routes, the GUI)"""
+    async def run():
+        async with AsyncEBayUploader(max_concurrency=max_concurrency) as uploader:
+            return await uploader.create_listings(listings)
+    return asyncio.run(run())
@@ -0,0 +1,279 @@
+"""
+Detect the card in phone photos, correct perspective and crop it
+Run: python card_crop.py [uploads_folder] [--workers N] [--force]
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PIL import Image, ImageOps
+from lazy_imports import lazy_import
+from storage_maintenance import DERIVED_DIRNAME
+
+np = lazy_import('numpy')
+
+CROPS_SUBDIR = os.path.join(DERIVED_DIRNAME, 'crops')
+DETECT_SIZE = 600  # Detection runs on a copy this size; the crop uses full resolution
+CROP_QUALITY = 90
+
+# A standard trading card is 2.5" x 3.5"; allow for graded slabs and top loaders
+CARD_ASPECT = 2.5 / 3.5
+ASPECT_TOLERANCE = 0.25
+MIN_AREA_FRACTION = 0.08
+MAX_AREA_FRACTION = 0.97
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.heic', '.heif')
+
+
+def crop_path(upload_folder, filename):
+    return os.path.join(upload_folder, CROPS_SUBDIR, os.path.splitext(filename)[0] + '.jpg')
+
+
+def _erode(mask, steps):
+    for _ in range(steps):
+        mask = (mask[1:-1, 1:-1] & mask[:-2, 1:-1] & mask[2:, 1:-1] & mask[1:-1, :-2] & mask[1:-1, 2:])
+        mask = np.pad(mask, 1)
+    return mask
+
+
+def _dilate(mask, steps):
+    for _ in range(steps):
+        padded = np.pad(mask, 1)
+        mask = (padded[1:-1, 1:-1] | padded[:-2, 1:-1] | padded[2:, 1:-1]
+                | padded[1:-1, :-2] | padded[1:-1, 2:])
+    return mask
+
+
+def _otsu_threshold(values):
+    """Threshold that best separates a 0-255 array into two classes"""
+    histogram = np.bincount(values.ravel(), minlength=256).astype(np.float64)
+    weights = np.cumsum(histogram)
+    means = np.cumsum(histogram * np.arange(256))
+    total_weight, total_mean = weights[-1], means[-1]
+    background = weights[:-1]
+    foreground = total_weight - background
+    valid = (background > 0) & (foreground > 0)
+    between = np.zeros(255)
+    between[valid] = ((total_mean * background[valid] - means[:-1][valid] * total_weight) ** 2
+                      / (background[valid] * foreground[valid]))
+    return int(np.argmax(between))
+
+
+def card_mask(rgb):
+    """Boolean mask of pixels that differ from the background
+
+    The background is estimated from the photo's border, which is where the
+    table shows in a typical card shot. Morphological opening removes
+    specks of texture before corners are located.
+    """
+    pixels = rgb.astype(np.int16)
+    border = np.concatenate([pixels[:4].reshape(-1, 3), pixels[-4:].reshape(-1, 3),
+                             pixels[:, :4].reshape(-1, 3), pixels[:, -4:].reshape(-1, 3)])
+    background = np.median(border, axis=0)
+    distance = np.abs(pixels - background).sum(axis=2)
+    distance = np.clip(distance / 3, 0, 255).astype(np.uint8)
+
+    # Pixels on strong edges count too, so pale cards on pale tables still register
+    gray = pixels.mean(axis=2)
+    gradient = np.zeros_like(gray)
+    gradient[1:-1, 1:-1] = (np.abs(gray[2:, 1:-1] - gray[:-2, 1:-1])
+                            + np.abs(gray[1:-1, 2:] - gray[1:-1, :-2]))
+
+    threshold = max(_otsu_threshold(distance), 20)
+    mask = (distance > threshold) | (gradient > 60)
+    mask = _dilate(_erode(mask, 2), 2)
+    # Fill the card's interior: close holes left by flat areas of artwork
+    return _erode(_dilate(mask, 4), 4)
+
+
+def find_card_corners(rgb):
+    """Corners (tl, tr, br, bl) of the card in rgb coordinates, or None"""
+    mask = card_mask(rgb)
+    ys, xs = np.nonzero(mask)
+    height, width = mask.shape
+    if len(xs) < MIN_AREA_FRACTION * width * height:
+        return None
+
+    # Extreme points along the diagonals are the corners of a tilted rectangle
+    sums = xs + ys
+    diffs = xs - ys
+    corners = np.array([
+        (xs[np.argmin(sums)], ys[np.argmin(sums)]),
+        (xs[np.argmax(diffs)], ys[np.argmax(diffs)]),
+        (xs[np.argmax(sums)], ys[np.argmax(sums)]),
+        (xs[np.argmin(diffs)], ys[np.argmin(diffs)]),
+    ], dtype=np.float64)
+
+    # Shoelace area of the quadrilateral
+    x, y = corners[:, 0], corners[:, 1]
+    area = 0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+    if not MIN_AREA_FRACTION * width * height <= area <= MAX_AREA_FRACTION * width * height:
+        return None
+
+    card_width, card_height = _output_size(corners)
+    aspect = min(card_width, card_height) / max(card_width, card_height)
+    if abs(aspect - CARD_ASPECT) > ASPECT_TOLERANCE:
+        return None
+    return corners
+
+
+def _output_size(corners):
+    tl, tr, br, bl = corners
+    width = max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl))
+    height = max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr))
+    return int(round(width)), int(round(height))
+
+
+def perspective_coefficients(source_corners, width, height):
+    """Coefficients for Image.transform mapping the output rectangle onto the quad"""
+    targets = [(0, 0), (width, 0), (width, height), (0, height)]
+    matrix = []
+    vector = []
+    for (x, y), (u, v) in zip(targets, source_corners):
+        matrix.append([x, y, 1, 0, 0, 0, -u * x, -u * y])
+        matrix.append([0, 0, 0, x, y, 1, -v * x, -v * y])
+        vector.extend([u, v])
+    return np.linalg.solve(np.array(matrix, dtype=np.float64), np.array(vector, dtype=np.float64))
+
+
+def crop_card(source, target):
+    """Write a deskewed crop of the card in source to target
+
+    Returns a result dict; status is 'cropped' or 'no_card'.
+    """
+    started = time.perf_counter()
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        scale = DETECT_SIZE / max(img.size)
+        small = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.BILINEAR)
+        corners = find_card_corners(np.asarray(small))
+        if corners is None:
+            return {'status': 'no_card', 'seconds': round(time.perf_counter() - started, 3)}
+
+        corners = corners / scale
+        width, height = _output_size(corners)
+        coefficients = perspective_coefficients(corners, width, height)
+        card = img.transform((width, height), Image.PERSPECTIVE, tuple(coefficients), Image.BICUBIC)
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = target + '.tmp'
+    card.save(tmp_path, 'JPEG', quality=CROP_QUALITY, optimize=True)
+    os.replace(tmp_path, target)
+    return {
+        'status': 'cropped',
+        'size': [width, height],
+        'bytes': os.path.getsize(target),
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def _crop_job(upload_folder, filename):
+    """Process pool entry point; must stay a top-level function"""
+    try:
+        result = crop_card(os.path.join(upload_folder, filename), crop_path(upload_folder, filename))
+    except Exception as e:
+        result = {'status': 'error', 'error': str(e)}
+    result['filename'] = filename
+    return result
+
+
+def process_batch(upload_folder, filenames, workers=None, on_result=None):
+    """Crop many images in a process pool; returns results plus total timing"""
+    started = time.perf_counter()
+    results = []
+    if filenames:
+        workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        with ProcessPoolExecutor(max_workers=min(workers, len(filenames))) as pool:
+            futures = [pool.submit(_crop_job, upload_folder, f) for f in filenames]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_result:
+                    on_result(result)
+    return {
+        'results': results,
+        'cropped': sum(1 for r in results if r['status'] == 'cropped'),
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def pending_files(upload_folder, force=False):
+    files = sorted(f for f in os.listdir(upload_folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+    if force:
+        return files
+    return [f for f in files if not os.path.exists(crop_path(upload_folder, f))]
+
+
+class CropProcessor:
+    """Runs crop batches for the app in the background, one batch at a time"""
+
+    def __init__(self, catalog, workers=None):
+        self.catalog = catalog
+        self.workers = workers
+        self.running = False
+        self.last_summary = None
+        self._lock = threading.Lock()
+
+    def pending(self, force=False):
+        if force:
+            return self.catalog.list_filenames()
+        return [row['filename'] for row in
+                self.catalog.execute('SELECT filename FROM images WHERE crop_status IS NULL ORDER BY filename')]
+
+    def start(self, filenames=None, force=False):
+        """Start a background batch; returns False if one is already running
+
+        Raises ValueError for names that aren't catalogued uploads, so a
+        request can't point the crop at files outside the uploads folder.
+        """
+        if filenames is not None:
+            known = set(self.catalog.list_filenames())
+            unknown = [filename for filename in filenames if filename not in known]
+            if unknown:
+                raise ValueError(f"Image not found: {unknown[0]}")
+        with self._lock:
+            if self.running:
+                return False
+            self.running = True
+        filenames = filenames if filenames is not None else self.pending(force)
+        threading.Thread(target=self._run, args=(filenames,), daemon=True).start()
+        return True
+
+    def _run(self, filenames):
+        try:
+            self.last_summary = process_batch(self.catalog.upload_folder, filenames, self.workers,
+                                              on_result=self._record)
+            self.last_summary['finished_at'] = time.time()
+            print(f"✂️  Cropped {self.last_summary['cropped']} of {len(filenames)} images "
+                  f"in {self.last_summary['seconds']}s")
+        except Exception as e:
+            print(f"Crop batch failed: {e}")
+        finally:
+            self.running = False
+
+    def _record(self, result):
+        self.catalog.execute('UPDATE images SET crop_status = ? WHERE filename = ?',
+                             (result['status'], result['filename']))
+
+    def listing_path(self, filename):
+        """Relative URL path to use for a listing: the crop if one exists"""
+        if os.path.exists(crop_path(self.catalog.upload_folder, filename)):
+            return f"uploads/crops/{filename}"
+        return f"uploads/{filename}"
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    force = '--force' in args
+    workers = None
+    if '--workers' in args:
+        workers = int(args[args.index('--workers') + 1])
+    positional = [a for i, a in enumerate(args)
+                  if not a.startswith('--') and (i == 0 or args[i - 1] != '--workers')]
+    folder = positional[0] if positional else 'uploads'
+
+    files = pending_files(folder, force)
+    print(f"Cropping {len(files)} images from {folder}...")
+    summary = process_batch(folder, files, workers,
+                            on_result=lambda r: print(f"  {r['filename']}: {r['status']} ({r.get('seconds', 0)}s)"))
+    print(f"Cropped {summary['cropped']} of {len(files)} in {summary['seconds']}s")
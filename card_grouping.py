@@ -0,0 +1,191 @@
+import json
+import os
+import queue
+import threading
+import time
+from PIL import Image, ImageOps
+
+# A pause this long between photos always starts a new card
+MAX_GAP_SECONDS = 45
+# Below this gap photos stay together even if they look different (front/back)
+PAIR_GAP_SECONDS = 8
+# Default photos per card (front and back)
+PHOTOS_PER_CARD = 2
+# Mean per-channel difference (0-1) above which two photos are different cards
+SIMILARITY_THRESHOLD = 0.18
+
+SIGNATURE_SIZE = (6, 6)
+
+# 'queued' drafts are waiting in the listing outbox for connectivity
+DRAFT_STATUSES = ('open', 'ready', 'queued', 'listed', 'dismissed')
+
+
+def compute_signature(filepath):
+    """Tiny RGB thumbnail used to compare the color layout of two photos"""
+    with Image.open(filepath) as img:
+        img.draft('RGB', (64, 64))  # Let the JPEG decoder downscale for us
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        return img.resize(SIGNATURE_SIZE, Image.BILINEAR).tobytes()
+
+
+def signature_distance(a, b):
+    """0 for identical layouts, 1 for completely different ones"""
+    if not a or not b or len(a) != len(b):
+        return 1.0
+    return sum(abs(x - y) for x, y in zip(a, b)) / (255.0 * len(a))
+
+
+def should_split(gap, group_size, distance, photos_per_card=PHOTOS_PER_CARD):
+    """Decide whether a new photo starts a new card draft"""
+    if gap > MAX_GAP_SECONDS:
+        return True
+    if group_size >= photos_per_card:
+        return True
+    return gap > PAIR_GAP_SECONDS and distance > SIMILARITY_THRESHOLD
+
+
+class DraftGrouper:
+    """Assigns uploads to per-card listing drafts as they arrive
+
+    Uploads are queued and handled by one background thread in arrival
+    order, so the request thread never decodes images and grouping stays
+    deterministic.
+    """
+
+    def __init__(self, catalog, photos_per_card=PHOTOS_PER_CARD):
+        self.catalog = catalog
+        self.photos_per_card = photos_per_card
+        self._queue = queue.Queue()
+        self._worker = None
+
+    def start(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+
+    def submit(self, filename):
+        self.start()
+        self._queue.put(filename)
+
+    def wait(self):
+        """Block until every submitted upload has been grouped"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            filename = self._queue.get()
+            try:
+                self.assign(filename)
+            except Exception as e:
+                print(f"Error grouping {filename}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def assign(self, filename):
+        """Compute the signature for an upload and attach it to a draft"""
+        image = self.catalog.get_image(filename)
+        if not image or image['draft_id']:
+            return
+
+        try:
+            signature = compute_signature(os.path.join(self.catalog.upload_folder, filename))
+        except Exception as e:
+            print(f"Could not read {filename}: {e}")
+            signature = None
+
+        with self.catalog.transaction() as conn:
+            # Compare against the most recent grouped photo that is still open
+            previous = conn.execute(
+                """SELECT i.uploaded_at, i.signature, i.draft_id,
+                          (SELECT COUNT(*) FROM images WHERE draft_id = i.draft_id) AS group_size
+                   FROM images i JOIN drafts d ON d.id = i.draft_id
+                   WHERE d.status = 'open' AND i.uploaded_at <= ?
+                   ORDER BY i.uploaded_at DESC LIMIT 1""",
+                (image['uploaded_at'],)).fetchone()
+
+            now = time.time()
+            if previous and not should_split(image['uploaded_at'] - previous['uploaded_at'],
+                                             previous['group_size'],
+                                             signature_distance(signature, previous['signature']),
+                                             self.photos_per_card):
+                draft_id = previous['draft_id']
+                conn.execute('UPDATE drafts SET updated_at = ? WHERE id = ?', (now, draft_id))
+            else:
+                draft_id = conn.execute(
+                    'INSERT INTO drafts (created_at, updated_at) VALUES (?, ?)',
+                    (now, now)).lastrowid
+
+            conn.execute('UPDATE images SET signature = ?, draft_id = ? WHERE filename = ?',
+                         (signature, draft_id, filename))
+
+    def list_drafts(self, statuses=('open', 'ready')):
+        """Draft queue in upload order with each draft's images"""
+        placeholders = ','.join('?' for _ in statuses)
+        rows = self.catalog.execute(
+            f"""SELECT d.id, d.status, d.card_fields, i.filename
+                FROM drafts d JOIN images i ON i.draft_id = d.id
+                WHERE d.status IN ({placeholders})
+                ORDER BY d.id, i.uploaded_at, i.filename""",
+            tuple(statuses))
+
+        drafts = []
+        for row in rows:
+            if not drafts or drafts[-1]['id'] != row['id']:
+                drafts.append({'id': row['id'], 'status': row['status'], 'images': [],
+                               'fields': json.loads(row['card_fields']) if row['card_fields'] else {}})
+            drafts[-1]['images'].append(row['filename'])
+        return drafts
+
+    def set_fields(self, draft_id, fields):
+        """Store card details (player, year, ...) used to render the listing templates"""
+        with self.catalog.transaction() as conn:
+            cursor = conn.execute('UPDATE drafts SET card_fields = ?, updated_at = ? WHERE id = ?',
+                                  (json.dumps(fields), time.time(), draft_id))
+            return cursor.rowcount > 0
+
+    def set_status(self, draft_id, status):
+        if status not in DRAFT_STATUSES:
+            raise ValueError(f"Invalid draft status: {status}")
+        with self.catalog.transaction() as conn:
+            cursor = conn.execute('UPDATE drafts SET status = ?, updated_at = ? WHERE id = ?',
+                                  (status, time.time(), draft_id))
+            return cursor.rowcount > 0
+
+    def _require_draft(self, conn, draft_id):
+        if conn.execute('SELECT 1 FROM drafts WHERE id = ?', (draft_id,)).fetchone() is None:
+            raise ValueError(f"Draft not found: {draft_id}")
+
+    def move_image(self, filename, draft_id=None):
+        """Move a photo to another draft, or split it into a new one
+
+        Raises ValueError if draft_id doesn't exist.
+        """
+        with self.catalog.transaction() as conn:
+            now = time.time()
+            if draft_id is not None:
+                self._require_draft(conn, draft_id)
+            else:
+                draft_id = conn.execute(
+                    'INSERT INTO drafts (created_at, updated_at) VALUES (?, ?)',
+                    (now, now)).lastrowid
+            conn.execute('UPDATE images SET draft_id = ? WHERE filename = ?', (draft_id, filename))
+            self._drop_empty_drafts(conn)
+        return draft_id
+
+    def merge(self, draft_id, into_draft_id):
+        """Move every photo of draft_id into into_draft_id (ValueError if it doesn't exist)"""
+        if draft_id == into_draft_id:
+            return
+        with self.catalog.transaction() as conn:
+            self._require_draft(conn, into_draft_id)
+            conn.execute('UPDATE images SET draft_id = ? WHERE draft_id = ?', (into_draft_id, draft_id))
+            self._drop_empty_drafts(conn)
+
+    def remove_image(self, filename):
+        with self.catalog.transaction() as conn:
+            self.catalog.remove_image(filename, conn)
+            self._drop_empty_drafts(conn)
+
+    def _drop_empty_drafts(self, conn):
+        conn.execute('DELETE FROM drafts WHERE id NOT IN '
+                     '(SELECT draft_id FROM images WHERE draft_id IS NOT NULL)')
@@ -0,0 +1,218 @@
+import functools
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+
+HASH_BITS = 64
+# Hamming distance at or below which two photos show the same card
+DUPLICATE_DISTANCE = 10
+
+
+def dhash(filepath, size=8):
+    """64-bit difference hash: compares horizontally adjacent pixels of a 9x8 thumbnail"""
+    with Image.open(filepath) as img:
+        img.draft('L', (size * 8, size * 8))
+        img = ImageOps.exif_transpose(img).convert('L').resize((size + 1, size), Image.BILINEAR)
+        pixels = img.tobytes()
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+@functools.lru_cache(maxsize=None)
+def _flip_masks(bits, max_flips):
+    """Every bits-wide mask with at most max_flips bits set"""
+    masks = []
+    for flips in range(max_flips + 1):
+        for positions in itertools.combinations(range(bits), flips):
+            masks.append(sum(1 << p for p in positions))
+    return tuple(masks)
+
+
+class MultiIndexHash:
+    """Multi-index hash table for sub-linear Hamming radius searches
+
+    The 64-bit hash is split into CHUNKS substrings, each indexed in its
+    own table. If two hashes are within radius r, at least one substring
+    pair is within r // CHUNKS (pigeonhole), so a search only probes the
+    buckets near each of the query's substrings and verifies those
+    candidates, instead of comparing against every stored hash.
+    """
+
+    CHUNKS = 4
+    CHUNK_BITS = HASH_BITS // CHUNKS
+
+    def __init__(self):
+        self._tables = [{} for _ in range(self.CHUNKS)]
+        self._keys = {}  # hash value -> keys sharing it
+
+    def __len__(self):
+        return sum(len(keys) for keys in self._keys.values())
+
+    def _chunks(self, value):
+        mask = (1 << self.CHUNK_BITS) - 1
+        return [(value >> (i * self.CHUNK_BITS)) & mask for i in range(self.CHUNKS)]
+
+    def add(self, value, key):
+        keys = self._keys.get(value)
+        if keys is None:
+            keys = self._keys[value] = set()
+            for table, chunk in zip(self._tables, self._chunks(value)):
+                table.setdefault(chunk, set()).add(value)
+        keys.add(key)
+
+    def remove(self, value, key):
+        keys = self._keys.get(value)
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del self._keys[value]
+            for table, chunk in zip(self._tables, self._chunks(value)):
+                bucket = table.get(chunk)
+                if bucket is not None:
+                    bucket.discard(value)
+                    if not bucket:
+                        del table[chunk]
+
+    def search(self, value, radius):
+        """[(distance, key)] for every key within radius, closest first"""
+        masks = _flip_masks(self.CHUNK_BITS, radius // self.CHUNKS)
+        candidates = set()
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            for mask in masks:
+                bucket = table.get(chunk ^ mask)
+                if bucket:
+                    candidates |= bucket
+
+        results = []
+        for candidate in candidates:
+            distance = hamming(value, candidate)
+            if distance <= radius:
+                results.extend((distance, key) for key in self._keys[candidate])
+        results.sort()
+        return results
+
+
+class DuplicateIndex:
+    """Perceptual hashes of current and archived photos, searchable by similarity
+
+    Hashes are persisted in the catalog (images.phash for current uploads,
+    archived_images.phash for archived ones) and loaded into a multi-index hash table at
+    startup, so lookups never re-read image files.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._tree = MultiIndexHash()
+        self._hashes = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='phash')
+
+    def submit(self, filename):
+        """Hash an upload in the background"""
+        return self._executor.submit(self._add_logged, filename)
+
+    def _add_logged(self, filename):
+        try:
+            return self.add(filename, os.path.join(self.catalog.upload_folder, filename))
+        except Exception as e:
+            print(f"Error hashing {filename}: {e}")
+
+    def pending(self):
+        return [row['filename'] for row in
+                self.catalog.execute('SELECT filename FROM images WHERE phash IS NULL')]
+
+    def _load(self):
+        if self._loaded:
+            return
+        rows = self.catalog.execute(
+            "SELECT filename, phash FROM images WHERE phash IS NOT NULL "
+            "UNION ALL SELECT filename, phash FROM archived_images WHERE phash IS NOT NULL")
+        for row in rows:
+            value = int(row['phash'], 16)
+            self._hashes[row['filename']] = value
+            self._tree.add(value, row['filename'])
+        self._loaded = True
+
+    def add(self, filename, filepath):
+        """Hash an upload, store it in the catalog and index it"""
+        value = dhash(filepath)
+        self.catalog.execute('UPDATE images SET phash = ? WHERE filename = ?',
+                             (f"{value:016x}", filename))
+        with self._lock:
+            self._load()
+            if filename in self._hashes:
+                self._tree.remove(self._hashes[filename], filename)
+            self._hashes[filename] = value
+            self._tree.add(value, filename)
+        return value
+
+    def remove(self, filename):
+        """Forget a deleted photo (archived photos keep their hash)"""
+        with self._lock:
+            value = self._hashes.pop(filename, None)
+            if value is not None:
+                self._tree.remove(value, filename)
+
+    def hash_of(self, filename):
+        with self._lock:
+            self._load()
+            return self._hashes.get(filename)
+
+    def similar(self, filename=None, value=None, radius=DUPLICATE_DISTANCE, limit=20):
+        """Photos within radius of a catalogued filename or a raw hash value"""
+        with self._lock:
+            self._load()
+            if value is None:
+                value = self._hashes.get(filename)
+            if value is None:
+                return []
+            matches = self._tree.search(value, radius)
+        archived = self._archived_names([key for _, key in matches])
+        return [{'filename': key, 'distance': distance, 'archived': key in archived}
+                for distance, key in matches if key != filename][:limit]
+
+    def _archived_names(self, filenames):
+        if not filenames:
+            return set()
+        names = list(filenames)[:500]
+        rows = self.catalog.execute(
+            f"SELECT filename FROM archived_images WHERE filename IN ({','.join('?' for _ in names)})",
+            names)
+        return {row['filename'] for row in rows}
+
+    def listed_duplicates(self, filenames, radius=DUPLICATE_DISTANCE):
+        """Photos already used in a listed or archived draft that match any of filenames
+
+        Used as a warning before a listing is created.
+        """
+        selected = set(filenames)
+        candidates = {}
+        for filename in filenames:
+            for match in self.similar(filename, radius=radius):
+                if match['filename'] not in selected:
+                    candidates.setdefault(match['filename'], (filename, match))
+        if not candidates:
+            return []
+
+        names = list(candidates)[:500]
+        placeholders = ','.join('?' for _ in names)
+        rows = self.catalog.execute(
+            f"""SELECT i.filename FROM images i JOIN drafts d ON d.id = i.draft_id
+                WHERE d.status = 'listed' AND i.filename IN ({placeholders})
+                UNION SELECT filename FROM archived_images WHERE filename IN ({placeholders})""",
+            names + names)
+        listed = {row['filename'] for row in rows}
+        return [{'image': candidates[name][0], 'matches': name, 'distance': candidates[name][1]['distance']}
+                for name in names if name in listed]
@@ -0,0 +1,182 @@
+import asyncio
+import threading
+import time
+from ebay_config import load_config, list_accounts, default_account
+from ebay_uploader import eBayUploader, default_transport
+from async_ebay_uploader import AsyncEBayUploader
+from lazy_imports import lazy_import
+
+requests = lazy_import('requests')
+
+# Default call budget per account; an account's config may set
+# "calls_per_second" and "burst" to override it
+CALLS_PER_SECOND = 5.0
+BURST = 10
+# Keep-alive connections per account
+POOL_SIZE = 10
+
+
+class UnknownAccountError(ValueError):
+    pass
+
+
+class RateBudget:
+    """Token bucket shared by every request made for one account
+
+    acquire() blocks until a call is allowed, so a busy account slows
+    down on its own budget instead of running into eBay's rate limit
+    and starving the other accounts.
+    """
+
+    def __init__(self, rate=CALLS_PER_SECOND, burst=BURST):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.waited = 0.0
+
+    def _reserve(self):
+        """Take a token; returns how long the caller must wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            self.calls += 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.waited += wait
+            return wait
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+    def stats(self):
+        return {'calls_per_second': self.rate, 'burst': self.burst, 'calls': self.calls,
+                'waited_s': round(self.waited, 3)}
+
+
+class AccountTransport:
+    """requests-style transport for one account: its own pool and rate budget
+
+    Wraps a cassette when EBAY_CASSETTE is set, otherwise a requests
+    Session created on first use. Also implements arequest so
+    AsyncEBayUploader calls draw on the same budget.
+    """
+
+    def __init__(self, budget, inner=None):
+        self.budget = budget
+        self.inner = inner
+        self.replaying = getattr(inner, 'replaying', False)
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _http(self):
+        if self.inner is not None:
+            return self.inner
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+
+    def request(self, method, url, **kwargs):
+        self.budget.acquire()
+        return self._http().request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    async def arequest(self, send, method, url, **kwargs):
+        await self.budget.acquire_async()
+        if hasattr(self.inner, 'arequest'):
+            return await self.inner.arequest(send, method, url, **kwargs)
+        return await send(method, url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+class AccountPool:
+    """Uploaders keyed by seller account
+
+    Every account gets its own transport (connection pool and rate
+    budget), created on first use and kept for the life of the process.
+    Uploaders are created per call so each one starts from the account's
+    latest saved tokens; since tokens are saved per account, a refresh on
+    one account never touches another.
+    """
+
+    def __init__(self):
+        self._transports = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, account=None):
+        """Account name to use; raises UnknownAccountError for names not in the config"""
+        if not account:
+            return default_account()
+        if account not in list_accounts():
+            raise UnknownAccountError(f"Unknown eBay account: {account}")
+        return account
+
+    def transport(self, account=None):
+        account = self.resolve(account)
+        with self._lock:
+            transport = self._transports.get(account)
+            if transport is None:
+                config = load_config(account)
+                budget = RateBudget(config.get('calls_per_second') or CALLS_PER_SECOND,
+                                    config.get('burst') or BURST)
+                transport = self._transports[account] = AccountTransport(budget, default_transport())
+            return transport
+
+    def uploader(self, account=None):
+        account = self.resolve(account)
+        return eBayUploader(transport=self.transport(account), account=account)
+
+    def async_uploader(self, account=None, **kwargs):
+        account = self.resolve(account)
+        return AsyncEBayUploader(transport=self.transport(account), account=account, **kwargs)
+
+    def forget(self, account):
+        """Drop an account's pool, e.g. after its rate settings changed or it was deleted"""
+        with self._lock:
+            transport = self._transports.pop(account, None)
+        if transport is not None:
+            transport.close()
+
+    def stats(self):
+        with self._lock:
+            return {account: transport.budget.stats() for account, transport in self._transports.items()}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_account_pool():
+    """Return the process-wide account pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AccountPool()
+        return _pool
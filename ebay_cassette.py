@@ -0,0 +1,352 @@
+"""
+Record eBay API traffic to a cassette file and replay it offline
+Run: python ebay_cassette.py summary <cassette.json>
+     python ebay_cassette.py bench <cassette.json> [--timing original|none|<scale>] [--repeat N]
+
+Pass a Cassette as the transport of eBayUploader / AsyncEBayUploader, or
+set EBAY_CASSETTE=<path> (with EBAY_CASSETTE_MODE=record|replay and
+EBAY_CASSETTE_TIMING=original|none|<scale>) to route every uploader the
+app creates through one. Credentials and tokens are redacted before
+anything is written.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlencode, urlsplit, parse_qsl
+from lazy_imports import lazy_import
+
+requests = lazy_import('requests')
+
+CASSETTE_VERSION = 1
+REDACTED = 'REDACTED'
+# Header and body fields that carry credentials
+SECRET_HEADERS = {'authorization', 'cookie', 'set-cookie'}
+SECRET_FIELDS = {'access_token', 'refresh_token', 'code', 'client_secret', 'cert_id', 'app_id', 'dev_id'}
+# Response headers worth keeping
+KEPT_RESPONSE_HEADERS = {'content-type', 'content-language', 'location'}
+
+
+class CassetteError(Exception):
+    pass
+
+
+def _redact_fields(value):
+    if isinstance(value, dict):
+        return {k: REDACTED if k in SECRET_FIELDS else _redact_fields(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_redact_fields(v) for v in value]
+    return value
+
+
+def _redact_text(text):
+    try:
+        return json.dumps(_redact_fields(json.loads(text)))
+    except (TypeError, ValueError):
+        return text
+
+
+def _request_key(method, url, params=None):
+    """Method and path+query, without scheme and host so sandbox and production cassettes match"""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query) + sorted((params or {}).items())
+    path = parts.path + ('?' + urlencode(sorted(query)) if query else '')
+    return f"{method.upper()} {path}"
+
+
+def _body(data=None, json_body=None):
+    """Comparable, redacted form of a request body"""
+    if json_body is not None:
+        return json.dumps(_redact_fields(json_body), sort_keys=True)
+    if data is None:
+        return None
+    if isinstance(data, dict):
+        return urlencode(sorted(_redact_fields(data).items()))
+    if hasattr(data, 'read'):
+        data = data.read()
+    if isinstance(data, str):
+        data = data.encode()
+    # Image uploads: keep a digest, not the bytes
+    return f"sha256:{hashlib.sha256(data).hexdigest()}:{len(data)}"
+
+
+class Cassette:
+    """Request/response pairs for eBay API calls, recorded or replayed
+
+    mode 'record' sends real requests and captures them; save() (or
+    leaving the with block) writes the file. mode 'replay' never touches
+    the network: each request is matched by method, path and body to the
+    next recorded interaction for that key, in recording order, and is
+    answered after its recorded latency times timing (None for no delay).
+    Once a key's interactions are used up replay starts over from the
+    first one, so a short cassette can drive a long benchmark; pass
+    strict=True to raise CassetteError instead.
+    """
+
+    def __init__(self, path, mode='replay', timing=1.0, match_body=True, strict=False):
+        if mode not in ('record', 'replay'):
+            raise ValueError("mode must be 'record' or 'replay'")
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self.match_body = match_body
+        self.strict = strict
+        self.interactions = []
+        self._cursors = {}
+        self._lock = threading.Lock()
+        self._started = time.time()
+        if mode == 'replay':
+            self.load()
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.mode == 'record':
+            self.save()
+
+    def load(self):
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        if data.get('version') != CASSETTE_VERSION:
+            raise CassetteError(f"Unsupported cassette version: {data.get('version')}")
+        self.interactions = data['interactions']
+        self._by_key = {}
+        for interaction in self.interactions:
+            self._by_key.setdefault(self._match_key(interaction['request']), []).append(interaction)
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with self._lock:
+            data = {'version': CASSETTE_VERSION, 'recorded_at': self._started, 'interactions': self.interactions}
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _match_key(self, request):
+        if self.match_body:
+            return (request['key'], request['body'])
+        return (request['key'], None)
+
+    def _record(self, method, url, params, headers, body, status, response_headers, text, started, elapsed):
+        interaction = {
+            'request': {
+                'key': _request_key(method, url, params),
+                'method': method.upper(),
+                'url': url,
+                'headers': {k: REDACTED if k.lower() in SECRET_HEADERS else v for k, v in (headers or {}).items()},
+                'body': body
+            },
+            'response': {
+                'status': status,
+                'headers': {k: v for k, v in response_headers.items() if k.lower() in KEPT_RESPONSE_HEADERS},
+                'body': _redact_text(text)
+            },
+            'offset': round(started - self._started, 4),
+            'elapsed': round(elapsed, 4)
+        }
+        with self._lock:
+            self.interactions.append(interaction)
+
+    def _next(self, method, url, params, body):
+        request = {'key': _request_key(method, url, params), 'body': body}
+        key = self._match_key(request)
+        with self._lock:
+            matches = self._by_key.get(key)
+            if not matches:
+                raise CassetteError(f"No recorded response for {request['key']}")
+            index = self._cursors.get(key, 0)
+            if index >= len(matches):
+                if self.strict:
+                    raise CassetteError(f"Recorded responses for {request['key']} used up")
+                index = 0
+            self._cursors[key] = index + 1
+            return matches[index]
+
+    def _delay(self, interaction):
+        return interaction['elapsed'] * self.timing if self.timing else 0
+
+    # requests-compatible interface used by eBayUploader
+
+    def request(self, method, url, params=None, data=None, json=None, headers=None, **kwargs):
+        if hasattr(data, 'read'):
+            data = data.read()
+        body = _body(data, json)
+        if self.mode == 'record':
+            started = time.time()
+            response = requests.request(method, url, params=params, data=data, json=json,
+                                        headers=headers, **kwargs)
+            self._record(method, url, params, headers, body, response.status_code, response.headers,
+                         response.text, started, time.time() - started)
+            return response
+
+        interaction = self._next(method, url, params, body)
+        delay = self._delay(interaction)
+        if delay:
+            time.sleep(delay)
+        return self._build_response(url, interaction['response'])
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def _build_response(self, url, recorded):
+        response = requests.Response()
+        response.status_code = recorded['status']
+        response._content = (recorded['body'] or '').encode('utf-8')
+        response.headers.update(recorded.get('headers', {}))
+        response.encoding = 'utf-8'
+        response.url = url
+        response.reason = 'Replayed'
+        return response
+
+    # Interface used by AsyncEBayUploader._send
+
+    async def arequest(self, send, method, url, params=None, data=None, json=None, headers=None, **kwargs):
+        body = _body(data, json)
+        if self.mode == 'record':
+            started = time.time()
+            status, text = await send(method, url, params=params, data=data, json=json,
+                                      headers=headers, **kwargs)
+            self._record(method, url, params, headers, body, status, {}, text, started, time.time() - started)
+            return status, text
+
+        interaction = self._next(method, url, params, body)
+        delay = self._delay(interaction)
+        if delay:
+            await asyncio.sleep(delay)
+        return interaction['response']['status'], interaction['response']['body']
+
+    def summary(self):
+        """Calls and latency per endpoint"""
+        endpoints = {}
+        for interaction in self.interactions:
+            stats = endpoints.setdefault(interaction['request']['key'].split('?')[0],
+                                         {'calls': 0, 'total_s': 0.0, 'errors': 0})
+            stats['calls'] += 1
+            stats['total_s'] += interaction['elapsed']
+            stats['errors'] += interaction['response']['status'] >= 400
+        for stats in endpoints.values():
+            stats['mean_s'] = round(stats['total_s'] / stats['calls'], 4)
+            stats['total_s'] = round(stats['total_s'], 4)
+        return endpoints
+
+
+def parse_timing(value):
+    if value in (None, '', 'none', '0'):
+        return None
+    if value == 'original':
+        return 1.0
+    return float(value)
+
+
+_env_cassette = None
+_env_lock = threading.Lock()
+
+
+def cassette_from_env():
+    """Process-wide cassette configured by EBAY_CASSETTE* environment variables"""
+    global _env_cassette
+    with _env_lock:
+        if _env_cassette is None:
+            _env_cassette = Cassette(os.environ['EBAY_CASSETTE'],
+                                     mode=os.environ.get('EBAY_CASSETTE_MODE', 'replay'),
+                                     timing=parse_timing(os.environ.get('EBAY_CASSETTE_TIMING', 'original')))
+            if _env_cassette.mode == 'record':
+                import atexit
+                atexit.register(_env_cassette.save)
+        return _env_cassette
+
+
+def listings_from_cassette(cassette):
+    """Rebuild the listing_data of every listing created in a cassette
+
+    Inventory item PUTs carry the product and quantity; the offer POST that
+    follows carries price and category. Used to drive replay benchmarks
+    with exactly the requests that were recorded.
+    """
+    listings = []
+    pending = {}
+    for interaction in cassette.interactions:
+        request = interaction['request']
+        if request['method'] == 'PUT' and '/inventory_item/' in request['key'] and request['body']:
+            item = json.loads(request['body'])
+            product = item.get('product', {})
+            pending[request['key'].rsplit('/', 1)[-1]] = {
+                'title': product.get('title'),
+                'description': product.get('description'),
+                'image_urls': product.get('imageUrls', []),
+                'aspects': product.get('aspects', {}),
+                'condition': item.get('condition'),
+                'quantity': item.get('availability', {}).get('shipToLocationAvailability', {}).get('quantity', 1)
+            }
+        elif request['method'] == 'POST' and request['key'].endswith('/offer') and request['body']:
+            offer = json.loads(request['body'])
+            listing = pending.pop(offer.get('sku'), None)
+            if listing:
+                listing['price'] = offer.get('pricingSummary', {}).get('price', {}).get('value')
+                listing['category_id'] = offer.get('categoryId')
+                listings.append(listing)
+    return listings
+
+
+def bench(path, timing=1.0, repeat=1, concurrency=None):
+    """Replay the cassette's listings sequentially (sync) and concurrently (async)"""
+    from ebay_uploader import eBayUploader
+    from async_ebay_uploader import AsyncEBayUploader, MAX_CONCURRENCY
+
+    listings = listings_from_cassette(Cassette(path)) * repeat
+    if not listings:
+        raise CassetteError("Cassette contains no created listings")
+
+    uploader = eBayUploader(transport=Cassette(path, timing=timing))
+    started = time.perf_counter()
+    for listing in listings:
+        uploader.create_listing(listing)
+    sync_seconds = time.perf_counter() - started
+
+    async def run_async():
+        async with AsyncEBayUploader(max_concurrency=concurrency or MAX_CONCURRENCY,
+                                     transport=Cassette(path, timing=timing)) as async_uploader:
+            return await async_uploader.create_listings(listings)
+
+    started = time.perf_counter()
+    results = asyncio.run(run_async())
+    async_seconds = time.perf_counter() - started
+    errors = [str(r) for r in results if isinstance(r, Exception)]
+    return {
+        'listings': len(listings),
+        'timing': timing,
+        'sync_seconds': round(sync_seconds, 3),
+        'async_seconds': round(async_seconds, 3),
+        'async_errors': errors[:5],
+        'speedup': round(sync_seconds / async_seconds, 2) if async_seconds else None
+    }
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in ('summary', 'bench'):
+        print(__doc__.strip())
+        sys.exit(1)
+    command, path = args[0], args[1]
+    if command == 'summary':
+        print(json.dumps(Cassette(path).summary(), indent=2))
+    else:
+        timing = parse_timing(args[args.index('--timing') + 1]) if '--timing' in args else 1.0
+        repeat = int(args[args.index('--repeat') + 1]) if '--repeat' in args else 1
+        print(json.dumps(bench(path, timing, repeat), indent=2))
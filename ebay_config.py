@@ -1,5 +1,6 @@
 import json
 import os
+import threading
 from pathlib import Path
 
 # Store config in user's home directory
@@ -11,40 +12,119 @@ def ensure_config_dir():
     """Create config directory if it doesn't exist"""
     CONFIG_DIR.mkdir(parents=True, exist_ok=True)
 
-def load_config():
-    """Load eBay API configuration"""
-    ensure_config_dir()
-    
+# Seller accounts live side by side in CONFIG_FILE:
+#   {"default_account": "main", "accounts": {"main": {...}, "second": {...}}}
+# A file from before accounts existed holds one account's keys at the top
+# level; it is read as an account named DEFAULT_ACCOUNT and rewritten in
+# the new layout on the next save.
+DEFAULT_ACCOUNT = "default"
+
+EMPTY_ACCOUNT = {
+    "app_id": "",
+    "dev_id": "",
+    "cert_id": "",
+    "environment": "sandbox"  # or "production"
+}
+
+# Uploaders for different accounts save tokens concurrently; every write
+# re-reads the file under this lock so one account never clobbers another
+_config_lock = threading.Lock()
+
+def _read_config_file():
     if not CONFIG_FILE.exists():
-        return {
-            "app_id": "",
-            "dev_id": "",
-            "cert_id": "",
-            "environment": "sandbox"  # or "production"
-        }
+        return {"default_account": DEFAULT_ACCOUNT, "accounts": {}}
+    with open(CONFIG_FILE, 'r') as f:
+        data = json.load(f)
+    if "accounts" not in data:
+        return {"default_account": DEFAULT_ACCOUNT, "accounts": {DEFAULT_ACCOUNT: data} if data else {}}
+    data.setdefault("default_account", DEFAULT_ACCOUNT)
+    return data
+
+def _write_config_file(data):
+    tmp_path = CONFIG_FILE.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, CONFIG_FILE)
+
+def default_account():
+    """Name of the account used when a request doesn't pick one"""
+    ensure_config_dir()
+    try:
+        return _read_config_file()["default_account"]
+    except Exception as e:
+        print(f"Error loading config: {e}")
+        return DEFAULT_ACCOUNT
+
+def list_accounts():
+    """Names of the configured seller accounts, the default first"""
+    ensure_config_dir()
+    try:
+        data = _read_config_file()
+    except Exception as e:
+        print(f"Error loading config: {e}")
+        return [DEFAULT_ACCOUNT]
+    names = sorted(data["accounts"])
+    default = data["default_account"]
+    return [default] + [name for name in names if name != default]
+
+def load_config(account=None):
+    """Load eBay API configuration for an account (the default account if None)"""
+    ensure_config_dir()
     
     try:
-        with open(CONFIG_FILE, 'r') as f:
-            return json.load(f)
+        data = _read_config_file()
     except Exception as e:
         print(f"Error loading config: {e}")
         return {}
+    return dict(data["accounts"].get(account or data["default_account"], EMPTY_ACCOUNT))
+
+def save_config(config, account=None):
+    """Save eBay API configuration for an account (the default account if None)"""
+    ensure_config_dir()
+    
+    try:
+        with _config_lock:
+            data = _read_config_file()
+            data["accounts"][account or data["default_account"]] = config
+            _write_config_file(data)
+        return True
+    except Exception as e:
+        print(f"Error saving config: {e}")
+        return False
+
+def set_default_account(account):
+    ensure_config_dir()
+    
+    try:
+        with _config_lock:
+            data = _read_config_file()
+            data["default_account"] = account
+            data["accounts"].setdefault(account, dict(EMPTY_ACCOUNT))
+            _write_config_file(data)
+        return True
+    except Exception as e:
+        print(f"Error saving config: {e}")
+        return False
 
-def save_config(config):
-    """Save eBay API configuration"""
+def delete_account(account):
+    """Remove an account's credentials and tokens; the default account can't be removed"""
     ensure_config_dir()
     
     try:
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(config, f, indent=2)
+        with _config_lock:
+            data = _read_config_file()
+            if account == data["default_account"] or account not in data["accounts"]:
+                return False
+            del data["accounts"][account]
+            _write_config_file(data)
         return True
     except Exception as e:
         print(f"Error saving config: {e}")
         return False
 
-def is_configured():
+def is_configured(account=None):
     """Check if eBay credentials are configured"""
-    config = load_config()
+    config = load_config(account)
     return all([
         config.get("app_id"),
         config.get("dev_id"),
@@ -59,7 +139,9 @@ def load_defaults():
         return {
             "category_id": "",
             "condition": "NEW",
-            "quantity": 1
+            "quantity": 1,
+            "title_template": "",  # Empty uses listing_templates.DEFAULT_TITLE_TEMPLATE
+            "description_template": ""
         }
     
     try:
@@ -70,13 +152,88 @@ def load_defaults():
         return {}
 
 def save_defaults(defaults):
-    """Save listing defaults"""
+    """Save listing defaults; keys not given keep their saved values"""
     ensure_config_dir()
     
     try:
+        merged = {}
+        if DEFAULTS_FILE.exists():
+            with open(DEFAULTS_FILE, 'r') as f:
+                merged = json.load(f)
+        merged.update(defaults)
         with open(DEFAULTS_FILE, 'w') as f:
-            json.dump(defaults, f, indent=2)
+            json.dump(merged, f, indent=2)
         return True
     except Exception as e:
         print(f"Error saving defaults: {e}")
-        return False
\ No newline at end of file
+        return False
+
+STORAGE_FILE = CONFIG_DIR / "storage.json"
+
+DEFAULT_STORAGE_SETTINGS = {
+    "quota_mb": 5000,  # Total size allowed for the uploads folder
+    "archive_after_days": 7,  # Listed images older than this are archived
+    "delete_archives_after_days": 0,  # 0 keeps archive bundles forever
+    "maintenance_interval_minutes": 30
+}
+
+def load_storage_settings():
+    """Load uploads folder quota and retention settings"""
+    ensure_config_dir()
+    
+    settings = dict(DEFAULT_STORAGE_SETTINGS)
+    if not STORAGE_FILE.exists():
+        return settings
+    
+    try:
+        with open(STORAGE_FILE, 'r') as f:
+            settings.update(json.load(f))
+    except Exception as e:
+        print(f"Error loading storage settings: {e}")
+    return settings
+
+def save_storage_settings(settings):
+    """Save uploads folder quota and retention settings"""
+    ensure_config_dir()
+    
+    try:
+        with open(STORAGE_FILE, 'w') as f:
+            json.dump(settings, f, indent=2)
+        return True
+    except Exception as e:
+        print(f"Error saving storage settings: {e}")
+        return False
+
+NETWORK_FILE = CONFIG_DIR / "network.json"
+
+DEFAULT_NETWORK_SETTINGS = {
+    "mdns_enabled": False,  # Advertise <mdns_hostname>.local so phones keep one URL across networks
+    "mdns_hostname": "kingcyruscards"
+}
+
+def load_network_settings():
+    """Load mDNS hostname settings"""
+    ensure_config_dir()
+    
+    settings = dict(DEFAULT_NETWORK_SETTINGS)
+    if not NETWORK_FILE.exists():
+        return settings
+    
+    try:
+        with open(NETWORK_FILE, 'r') as f:
+            settings.update(json.load(f))
+    except Exception as e:
+        print(f"Error loading network settings: {e}")
+    return settings
+
+def save_network_settings(settings):
+    """Save mDNS hostname settings"""
+    ensure_config_dir()
+    
+    try:
+        with open(NETWORK_FILE, 'w') as f:
+            json.dump(settings, f, indent=2)
+        return True
+    except Exception as e:
+        print(f"Error saving network settings: {e}")
+        return False
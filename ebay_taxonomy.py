@@ -0,0 +1,275 @@
+import bisect
+import json
+import re
+import threading
+import time
+from ebay_config import CONFIG_DIR, ensure_config_dir, load_config
+
+# Category tree and item aspects are cached on disk so lookups and
+# autocomplete never need a network round trip
+TAXONOMY_CACHE_FILE = CONFIG_DIR / "taxonomy_cache.json"
+CACHE_VERSION = 1
+TREE_TTL = 7 * 24 * 3600  # Re-check the tree version weekly
+ASPECTS_TTL = 7 * 24 * 3600
+MAX_ASPECT_VALUES = 200  # Enough for autocomplete without bloating the cache
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokenize(text):
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def _flatten_tree(node, parent_path, categories):
+    """Walk a Taxonomy API tree node into {category_id: {...}} entries"""
+    stack = [(node, parent_path)]
+    while stack:
+        current, path = stack.pop()
+        category = current.get("category", {})
+        category_id = category.get("categoryId")
+        name = category.get("categoryName", "")
+        full_path = f"{path} > {name}" if path else name
+        if category_id:
+            categories[category_id] = {
+                "name": name,
+                "path": full_path,
+                "leaf": bool(current.get("leafCategoryTreeNode"))
+            }
+        for child in current.get("childCategoryTreeNodes", []) or []:
+            stack.append((child, full_path))
+
+
+def _parse_aspects(data):
+    aspects = []
+    for aspect in data.get("aspects", []) or []:
+        constraint = aspect.get("aspectConstraint", {})
+        values = [v.get("localizedValue") for v in aspect.get("aspectValues", []) or []]
+        aspects.append({
+            "name": aspect.get("localizedAspectName"),
+            "required": bool(constraint.get("aspectRequired")),
+            "mode": constraint.get("aspectMode", "FREE_TEXT"),
+            "multiple": constraint.get("itemToAspectCardinality") == "MULTI",
+            "values": [v for v in values if v][:MAX_ASPECT_VALUES]
+        })
+    return aspects
+
+
+class TaxonomyCache:
+    """On-disk cache of eBay category metadata with an in-memory search index"""
+
+    def __init__(self, path=TAXONOMY_CACHE_FILE, marketplace_id="EBAY_US"):
+        self.path = path
+        self.marketplace_id = marketplace_id
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._data = None
+        self._index = {}
+        self._tokens = []
+
+    def _empty(self):
+        return {
+            "cache_version": CACHE_VERSION,
+            "marketplace_id": self.marketplace_id,
+            "tree_id": None,
+            "tree_version": None,
+            "tree_checked_at": 0,
+            "categories": {},
+            "aspects": {}
+        }
+
+    def _load(self):
+        if self._data is not None:
+            return self._data
+
+        data = self._empty()
+        if self.path.exists():
+            try:
+                with open(self.path, 'r') as f:
+                    stored = json.load(f)
+                if (stored.get("cache_version") == CACHE_VERSION
+                        and stored.get("marketplace_id") == self.marketplace_id):
+                    data = stored
+            except Exception as e:
+                print(f"Error loading taxonomy cache: {e}")
+
+        self._data = data
+        self._build_index()
+        return data
+
+    def _save(self):
+        ensure_config_dir()
+        tmp_path = self.path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._data, f)
+            tmp_path.replace(self.path)
+        except Exception as e:
+            print(f"Error saving taxonomy cache: {e}")
+
+    def _build_index(self):
+        """Map every name token to the categories containing it"""
+        index = {}
+        for category_id, category in self._data["categories"].items():
+            for token in set(_tokenize(category["name"])):
+                index.setdefault(token, set()).add(category_id)
+        self._index = index
+        self._tokens = sorted(index)
+
+    def _prefix_matches(self, prefix):
+        """Union of categories having any token that starts with prefix"""
+        ids = set()
+        start = bisect.bisect_left(self._tokens, prefix)
+        for token in self._tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            ids |= self._index[token]
+        return ids
+
+    def _uploader(self):
+        from ebay_uploader import eBayUploader
+        return eBayUploader()
+
+    def is_stale(self):
+        with self._lock:
+            data = self._load()
+            return not data["categories"] or time.time() - data["tree_checked_at"] > TREE_TTL
+
+    def refresh(self, force=False, root_category_id=None):
+        """Refresh the category tree if the TTL expired and eBay has a new version
+
+        Network calls happen outside the main lock so lookups stay instant
+        while a refresh runs. Returns True if the tree was (re)downloaded.
+        """
+        with self._refresh_lock:
+            if not force and not self.is_stale():
+                return False
+
+            with self._lock:
+                data = self._load()
+                known = (data["tree_id"], data["tree_version"], bool(data["categories"]))
+
+            uploader = self._uploader()
+            tree_id, tree_version = uploader.get_default_category_tree_id(self.marketplace_id)
+
+            if not force and known == (tree_id, tree_version, True):
+                # Same version, only the TTL needs bumping
+                with self._lock:
+                    data["tree_checked_at"] = time.time()
+                    self._save()
+                return False
+
+            root_category_id = root_category_id or load_config().get("taxonomy_root_category_id")
+            tree = uploader.get_category_tree(tree_id, root_category_id)
+            root = tree.get("categorySubtreeNode") or tree.get("rootCategoryNode") or {}
+
+            categories = {}
+            _flatten_tree(root, "", categories)
+
+            with self._lock:
+                if tree_version != data["tree_version"]:
+                    data["aspects"] = {}  # Aspects may differ between tree versions
+                data.update({
+                    "tree_id": tree_id,
+                    "tree_version": tree_version,
+                    "tree_checked_at": time.time(),
+                    "categories": categories
+                })
+                self._build_index()
+                self._save()
+            return True
+
+    def get_category(self, category_id):
+        with self._lock:
+            category = self._load()["categories"].get(str(category_id))
+            return dict(category, id=str(category_id)) if category else None
+
+    def search(self, query, limit=10, leaf_only=True):
+        """Autocomplete categories whose name tokens start with the query tokens"""
+        tokens = _tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            data = self._load()
+            if str(query).strip().isdigit():
+                category = self.get_category(query.strip())
+                return [category] if category else []
+
+            matches = None
+            for token in tokens:
+                ids = self._prefix_matches(token)
+                matches = ids if matches is None else matches & ids
+                if not matches:
+                    return []
+
+            results = []
+            for category_id in matches:
+                category = data["categories"][category_id]
+                if leaf_only and not category["leaf"]:
+                    continue
+                results.append(dict(category, id=category_id))
+
+        results.sort(key=lambda c: (len(c["name"]), c["path"]))
+        return results[:limit]
+
+    def get_aspects(self, category_id, fetch=True):
+        """Return cached aspects for a category, fetching them once if allowed
+
+        Returns None when nothing is cached and the fetch is disabled or fails.
+        """
+        category_id = str(category_id)
+        with self._lock:
+            data = self._load()
+            entry = data["aspects"].get(category_id)
+            fresh = entry and time.time() - entry["fetched_at"] < ASPECTS_TTL
+            if fresh or not fetch:
+                return entry["aspects"] if entry else None
+
+        try:
+            if not data["tree_id"]:
+                self.refresh()
+            response = self._uploader().get_item_aspects(data["tree_id"], category_id)
+        except Exception as e:
+            print(f"Error fetching aspects for {category_id}: {e}")
+            return entry["aspects"] if entry else None
+
+        aspects = _parse_aspects(response)
+        with self._lock:
+            data["aspects"][category_id] = {"fetched_at": time.time(), "aspects": aspects}
+            self._save()
+        return aspects
+
+    def required_aspects(self, category_id, fetch=False):
+        aspects = self.get_aspects(category_id, fetch=fetch) or []
+        return [a["name"] for a in aspects if a["required"]]
+
+    def missing_required_aspects(self, category_id, aspects):
+        """Names of required aspects absent from an aspects dict (cache only)"""
+        provided = {name.lower() for name, value in (aspects or {}).items() if value}
+        return [name for name in self.required_aspects(category_id)
+                if name.lower() not in provided]
+
+    def status(self):
+        with self._lock:
+            data = self._load()
+            return {
+                "tree_id": data["tree_id"],
+                "tree_version": data["tree_version"],
+                "tree_checked_at": data["tree_checked_at"],
+                "categories": len(data["categories"]),
+                "cached_aspects": len(data["aspects"]),
+                "stale": self.is_stale()
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_taxonomy_cache():
+    """Return the process-wide taxonomy cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TaxonomyCache()
+        return _cache
@@ -1,13 +1,40 @@
-import requests
 import base64
+import os
+import re
 import secrets
+import uuid
 import webbrowser
 from urllib.parse import urlencode
-from ebay_config import load_config, save_config
+from ebay_config import load_config, save_config, default_account
+from listing_validator import validate_listing, ListingValidationError
+from lazy_imports import lazy_import
+
+requests = lazy_import('requests')
+
+
+def default_transport():
+    """Cassette named by EBAY_CASSETTE, if set (see ebay_cassette)"""
+    if os.environ.get("EBAY_CASSETTE"):
+        from ebay_cassette import cassette_from_env
+        return cassette_from_env()
+    return None
+
+# bulkUpdatePriceQuantity accepts at most this many SKUs per request
+BULK_UPDATE_LIMIT = 25
+# Seconds before a call is abandoned, so a dropped connection surfaces as an
+# error (and the listing goes to the outbox) instead of hanging
+REQUEST_TIMEOUT = 60
 
 class eBayUploader:
-    def __init__(self):
-        self.config = load_config()
+    def __init__(self, transport=None, account=None):
+        # Each seller account keeps its own credentials and tokens (see ebay_config)
+        self.account = account or default_account()
+        self.config = load_config(self.account)
+        # Anything with requests' get/post/put; ebay_cassette records or replays through it
+        transport = transport or default_transport()
+        self.http = transport or requests
+        # Tokens served from a replayed cassette must not overwrite the saved ones
+        self.persist_tokens = not getattr(transport, 'replaying', False)
         self.sandbox_url = "https://api.sandbox.ebay.com"
         self.production_url = "https://api.ebay.com"
         self.base_url = self.sandbox_url if self.config.get("environment") == "sandbox" else self.production_url
@@ -45,7 +72,7 @@ class eBayUploader:
         # Save state to config for verification
         config = self.config.copy()
         config["oauth_state"] = state
-        save_config(config)
+        save_config(config, self.account)
         
         return f"{self.auth_url}?{urlencode(params)}"
     
@@ -54,21 +81,8 @@ class eBayUploader:
         if not all([self.config.get("app_id"), self.config.get("cert_id")]):
             raise Exception("eBay credentials not configured")
         
-        is_sandbox = self.config.get("environment") == "sandbox"
-        url = (
-        "https://api.sandbox.ebay.com/identity/v1/oauth2/token"
-        if is_sandbox
-        else "https://api.ebay.com/identity/v1/oauth2/token"
-        )
-        
-        # Create base64 encoded credentials
-        credentials = f"{self.config['app_id']}:{self.config['cert_id']}"
-        encoded_credentials = base64.b64encode(credentials.encode()).decode()
-        
-        headers = {
-            "Content-Type": "application/x-www-form-urlencoded",
-            "Authorization": f"Basic {encoded_credentials}"
-        }
+        url = self._token_url()
+        headers = self._token_headers()
         
         data = {
             "grant_type": "authorization_code",
@@ -78,24 +92,14 @@ class eBayUploader:
         
         try:
             print(f"Exchanging code for token...")
-            response = requests.post(url, headers=headers, data=data)
+            response = self.http.post(url, headers=headers, data=data, timeout=REQUEST_TIMEOUT)
             print(f"Token exchange status: {response.status_code}")
             
             if response.status_code != 200:
                 print(f"Token exchange error: {response.text}")
                 raise Exception(f"Token exchange failed: {response.text}")
             
-            token_data = response.json()
-            
-            # Save tokens to config
-            config = self.config.copy()
-            config["user_token"] = token_data.get("access_token")
-            config["refresh_token"] = token_data.get("refresh_token")
-            config["token_expires_in"] = token_data.get("expires_in")
-            save_config(config)
-            
-            self.token = token_data.get("access_token")
-            self.refresh_token = token_data.get("refresh_token")
+            self._store_tokens(response.json())
             
             print("Token obtained successfully!")
             return True
@@ -108,45 +112,59 @@ class eBayUploader:
         if not self.refresh_token:
             raise Exception("No refresh token available")
         
-        is_sandbox = self.config.get("environment") == "sandbox"
-        url = (
-            "https://api.sandbox.ebay.com/identity/v1/oauth2/token"
-            if is_sandbox
-            else "https://api.ebay.com/identity/v1/oauth2/token"
-        )
+        url = self._token_url()
+        headers = self._token_headers()
+        data = self._refresh_request_data()
+        
+        try:
+            response = self.http.post(url, headers=headers, data=data, timeout=REQUEST_TIMEOUT)
+            if response.status_code == 200:
+                self._store_tokens(response.json())
+                return True
+        except:
+            pass
+        
+        return False
+    
+    def _token_url(self):
+        if self.config.get("environment") == "sandbox":
+            return "https://api.sandbox.ebay.com/identity/v1/oauth2/token"
+        return "https://api.ebay.com/identity/v1/oauth2/token"
+    
+    def _token_headers(self):
+        # Create base64 encoded credentials
         credentials = f"{self.config['app_id']}:{self.config['cert_id']}"
         encoded_credentials = base64.b64encode(credentials.encode()).decode()
-        
-        headers = {
+        return {
             "Content-Type": "application/x-www-form-urlencoded",
             "Authorization": f"Basic {encoded_credentials}"
         }
-        
+    
+    def _refresh_request_data(self):
         scope_base = (
             "https://api.sandbox.ebay.com"
             if self.config.get("environment") == "sandbox"
             else "https://api.ebay.com"
         )
-
-        data = {
+        return {
             "grant_type": "refresh_token",
             "refresh_token": self.refresh_token,
             "scope": f"{scope_base}/oauth/api_scope/sell.inventory {scope_base}/oauth/api_scope/sell.account {scope_base}/oauth/api_scope"
         }
-        
-        try:
-            response = requests.post(url, headers=headers, data=data)
-            if response.status_code == 200:
-                token_data = response.json()
-                config = self.config.copy()
-                config["user_token"] = token_data.get("access_token")
-                save_config(config)
-                self.token = token_data.get("access_token")
-                return True
-        except:
-            pass
-        
-        return False
+    
+    def _store_tokens(self, token_data):
+        """Save tokens from a token endpoint response to config"""
+        config = self.config.copy()
+        config["user_token"] = token_data.get("access_token")
+        if token_data.get("refresh_token"):
+            config["refresh_token"] = token_data.get("refresh_token")
+            self.refresh_token = token_data.get("refresh_token")
+        if token_data.get("expires_in"):
+            config["token_expires_in"] = token_data.get("expires_in")
+        if self.persist_tokens:
+            save_config(config, self.account)
+        self.config = config
+        self.token = token_data.get("access_token")
     
     
     def upload_image(self, image_path):
@@ -163,13 +181,13 @@ class eBayUploader:
         
         try:
             with open(image_path, 'rb') as f:
-                response = requests.post(url, headers=headers, data=f)
+                response = self.http.post(url, headers=headers, data=f, timeout=REQUEST_TIMEOUT)
                 response.raise_for_status()
                 return response.json()
         except Exception as e:
             raise Exception(f"Failed to upload image: {str(e)}")
     
-    def create_listing(self, listing_data):
+    def create_listing(self, listing_data, progress=None):
         """Create an eBay listing
         
         listing_data should include:
@@ -179,8 +197,19 @@ class eBayUploader:
         - quantity: int
         - category_id: str
         - image_urls: list of str
-        - condition: str (e.g., "NEW", "USED")
+        - condition: str (e.g., "NEW", "USED_GOOD")
+        
+        Raises ListingValidationError before any request if the payload
+        would be rejected by eBay.
+        
+        progress is an optional dict updated in place with the sku and
+        offer_id as the steps complete; passing it back (e.g. through the
+        outbox) resumes from the failed step instead of creating a second
+        offer.
         """
+        _, errors = validate_listing(listing_data, image_field='image_urls')
+        if errors:
+            raise ListingValidationError(errors)
         
         url = f"{self.base_url}/sell/inventory/v1/inventory_item"
         
@@ -190,8 +219,51 @@ class eBayUploader:
             "Content-Language": "en-US"
         }
         
-        # Construct the inventory item
-        payload = {
+        payload = self._inventory_item_payload(listing_data)
+        
+        progress = progress if progress is not None else {}
+        sku = progress.get("sku") or self._listing_sku(listing_data)
+        progress["sku"] = sku
+        try:
+            offer_id = progress.get("offer_id")
+            if not offer_id:
+                # First create inventory item
+                print(f"Creating inventory item with SKU: {sku}")
+                print(f"URL: {url}/{sku}")
+                print(f"Payload: {payload}")
+                
+                response = self.http.put(f"{url}/{sku}", headers=headers, json=payload, timeout=REQUEST_TIMEOUT)
+                print(f"Inventory response status: {response.status_code}")
+                print(f"Inventory response: {response.text}")
+                
+                response.raise_for_status()
+                
+                # Then create offer
+                offer_id = progress["offer_id"] = self._create_offer(sku, listing_data)
+            
+            # Publish the offer
+            result = self._publish_offer(offer_id)
+            # Keep the identifiers later revisions need
+            result.setdefault("sku", sku)
+            result.setdefault("offerId", offer_id)
+            return result
+        except Exception as e:
+            print(f"Error in create_listing: {str(e)}")
+            raise Exception(f"Failed to create listing: {str(e)}")
+    
+    def _listing_sku(self, listing_data):
+        """A new SKU for each listing: ITEM_<title slug>_<random suffix>
+
+        Titles repeat, so the suffix keeps two listings of the same card from
+        overwriting each other's inventory item. Retries reuse the SKU saved
+        in progress rather than calling this again.
+        """
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', listing_data.get('title') or 'item').strip('_')[:20] or 'item'
+        return f"ITEM_{slug}_{uuid.uuid4().hex[:8]}"
+    
+    def _inventory_item_payload(self, listing_data):
+        """Construct the inventory item"""
+        return {
             "product": {
                 "title": listing_data.get("title"),
                 "description": listing_data.get("description"),
@@ -205,36 +277,9 @@ class eBayUploader:
                 }
             }
         }
-        
-        try:
-            # First create inventory item
-            sku = f"ITEM_{listing_data.get('title', 'item').replace(' ', '_')[:20]}"
-            print(f"Creating inventory item with SKU: {sku}")
-            print(f"URL: {url}/{sku}")
-            print(f"Payload: {payload}")
-            
-            response = requests.put(f"{url}/{sku}", headers=headers, json=payload)
-            print(f"Inventory response status: {response.status_code}")
-            print(f"Inventory response: {response.text}")
-            
-            response.raise_for_status()
-            
-            # Then create offer
-            return self._create_offer(sku, listing_data)
-        except Exception as e:
-            print(f"Error in create_listing: {str(e)}")
-            raise Exception(f"Failed to create listing: {str(e)}")
     
-    def _create_offer(self, sku, listing_data):
-        """Create an offer for the inventory item"""
-        url = f"{self.base_url}/sell/inventory/v1/offer"
-        
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
+    def _offer_payload(self, sku, listing_data):
+        return {
             "sku": sku,
             "marketplaceId": "EBAY_US",
             "format": "FIXED_PRICE",
@@ -248,14 +293,22 @@ class eBayUploader:
             "quantityLimitPerBuyer": 1,
             "categoryId": listing_data.get("category_id", "")
         }
+    
+    def _create_offer(self, sku, listing_data):
+        """Create an offer for the inventory item; returns its offerId"""
+        url = f"{self.base_url}/sell/inventory/v1/offer"
+        
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json"
+        }
+        
+        payload = self._offer_payload(sku, listing_data)
         
         try:
-            response = requests.post(url, headers=headers, json=payload)
+            response = self.http.post(url, headers=headers, json=payload, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
-            offer_id = response.json().get("offerId")
-            
-            # Publish the offer
-            return self._publish_offer(offer_id)
+            return response.json().get("offerId")
         except Exception as e:
             raise Exception(f"Failed to create offer: {str(e)}")
     
@@ -269,8 +322,87 @@ class eBayUploader:
         }
         
         try:
-            response = requests.post(url, headers=headers)
+            response = self.http.post(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            raise Exception(f"Failed to publish offer: {str(e)}")
+    
+    def bulk_update_price_quantity(self, updates):
+        """Revise price and/or quantity of up to BULK_UPDATE_LIMIT offers in one call
+        
+        updates is a list of dicts with sku, offer_id and price and/or
+        quantity. Returns eBay's per-item responses.
+        """
+        if len(updates) > BULK_UPDATE_LIMIT:
+            raise ValueError(f"At most {BULK_UPDATE_LIMIT} updates per call")
+        
+        url = f"{self.base_url}/sell/inventory/v1/bulk_update_price_quantity"
+        
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json"
+        }
+        
+        try:
+            response = self.http.post(url, headers=headers, json=self._bulk_update_payload(updates),
+                                      timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            return response.json().get("responses", [])
+        except Exception as e:
+            raise Exception(f"Failed to update prices: {str(e)}")
+    
+    def _bulk_update_payload(self, updates):
+        requests_list = []
+        for update in updates:
+            offer = {"offerId": update["offer_id"]}
+            item = {"sku": update["sku"], "offers": [offer]}
+            if update.get("price") is not None:
+                offer["price"] = {"value": f"{update['price']:.2f}", "currency": "USD"}
+            if update.get("quantity") is not None:
+                offer["availableQuantity"] = update["quantity"]
+                item["shipToLocationAvailability"] = {"quantity": update["quantity"]}
+            requests_list.append(item)
+        return {"requests": requests_list}
+    
+    def _taxonomy_get(self, path, params=None):
+        """GET a Taxonomy API resource, refreshing the token once on 401"""
+        url = f"{self.base_url}/commerce/taxonomy/v1/{path}"
+        
+        for attempt in range(2):
+            headers = {
+                "Authorization": f"Bearer {self.token}",
+                "Accept-Encoding": "gzip"
+            }
+            response = self.http.get(url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
+            if response.status_code == 401 and attempt == 0 and self.refresh_access_token():
+                continue
             response.raise_for_status()
             return response.json()
+    
+    def get_default_category_tree_id(self, marketplace_id="EBAY_US"):
+        """Return the category tree ID and version for a marketplace"""
+        try:
+            data = self._taxonomy_get("get_default_category_tree_id",
+                                      params={"marketplace_id": marketplace_id})
+            return data.get("categoryTreeId"), data.get("categoryTreeVersion")
+        except Exception as e:
+            raise Exception(f"Failed to get category tree ID: {str(e)}")
+    
+    def get_category_tree(self, tree_id, root_category_id=None):
+        """Fetch a whole category tree, or just the subtree under root_category_id"""
+        try:
+            if root_category_id:
+                return self._taxonomy_get(f"category_tree/{tree_id}/get_category_subtree",
+                                          params={"category_id": root_category_id})
+            return self._taxonomy_get(f"category_tree/{tree_id}")
+        except Exception as e:
+            raise Exception(f"Failed to get category tree: {str(e)}")
+    
+    def get_item_aspects(self, tree_id, category_id):
+        """Fetch the item aspects (item specifics) for a leaf category"""
+        try:
+            return self._taxonomy_get(f"category_tree/{tree_id}/get_item_aspects_for_category",
+                                      params={"category_id": category_id})
         except Exception as e:
-            raise Exception(f"Failed to publish offer: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Failed to get item aspects: {str(e)}")
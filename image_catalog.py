@@ -0,0 +1,359 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+CATALOG_FILENAME = '.catalog.sqlite3'
+
+# Each entry upgrades the schema by one version; never edit old entries
+_MIGRATIONS = [
+    """
+    CREATE TABLE images (
+        filename TEXT PRIMARY KEY,
+        uploaded_at REAL NOT NULL,
+        size INTEGER NOT NULL DEFAULT 0,
+        signature BLOB,
+        draft_id INTEGER
+    );
+    CREATE TABLE drafts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        status TEXT NOT NULL DEFAULT 'open',
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX images_uploaded_at ON images (uploaded_at);
+    CREATE INDEX images_draft_id ON images (draft_id);
+    """,
+    """
+    CREATE TABLE archived_images (
+        filename TEXT PRIMARY KEY,
+        bundle TEXT NOT NULL,
+        uploaded_at REAL NOT NULL,
+        archived_at REAL NOT NULL
+    );
+    """,
+    """
+    ALTER TABLE images ADD COLUMN content_hash TEXT;
+    """,
+    """
+    CREATE TABLE changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename TEXT NOT NULL,
+        op TEXT NOT NULL
+    );
+    """,
+    """
+    ALTER TABLE images ADD COLUMN sharpness REAL;
+    ALTER TABLE images ADD COLUMN brightness REAL;
+    ALTER TABLE images ADD COLUMN glare REAL;
+    ALTER TABLE images ADD COLUMN quality_warnings TEXT;
+    ALTER TABLE images ADD COLUMN quality_checked_at REAL;
+    """,
+    """
+    ALTER TABLE images ADD COLUMN crop_status TEXT;
+    """,
+    """
+    ALTER TABLE images ADD COLUMN phash TEXT;
+    ALTER TABLE archived_images ADD COLUMN phash TEXT;
+    """,
+    """
+    CREATE TABLE outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        listing TEXT NOT NULL,
+        draft_id INTEGER,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        last_error TEXT,
+        result TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX outbox_due ON outbox(status, next_attempt_at);
+    """,
+    """
+    CREATE TABLE listings (
+        sku TEXT PRIMARY KEY,
+        offer_id TEXT,
+        listing_id TEXT,
+        title TEXT,
+        category_id TEXT,
+        price REAL,
+        quantity INTEGER,
+        draft_id INTEGER,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX listings_category ON listings(category_id);
+    """,
+    """
+    ALTER TABLE drafts ADD COLUMN card_fields TEXT;
+    """,
+    """
+    ALTER TABLE outbox ADD COLUMN account TEXT;
+    CREATE TABLE listings_by_account (
+        account TEXT NOT NULL DEFAULT '',
+        sku TEXT NOT NULL,
+        offer_id TEXT,
+        listing_id TEXT,
+        title TEXT,
+        category_id TEXT,
+        price REAL,
+        quantity INTEGER,
+        draft_id INTEGER,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (account, sku)
+    );
+    INSERT INTO listings_by_account (sku, offer_id, listing_id, title, category_id, price, quantity,
+                                     draft_id, created_at, updated_at)
+        SELECT sku, offer_id, listing_id, title, category_id, price, quantity, draft_id, created_at, updated_at
+        FROM listings;
+    DROP TABLE listings;
+    ALTER TABLE listings_by_account RENAME TO listings;
+    CREATE INDEX listings_category ON listings(category_id);
+    """,
+    """
+    ALTER TABLE outbox ADD COLUMN sku TEXT;
+    ALTER TABLE outbox ADD COLUMN offer_id TEXT;
+    """,
+]
+
+# Delta sync clients further behind than this have to do a full reload
+MAX_CHANGES = 20000
+
+_TIMESTAMP_RE = re.compile(r'^(\d{8}_\d{6})_')
+
+
+def upload_time_from_filename(filename, fallback=None):
+    """Upload time encoded by /upload in the filename prefix (YYYYmmdd_HHMMSS_)"""
+    match = _TIMESTAMP_RE.match(filename)
+    if match:
+        try:
+            return datetime.strptime(match.group(1), '%Y%m%d_%H%M%S').timestamp()
+        except ValueError:
+            pass
+    return fallback
+
+
+class ImageCatalog:
+    """SQLite index of the uploads folder
+
+    Keeps per-image metadata so the app doesn't have to re-scan or re-decode
+    files. One connection is shared between threads behind a lock; every
+    operation is a short transaction.
+    """
+
+    def __init__(self, upload_folder):
+        self.upload_folder = upload_folder
+        self.path = os.path.join(upload_folder, CATALOG_FILENAME)
+        self._lock = threading.RLock()
+        os.makedirs(upload_folder, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._migrate()
+
+    def _migrate(self):
+        with self._lock:
+            version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+            for number, script in enumerate(_MIGRATIONS[version:], start=version + 1):
+                self._conn.executescript(f"BEGIN; {script}; PRAGMA user_version = {number}; COMMIT;")
+
+    def execute(self, sql, params=()):
+        """Run a single statement (autocommit) and return all rows"""
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def transaction(self):
+        """Context manager yielding the connection for multi-statement writes
+
+        Usage: with catalog.transaction() as conn: ...
+        """
+        return _Transaction(self)
+
+    def add_image(self, filename, uploaded_at=None):
+        filepath = os.path.join(self.upload_folder, filename)
+        size = os.path.getsize(filepath) if os.path.exists(filepath) else 0
+        uploaded_at = uploaded_at or time.time()
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO images (filename, uploaded_at, size) VALUES (?, ?, ?)',
+                (filename, uploaded_at, size))
+            if cursor.rowcount:
+                self._log_change(conn, filename, 'add')
+        return uploaded_at
+
+    def remove_image(self, filename, conn=None):
+        """Drop an image from the catalog; pass conn to join an open transaction"""
+        if conn is None:
+            with self.transaction() as conn:
+                return self.remove_image(filename, conn)
+        cursor = conn.execute('DELETE FROM images WHERE filename = ?', (filename,))
+        if cursor.rowcount:
+            self._log_change(conn, filename, 'delete')
+
+    def _log_change(self, conn, filename, op):
+        seq = conn.execute('INSERT INTO changes (filename, op) VALUES (?, ?)', (filename, op)).lastrowid
+        if seq % 1000 == 0:
+            conn.execute('DELETE FROM changes WHERE seq <= ?', (seq - MAX_CHANGES,))
+
+    def change_token(self):
+        """Sequence number of the latest change; 0 for an empty log"""
+        return self.execute('SELECT COALESCE(MAX(seq), 0) FROM changes')[0][0]
+
+    def changes_since(self, token):
+        """Net additions, updates and deletions after a change token
+
+        Returns (added, updated, deleted, latest_token), newest first, or
+        None when the token is unknown or older than the retained log and
+        the client must reload.
+        """
+        with self._lock:
+            latest = self.change_token()
+            oldest = self.execute('SELECT COALESCE(MIN(seq), 1) FROM changes')[0][0]
+            if token > latest or (token < oldest - 1 and latest):
+                return None
+            rows = self.execute('SELECT filename, op FROM changes WHERE seq > ? ORDER BY seq', (token,))
+
+        # Fold the log into one net change per file
+        net = {}
+        for row in rows:
+            previous = net.pop(row['filename'], None)
+            op = row['op']
+            if op == 'update' and previous == 'add':
+                op = 'add'  # Still new to the client
+            net[row['filename']] = op
+
+        ordered = list(reversed(net.items()))
+        added = [f for f, op in ordered if op == 'add']
+        updated = [f for f, op in ordered if op == 'update']
+        deleted = [f for f, op in ordered if op == 'delete']
+        return added, updated, deleted, latest
+
+    def set_quality(self, filename, scores):
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                """UPDATE images SET sharpness = ?, brightness = ?, glare = ?,
+                   quality_warnings = ?, quality_checked_at = ? WHERE filename = ?""",
+                (scores['sharpness'], scores['brightness'], scores['glare'],
+                 ','.join(scores['warnings']), time.time(), filename))
+            if cursor.rowcount:
+                self._log_change(conn, filename, 'update')
+
+    def get_quality(self, filenames=None):
+        """Quality scores by filename; all images with warnings if no names given"""
+        if filenames is None:
+            rows = self.execute("SELECT * FROM images WHERE quality_warnings != ''")
+        else:
+            rows = []
+            names = list(filenames)
+            for i in range(0, len(names), 500):  # Stay under SQLite's variable limit
+                chunk = names[i:i + 500]
+                rows += self.execute(
+                    f"SELECT * FROM images WHERE filename IN ({','.join('?' for _ in chunk)})", chunk)
+        return {
+            row['filename']: {
+                'checked': row['quality_checked_at'] is not None,
+                'sharpness': row['sharpness'],
+                'brightness': row['brightness'],
+                'glare': row['glare'],
+                'warnings': [w for w in (row['quality_warnings'] or '').split(',') if w]
+            }
+            for row in rows
+        }
+
+    def page(self, limit, after=None):
+        """Keyset page of filenames, newest first, starting after a filename"""
+        if after:
+            rows = self.execute('SELECT filename FROM images WHERE filename < ? '
+                                'ORDER BY filename DESC LIMIT ?', (after, limit))
+        else:
+            rows = self.execute('SELECT filename FROM images ORDER BY filename DESC LIMIT ?', (limit,))
+        return [row['filename'] for row in rows]
+
+    def get_image(self, filename):
+        rows = self.execute('SELECT * FROM images WHERE filename = ?', (filename,))
+        return dict(rows[0]) if rows else None
+
+    def list_filenames(self):
+        return [row['filename'] for row in
+                self.execute('SELECT filename FROM images ORDER BY filename DESC')]
+
+    def record_listing(self, listing_data, result, draft_id=None, conn=None, account=None):
+        """Remember a published listing so it can be revised later
+
+        account is the (resolved) name of the seller account it was listed
+        on. SKUs are only unique within an account.
+        """
+        if not result or not result.get('sku'):
+            return
+        now = time.time()
+        params = (result['sku'], result.get('offerId'), result.get('listingId'), listing_data.get('title'),
+                  str(listing_data.get('category_id', '')), float(listing_data.get('price') or 0),
+                  int(listing_data.get('quantity') or 1), draft_id, account, now, now)
+        sql = ('INSERT OR REPLACE INTO listings (sku, offer_id, listing_id, title, category_id, price, '
+               'quantity, draft_id, account, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)')
+        if conn is None:
+            self.execute(sql, params)
+        else:
+            conn.execute(sql, params)
+
+    def assign_default_account(self, account):
+        """Give listings and outbox entries from before multi-account support an account
+
+        They were stored under '' / NULL; new ones carry the account name, so
+        without this one seller would show up under two keys.
+        """
+        with self.transaction() as conn:
+            # A SKU recorded under both keys keeps the newer, named row
+            conn.execute("UPDATE OR IGNORE listings SET account = ? WHERE account = ''", (account,))
+            conn.execute("DELETE FROM listings WHERE account = ''")
+            conn.execute("UPDATE outbox SET account = ? WHERE account IS NULL OR account = ''", (account,))
+
+    def list_listings(self):
+        return [dict(row) for row in self.execute('SELECT * FROM listings ORDER BY created_at DESC')]
+
+    def sync_folder(self, is_image):
+        """Reconcile the catalog with files added or removed outside the app
+
+        Returns (added, removed) filename lists. Added files are returned in
+        upload order so they can be fed to the grouping stage.
+        """
+        on_disk = {f for f in os.listdir(self.upload_folder) if is_image(f)}
+        known = set(self.list_filenames())
+
+        added = []
+        for filename in sorted(on_disk - known):
+            mtime = os.path.getmtime(os.path.join(self.upload_folder, filename))
+            self.add_image(filename, upload_time_from_filename(filename, mtime))
+            added.append(filename)
+
+        removed = sorted(known - on_disk)
+        for filename in removed:
+            self.remove_image(filename)
+
+        return added, removed
+
+
+class _Transaction:
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def __enter__(self):
+        self.catalog._lock.acquire()
+        self.catalog._conn.execute('BEGIN')
+        return self.catalog._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.catalog._conn.execute('COMMIT')
+            else:
+                self.catalog._conn.execute('ROLLBACK')
+        finally:
+            self.catalog._lock.release()
+        return False
@@ -0,0 +1,110 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+# Photos are scored on a copy this size so a burst analyses quickly
+ANALYSIS_SIZE = 512
+
+# Thresholds tuned on phone shots of cards at ANALYSIS_SIZE
+BLUR_THRESHOLD = 60.0  # Variance of the Laplacian below this is blurry
+DARK_THRESHOLD = 55.0  # Mean luminance (0-255)
+BRIGHT_THRESHOLD = 215.0
+CLIPPED_FRACTION = 0.12  # Share of pixels crushed to black or blown to white
+GLARE_FRACTION = 0.03  # Share of near-white, colorless pixels
+
+WARNINGS = {
+    'blurry': 'Photo looks blurry',
+    'dark': 'Photo is too dark',
+    'overexposed': 'Photo is overexposed',
+    'glare': 'Glare detected on the card'
+}
+
+
+def load_for_analysis(filepath, size=ANALYSIS_SIZE):
+    """Decode a downscaled RGB copy as a uint8 array"""
+    with Image.open(filepath) as img:
+        img.draft('RGB', (size, size))  # JPEG decodes straight to a smaller scale
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        img.thumbnail((size, size), Image.BILINEAR)
+        return np.asarray(img, dtype=np.uint8)
+
+
+def score_image(rgb):
+    """Sharpness, exposure and glare metrics for an RGB uint8 array"""
+    rgb = rgb.astype(np.float32)
+    # ITU-R BT.601 luma
+    gray = rgb[..., 0] * 0.299 + rgb[..., 1] * 0.587 + rgb[..., 2] * 0.114
+
+    # 4-neighbour Laplacian using array slices instead of a convolution loop
+    laplacian = (gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+                 - 4.0 * gray[1:-1, 1:-1])
+    sharpness = float(laplacian.var())
+
+    histogram = np.bincount(gray.astype(np.uint8).ravel(), minlength=256)
+    total = float(histogram.sum())
+    brightness = float(np.dot(np.arange(256), histogram) / total)
+    shadows = float(histogram[:16].sum() / total)
+    highlights = float(histogram[240:].sum() / total)
+
+    channel_max = rgb.max(axis=2)
+    saturation = channel_max - rgb.min(axis=2)
+    glare = float(np.count_nonzero((channel_max >= 245) & (saturation <= 20)) / total)
+
+    warnings = []
+    if sharpness < BLUR_THRESHOLD:
+        warnings.append('blurry')
+    if brightness < DARK_THRESHOLD or shadows > CLIPPED_FRACTION * 2:
+        warnings.append('dark')
+    if brightness > BRIGHT_THRESHOLD or highlights > CLIPPED_FRACTION:
+        warnings.append('overexposed')
+    if glare > GLARE_FRACTION:
+        warnings.append('glare')
+
+    return {
+        'sharpness': round(sharpness, 1),
+        'brightness': round(brightness, 1),
+        'shadows': round(shadows, 4),
+        'highlights': round(highlights, 4),
+        'glare': round(glare, 4),
+        'warnings': warnings
+    }
+
+
+def analyze_file(filepath):
+    return score_image(load_for_analysis(filepath))
+
+
+class QualityAnalyzer:
+    """Scores uploads on a small thread pool and stores results in the catalog
+
+    Pillow's decoder and NumPy both release the GIL for the heavy work, so
+    threads give real parallelism without blocking request handlers.
+    """
+
+    def __init__(self, catalog, workers=None):
+        self.catalog = catalog
+        self._executor = ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1),
+                                            thread_name_prefix='quality')
+
+    def submit(self, filename):
+        return self._executor.submit(self._analyze, filename)
+
+    def _analyze(self, filename):
+        started = time.perf_counter()
+        try:
+            scores = analyze_file(os.path.join(self.catalog.upload_folder, filename))
+        except Exception as e:
+            print(f"Error analysing {filename}: {e}")
+            return None
+        self.catalog.set_quality(filename, scores)
+        scores['seconds'] = round(time.perf_counter() - started, 3)
+        return scores
+
+    def pending(self):
+        """Catalogued images that have not been scored yet"""
+        return [row['filename'] for row in
+                self.catalog.execute('SELECT filename FROM images WHERE quality_checked_at IS NULL')]
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import queue
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageOps, features
+from storage_maintenance import DERIVED_DIRNAME
+
+# Uploaded files never change once written (names are timestamped and
+# unique), so browsers may cache them for a year without revalidating
+CACHE_MAX_AGE = 365 * 24 * 3600
+WEBP_QUALITY = 80
+WEBP_ENABLED = features.check('webp')
+# Hashes remembered for files outside the catalog (crops, collages, ...)
+HASH_CACHE_SIZE = 2048
+
+
+def _file_hash(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+class ImageServer:
+    """Validators and WebP derivatives for files in the uploads folder"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.upload_folder = catalog.upload_folder
+        self.webp_folder = os.path.join(self.upload_folder, DERIVED_DIRNAME, 'webp')
+        self._hashes = OrderedDict()  # (filename, size, mtime) -> hash for uncatalogued files, oldest first
+        self._hashes_lock = threading.Lock()
+        self._pending = set()
+        self._no_gain = set()  # Files whose WebP wouldn't be smaller
+        self._failed = set()  # Files that couldn't be converted (corrupt or truncated)
+        self._pending_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+
+    def content_hash(self, filename, filepath):
+        """Content hash of an upload, computed once and stored in the catalog"""
+        image = self.catalog.get_image(filename)
+        if image and image.get('content_hash'):
+            return image['content_hash']
+
+        stat = os.stat(filepath)
+        key = (filename, stat.st_size, stat.st_mtime)
+        with self._hashes_lock:
+            if key in self._hashes:
+                self._hashes.move_to_end(key)
+                return self._hashes[key]
+
+        content_hash = _file_hash(filepath)
+        if image:
+            self.catalog.execute('UPDATE images SET content_hash = ? WHERE filename = ?',
+                                 (content_hash, filename))
+        else:
+            with self._hashes_lock:
+                self._hashes[key] = content_hash
+                while len(self._hashes) > HASH_CACHE_SIZE:
+                    self._hashes.popitem(last=False)
+        return content_hash
+
+    def webp_path(self, filename):
+        return os.path.join(self.webp_folder, os.path.splitext(filename)[0] + '.webp')
+
+    def webp_variant(self, filename, accept_header):
+        """Path of a ready WebP derivative if the client accepts WebP
+
+        Missing derivatives are generated in the background and None is
+        returned, so the first request is served from the original.
+        """
+        if not WEBP_ENABLED or 'image/webp' not in (accept_header or ''):
+            return None
+        if filename.lower().endswith(('.gif', '.webp')) or filename in self._no_gain or filename in self._failed:
+            return None
+
+        path = self.webp_path(filename)
+        if os.path.exists(path):
+            return path
+
+        with self._pending_lock:
+            if filename not in self._pending:
+                self._pending.add(filename)
+                self._start()
+                self._queue.put(filename)
+        return None
+
+    def is_pending(self, filename):
+        with self._pending_lock:
+            return filename in self._pending
+
+    def remove_derivatives(self, filename):
+        """Delete a file's WebP and forget what was remembered about it"""
+        path = self.webp_path(filename)
+        if os.path.exists(path):
+            os.remove(path)
+        self._no_gain.discard(filename)
+        self._failed.discard(filename)
+        with self._hashes_lock:
+            for key in [key for key in self._hashes if key[0] == filename]:
+                del self._hashes[key]
+
+    def _start(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            filename = self._queue.get()
+            try:
+                self.convert_to_webp(filename)
+            except Exception as e:
+                # Serve the original from now on instead of retrying on every request
+                self._failed.add(filename)
+                print(f"Error creating WebP for {filename}: {e}")
+                tmp_path = self.webp_path(filename) + '.tmp'
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            finally:
+                with self._pending_lock:
+                    self._pending.discard(filename)
+
+    def convert_to_webp(self, filename):
+        source = os.path.join(self.upload_folder, filename)
+        target = self.webp_path(filename)
+        os.makedirs(self.webp_folder, exist_ok=True)
+        with Image.open(source) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGB')
+            tmp_path = target + '.tmp'
+            img.save(tmp_path, 'WEBP', quality=WEBP_QUALITY, method=4)
+        # Keep the derivative only if it actually saves bytes
+        if os.path.getsize(tmp_path) < os.path.getsize(source):
+            os.replace(tmp_path, target)
+        else:
+            os.remove(tmp_path)
+            self._no_gain.add(filename)
@@ -0,0 +1,29 @@
+import importlib
+import threading
+import types
+
+_lock = threading.Lock()
+
+
+class _LazyModule(types.ModuleType):
+    """Stand-in that imports the real module on first attribute access"""
+
+    def __getattr__(self, attr):
+        # Only reached for attributes not yet copied from the real module
+        with _lock:
+            module = importlib.import_module(self.__name__)
+            self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name):
+    """Module object whose import is deferred until it is first used
+
+    Used for heavy dependencies (numpy, aiohttp, requests) that the server
+    doesn't need before it starts answering requests. Safe to first touch
+    from several threads at once: the real import happens once, under a
+    lock, and its namespace is then copied so later lookups are direct.
+
+    PyInstaller can't see these imports; list them in build_exe.py.
+    """
+    return _LazyModule(name)
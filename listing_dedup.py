@@ -0,0 +1,102 @@
+import hashlib
+import json
+import threading
+import time
+
+# Completed submissions are answered from memory for this long, so a
+# retried POST or a double-tapped button doesn't list the card twice
+DEDUP_WINDOW_SECONDS = 5 * 60
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    if isinstance(value, dict):
+        return {str(k).strip(): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def listing_fingerprint(listing_data, image_hashes):
+    """Stable key for a listing: its normalized fields plus the photos' content
+
+    image_hashes are content hashes in listing order, so re-uploading the
+    same photo under a new name still matches while a different lead photo
+    doesn't. Image URLs and paths are left out: URLs carry the LAN address
+    and paths the upload names.
+    """
+    fields = {k: _normalize(v) for k, v in listing_data.items() if k not in ('image_urls', 'image_paths')}
+    payload = json.dumps([fields, list(image_hashes)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs one execution per key at a time and remembers recent results
+
+    The first caller for a key runs fn; callers arriving while it runs
+    wait and get the same result (or exception). Results accepted by
+    cacheable() are then returned to later callers for window seconds.
+    Failures are never cached, so a rejected listing can be fixed and
+    resubmitted straight away.
+    """
+
+    def __init__(self, window=DEDUP_WINDOW_SECONDS):
+        self.window = window
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._recent = {}  # key -> (expires, result), oldest first
+
+    def _prune(self, now):
+        while self._recent:
+            key, (expires, _) = next(iter(self._recent.items()))
+            if expires > now:
+                break
+            del self._recent[key]
+
+    def do(self, key, fn, cacheable=lambda result: True):
+        """(result, shared): shared is True when another call's result was reused"""
+        with self._lock:
+            self._prune(time.monotonic())
+            recent = self._recent.get(key)
+            if recent:
+                return recent[1], True
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if call.error is None and cacheable(call.result):
+                    self._recent[key] = (time.monotonic() + self.window, call.result)
+            call.done.set()
+        return call.result, False
+
+    def forget(self, key):
+        with self._lock:
+            self._recent.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            self._prune(time.monotonic())
+            return {'in_flight': len(self._inflight), 'recent': len(self._recent)}
@@ -0,0 +1,304 @@
+import asyncio
+import functools
+import json
+import random
+import socket
+import threading
+import time
+from async_ebay_uploader import eBayAPIError
+from ebay_accounts import get_account_pool
+from ebay_config import default_account
+from lazy_imports import lazy_import
+
+requests = lazy_import('requests')
+
+# Listings sent per flush round, concurrently
+BATCH_SIZE = 10
+# Retry delay after a connectivity failure doubles per attempt up to the max
+BACKOFF_BASE_SECONDS = 15
+BACKOFF_MAX_SECONDS = 15 * 60
+# The worker wakes at least this often to look for due entries
+POLL_SECONDS = 30
+
+OUTBOX_STATUSES = ('pending', 'sending', 'sent', 'failed')
+
+
+@functools.lru_cache(maxsize=None)
+def _network_errors():
+    # Resolved on first failure so aiohttp and requests stay unloaded at startup
+    import aiohttp
+    return (requests.ConnectionError, requests.Timeout, aiohttp.ClientConnectionError,
+            asyncio.TimeoutError, socket.gaierror, ConnectionError, TimeoutError)
+
+
+def is_connectivity_error(exc):
+    """True if exc (or anything it was raised from) means eBay was unreachable
+
+    Server errors and rate limiting count too: the listing itself is fine
+    and should be retried later rather than reported as rejected.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, _network_errors()):
+            return True
+        status = None
+        if isinstance(exc, eBayAPIError):
+            status = exc.status
+        elif isinstance(exc, requests.HTTPError) and exc.response is not None:
+            status = exc.response.status_code
+        if status is not None and (status >= 500 or status == 429):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def backoff_delay(attempts):
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class ListingOutbox:
+    """Durable queue of listings waiting for eBay to become reachable
+
+    Entries are written to the catalog database before the request
+    returns, so they survive crashes and restarts. A background worker
+    sends due entries in batches and reschedules connectivity failures
+    with exponential backoff; listings eBay rejects are marked failed and
+    their draft goes back to the queue for editing.
+    """
+
+    def __init__(self, catalog, grouper, base_url=None, batch_size=BATCH_SIZE):
+        self.catalog = catalog
+        self.grouper = grouper
+        # Callable returning this server's current URL, for listings stored with image_paths
+        self.base_url = base_url
+        self.batch_size = batch_size
+        self.offline = False
+        self.last_flush = None
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            # Sends interrupted by a crash never got a response; send them again
+            self.catalog.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending'")
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Outbox flush error: {e}")
+            self._wake.wait(self._seconds_until_due())
+            self._wake.clear()
+
+    def _seconds_until_due(self):
+        rows = self.catalog.execute("SELECT MIN(next_attempt_at) AS due FROM outbox WHERE status = 'pending'")
+        due = rows[0]['due'] if rows else None
+        if due is None:
+            return POLL_SECONDS
+        return min(POLL_SECONDS, max(0.5, due - time.time()))
+
+    def enqueue(self, listing_data, draft_id=None, account=None, progress=None):
+        """Store a validated listing for sending; returns the outbox entry id
+
+        progress is the sku/offer_id a direct attempt already reached, so the
+        outbox publishes the existing offer instead of creating another.
+        Listings with image_paths are stored without their image_urls, which
+        carry the LAN address at queue time.
+        """
+        now = time.time()
+        progress = progress or {}
+        if 'image_paths' in listing_data:
+            listing_data = {k: v for k, v in listing_data.items() if k != 'image_urls'}
+        with self.catalog.transaction() as conn:
+            entry_id = conn.execute(
+                'INSERT INTO outbox (listing, draft_id, account, sku, offer_id, next_attempt_at, created_at, '
+                'updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (json.dumps(listing_data), draft_id, account, progress.get('sku'), progress.get('offer_id'),
+                 now, now, now)).lastrowid
+            if draft_id:
+                conn.execute("UPDATE drafts SET status = 'queued', updated_at = ? WHERE id = ?", (now, draft_id))
+        self._wake.set()
+        return entry_id
+
+    def flush(self, force=False):
+        """Send due entries (every pending entry if force); returns the number sent"""
+        sent = 0
+        with self._flush_lock:
+            while True:
+                batch = self._claim_batch(force)
+                if not batch:
+                    break
+                # Steps a previous attempt completed, so retries resume instead of starting over
+                progress = [{'sku': row['sku'], 'offer_id': row['offer_id']} for row in batch]
+                results = asyncio.run(self._send(batch, progress))
+                reachable = False
+                for row, result, row_progress in zip(batch, results, progress):
+                    if isinstance(result, Exception):
+                        reachable |= not self._record_failure(row, result, row_progress)
+                    else:
+                        self._record_success(row, result)
+                        reachable = True
+                        sent += 1
+                self.last_flush = time.time()
+                was_offline, self.offline = self.offline, not reachable
+                if self.offline:
+                    break
+                if was_offline:
+                    # Back online: don't leave older entries waiting out their backoff
+                    self.catalog.execute("UPDATE outbox SET next_attempt_at = ? WHERE status = 'pending'",
+                                         (time.time(),))
+        return sent
+
+    def _claim_batch(self, force):
+        with self.catalog.transaction() as conn:
+            if force:
+                rows = conn.execute("SELECT * FROM outbox WHERE status = 'pending' ORDER BY id LIMIT ?",
+                                    (self.batch_size,)).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT * FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                    (time.time(), self.batch_size)).fetchall()
+            if rows:
+                conn.execute(
+                    f"UPDATE outbox SET status = 'sending', updated_at = ? "
+                    f"WHERE id IN ({','.join('?' for _ in rows)})",
+                    [time.time()] + [row['id'] for row in rows])
+        return rows
+
+    async def _send(self, batch, progress):
+        """Results in batch order; each seller account sends its entries with its own uploader
+
+        progress holds one dict per entry that the uploader updates as
+        steps (offer creation) complete.
+        """
+        by_account = {}
+        for index, row in enumerate(batch):
+            by_account.setdefault(row['account'], []).append(index)
+        results = [None] * len(batch)
+
+        async def send_account(account, indexes):
+            try:
+                uploader = get_account_pool().async_uploader(account, max_concurrency=self.batch_size)
+            except Exception as e:
+                # e.g. the account was deleted while its listings waited
+                for index in indexes:
+                    results[index] = e
+                return
+            async with uploader:
+                sent = await uploader.create_listings([self._listing(batch[i]) for i in indexes],
+                                                      [progress[i] for i in indexes])
+            for index, result in zip(indexes, sent):
+                results[index] = result
+
+        await asyncio.gather(*(send_account(account, indexes) for account, indexes in by_account.items()))
+        return results
+
+    def _listing(self, row):
+        """The stored listing with image URLs for the address the server has now"""
+        listing = json.loads(row['listing'])
+        paths = listing.pop('image_paths', None)
+        if paths is not None and self.base_url is not None:
+            base_url = self.base_url()
+            listing['image_urls'] = [f"{base_url}/{path}" for path in paths]
+        return listing
+
+    def _record_success(self, row, result):
+        now = time.time()
+        with self.catalog.transaction() as conn:
+            conn.execute("UPDATE outbox SET status = 'sent', attempts = attempts + 1, result = ?, "
+                         "last_error = NULL, updated_at = ? WHERE id = ?",
+                         (json.dumps(result), now, row['id']))
+            self.catalog.record_listing(json.loads(row['listing']), result, row['draft_id'], conn,
+                                        row['account'] or default_account())
+            if row['draft_id']:
+                conn.execute("UPDATE drafts SET status = 'listed', updated_at = ? WHERE id = ?",
+                             (now, row['draft_id']))
+        print(f"📤 Outbox listing {row['id']} published")
+
+    def _record_failure(self, row, error, progress=None):
+        """Reschedule or fail an entry; returns True if eBay was unreachable
+
+        progress (sku/offer_id reached by this attempt) is kept on the entry
+        so the next attempt, automatic or a manual retry, resumes from it.
+        """
+        now = time.time()
+        attempts = row['attempts'] + 1
+        offline = is_connectivity_error(error)
+        with self.catalog.transaction() as conn:
+            if progress:
+                conn.execute('UPDATE outbox SET sku = ?, offer_id = ? WHERE id = ?',
+                             (progress.get('sku'), progress.get('offer_id'), row['id']))
+            if offline:
+                conn.execute("UPDATE outbox SET status = 'pending', attempts = ?, next_attempt_at = ?, "
+                             "last_error = ?, updated_at = ? WHERE id = ?",
+                             (attempts, now + backoff_delay(attempts), str(error), now, row['id']))
+            else:
+                conn.execute("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ?, "
+                             "updated_at = ? WHERE id = ?",
+                             (attempts, str(error), now, row['id']))
+                if row['draft_id']:
+                    conn.execute("UPDATE drafts SET status = 'ready', updated_at = ? WHERE id = ?",
+                                 (now, row['draft_id']))
+        if not offline:
+            print(f"Outbox listing {row['id']} rejected: {error}")
+        return offline
+
+    def retry(self, entry_id):
+        """Send a failed or waiting entry again as soon as possible"""
+        now = time.time()
+        with self.catalog.transaction() as conn:
+            cursor = conn.execute("UPDATE outbox SET status = 'pending', next_attempt_at = ?, updated_at = ? "
+                                  "WHERE id = ? AND status IN ('pending', 'failed')", (now, now, entry_id))
+            row = conn.execute('SELECT draft_id FROM outbox WHERE id = ?', (entry_id,)).fetchone()
+            if cursor.rowcount and row['draft_id']:
+                conn.execute("UPDATE drafts SET status = 'queued', updated_at = ? WHERE id = ?",
+                             (now, row['draft_id']))
+        self._wake.set()
+        return cursor.rowcount > 0
+
+    def discard(self, entry_id):
+        """Drop an unsent entry; its draft goes back to the listing queue"""
+        now = time.time()
+        with self.catalog.transaction() as conn:
+            row = conn.execute("SELECT draft_id FROM outbox WHERE id = ? AND status IN ('pending', 'failed')",
+                               (entry_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute('DELETE FROM outbox WHERE id = ?', (entry_id,))
+            if row['draft_id']:
+                conn.execute("UPDATE drafts SET status = 'ready', updated_at = ? WHERE id = ?",
+                             (now, row['draft_id']))
+        return True
+
+    def status(self, limit=50):
+        """Counts per status plus the unsent and most recent entries"""
+        counts = {status: 0 for status in OUTBOX_STATUSES}
+        for row in self.catalog.execute('SELECT status, COUNT(*) AS n FROM outbox GROUP BY status'):
+            counts[row['status']] = row['n']
+        rows = self.catalog.execute(
+            "SELECT id, listing, draft_id, account, status, attempts, next_attempt_at, last_error, created_at "
+            "FROM outbox ORDER BY status = 'sent', id DESC LIMIT ?", (limit,))
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            entry['title'] = json.loads(entry.pop('listing')).get('title')
+            entries.append(entry)
+        pending = [e['next_attempt_at'] for e in entries if e['status'] == 'pending']
+        return {
+            'counts': counts,
+            'offline': self.offline,
+            'last_flush': self.last_flush,
+            'next_attempt_at': min(pending) if pending else None,
+            'entries': entries
+        }
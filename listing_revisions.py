@@ -0,0 +1,189 @@
+import asyncio
+import fnmatch
+import time
+from ebay_accounts import get_account_pool
+from ebay_config import is_configured
+from listing_validator import MAX_PRICE, MAX_QUANTITY
+
+# eBay's lowest fixed price
+MIN_PRICE = 0.99
+# Concurrent bulkUpdatePriceQuantity calls (25 SKUs each)
+REVISION_CONCURRENCY = 4
+
+RULE_FIELDS = ('percent', 'amount', 'floor', 'ceiling', 'quantity', 'category_id', 'sku_pattern')
+
+
+def _number(rule, key, cast=float, minimum=None):
+    value = rule.get(key)
+    if value in (None, ''):
+        return None
+    try:
+        value = cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a number")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{key} must be at least {minimum}")
+    return value
+
+
+def clean_rule(rule):
+    """Normalized copy of a revision rule; raises ValueError for bad rules
+
+    A rule matches listings by category_id and/or sku_pattern (shell-style,
+    e.g. ITEM_Pikachu*; both empty matches everything) and then applies, in
+    order: percent change, flat amount, floor/ceiling clamp, and a new
+    quantity.
+    """
+    unknown = set(rule) - set(RULE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown rule fields: {', '.join(sorted(unknown))}")
+    cleaned = {
+        'percent': _number(rule, 'percent', minimum=-99),
+        'amount': _number(rule, 'amount'),
+        'floor': _number(rule, 'floor', minimum=0),
+        'ceiling': _number(rule, 'ceiling', minimum=0),
+        'quantity': _number(rule, 'quantity', int, minimum=0),
+        'category_id': str(rule.get('category_id') or '').strip(),
+        'sku_pattern': str(rule.get('sku_pattern') or '').strip()
+    }
+    if cleaned['floor'] is not None and cleaned['ceiling'] is not None and cleaned['floor'] > cleaned['ceiling']:
+        raise ValueError("floor must not be above ceiling")
+    if cleaned['quantity'] is not None and cleaned['quantity'] > MAX_QUANTITY:
+        raise ValueError(f"quantity must be at most {MAX_QUANTITY}")
+    if all(cleaned[k] is None for k in ('percent', 'amount', 'floor', 'ceiling', 'quantity')):
+        raise ValueError("Rule changes nothing: set percent, amount, floor, ceiling or quantity")
+    return cleaned
+
+
+def rule_matches(rule, listing):
+    if rule['category_id'] and rule['category_id'] != str(listing.get('category_id') or ''):
+        return False
+    if rule['sku_pattern'] and not fnmatch.fnmatchcase(listing['sku'], rule['sku_pattern']):
+        return False
+    return True
+
+
+def apply_rule(rule, price, quantity):
+    if price is not None:
+        if rule['percent'] is not None:
+            price *= 1 + rule['percent'] / 100
+        if rule['amount'] is not None:
+            price += rule['amount']
+        if rule['floor'] is not None:
+            price = max(price, rule['floor'])
+        if rule['ceiling'] is not None:
+            price = min(price, rule['ceiling'])
+        price = round(min(max(price, MIN_PRICE), MAX_PRICE), 2)
+    if rule['quantity'] is not None:
+        quantity = rule['quantity']
+    return price, quantity
+
+
+def plan_revisions(listings, rules):
+    """Changes the rules would make, as a diff of old and new values
+
+    Every matching rule applies, in order, so a percent change can be
+    followed by a category-specific floor. Unchanged listings are left out.
+    """
+    rules = [clean_rule(rule) for rule in rules]
+    changes = []
+    for listing in listings:
+        if not listing.get('offer_id'):
+            continue
+        price, quantity = listing.get('price'), listing.get('quantity')
+        for rule in rules:
+            if rule_matches(rule, listing):
+                price, quantity = apply_rule(rule, price, quantity)
+        if price != listing.get('price') or quantity != listing.get('quantity'):
+            changes.append({
+                'sku': listing['sku'],
+                'offer_id': listing['offer_id'],
+                'account': listing.get('account'),
+                'title': listing.get('title'),
+                'old_price': listing.get('price'),
+                'price': price,
+                'old_quantity': listing.get('quantity'),
+                'quantity': quantity
+            })
+    return changes
+
+
+class ListingReviser:
+    """Bulk price and quantity revisions for listings recorded in the catalog"""
+
+    def __init__(self, catalog, concurrency=REVISION_CONCURRENCY):
+        self.catalog = catalog
+        self.concurrency = concurrency
+
+    def _listings(self, account=None):
+        listings = self.catalog.list_listings()
+        if account:
+            listings = [listing for listing in listings if listing.get('account') == account]
+        return listings
+
+    def preview(self, rules, account=None):
+        """Dry run: the diff that apply() would send (only account's listings if given)"""
+        changes = plan_revisions(self._listings(account), rules)
+        return {'changes': changes, 'count': len(changes)}
+
+    def apply(self, rules, account=None):
+        """Send the planned revisions and update the local records that eBay accepted
+
+        Raises ValueError if an account with listings to revise isn't configured.
+        """
+        started = time.perf_counter()
+        changes = plan_revisions(self._listings(account), rules)
+        unconfigured = sorted({change['account'] for change in changes if not is_configured(change['account'])})
+        if unconfigured:
+            raise ValueError(f"eBay not configured for account: {', '.join(unconfigured)}")
+        responses = asyncio.run(self._send(changes)) if changes else []
+
+        by_listing = {(response['account'], response.get('sku')): response for response in responses}
+        errors = {}
+        accepted = []
+        for change in changes:
+            response = by_listing.get((change['account'], change['sku']))
+            if response is None:
+                errors[change['sku']] = 'No response from eBay for this SKU'
+            elif response.get('statusCode') != 200 or response.get('errors'):
+                errors[change['sku']] = '; '.join(
+                    e.get('message', '') for e in response.get('errors', [])) or f"HTTP {response.get('statusCode')}"
+            else:
+                accepted.append(change)
+
+        # Only what eBay confirmed is written locally
+        now = time.time()
+        updated = 0
+        with self.catalog.transaction() as conn:
+            for change in accepted:
+                conn.execute('UPDATE listings SET price = ?, quantity = ?, updated_at = ? '
+                             'WHERE account = ? AND sku = ?',
+                             (change['price'], change['quantity'], now, change['account'], change['sku']))
+                updated += 1
+        return {
+            'changes': changes,
+            'updated': updated,
+            'errors': errors,
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+
+    async def _send(self, changes):
+        """Revisions go out through the seller account each listing was created on"""
+        by_account = {}
+        for change in changes:
+            by_account.setdefault(change['account'], []).append(change)
+
+        async def send_account(account, account_changes):
+            try:
+                uploader = get_account_pool().async_uploader(account, max_concurrency=self.concurrency)
+            except Exception as e:
+                responses = [{"sku": c["sku"], "offerId": c["offer_id"], "statusCode": 0,
+                              "errors": [{"message": str(e)}]} for c in account_changes]
+            else:
+                async with uploader:
+                    responses = await uploader.bulk_update_price_quantity_async(account_changes)
+            return [{**response, 'account': account} for response in responses]
+
+        responses = await asyncio.gather(*(send_account(account, account_changes)
+                                           for account, account_changes in by_account.items()))
+        return [response for account_responses in responses for response in account_responses]
@@ -0,0 +1,134 @@
+import functools
+import re
+from listing_validator import MAX_TITLE_LENGTH, MAX_DESCRIPTION_LENGTH
+
+# Card details a template can use, e.g. "{year} {set} {player}[ #{card_number}][ {grade}]"
+FIELDS = ('player', 'year', 'set', 'card_number', 'grade')
+
+DEFAULT_TITLE_TEMPLATE = "{year} {set} {player}[ #{card_number}][ {grade}]"
+DEFAULT_DESCRIPTION_TEMPLATE = "{year} {set} {player}[ #{card_number}][\nGrade: {grade}]"
+
+_TOKEN = re.compile(r"\{(\w+)\}|\[|\]|[^{}\[\]]+|[{}]")
+_SPACES = re.compile(r"[ \t]{2,}")
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class CompiledTemplate:
+    """A template parsed once into literal and field parts
+
+    Square brackets mark optional groups: a group is left out when any
+    field inside it is empty, so "[ #{card_number}]" never renders a
+    stray "#". When a rendering is over the length limit, optional groups
+    are dropped last-first before the text is cut at a word boundary.
+    """
+
+    def __init__(self, text, max_length):
+        self.text = text
+        self.max_length = max_length
+        self.fields = set()
+        # parts: (literal, field, group) with group None for required parts
+        self.parts = []
+        self.groups = 0
+        group = None
+        for match in _TOKEN.finditer(text):
+            token = match.group(0)
+            if match.group(1):
+                field = match.group(1)
+                if field not in FIELDS:
+                    raise TemplateError(f"Unknown placeholder {{{field}}}; use one of "
+                                        + ', '.join(f'{{{f}}}' for f in FIELDS))
+                self.fields.add(field)
+                self.parts.append((None, field, group))
+            elif token == '[':
+                if group is not None:
+                    raise TemplateError("Optional groups can't be nested")
+                group = self.groups
+                self.groups += 1
+            elif token == ']':
+                if group is None:
+                    raise TemplateError("Unmatched ]")
+                group = None
+            elif token in '{}':
+                raise TemplateError(f"Stray {token} in template")
+            else:
+                self.parts.append((token, None, group))
+        if group is not None:
+            raise TemplateError("Unclosed [")
+
+        self._formats = {}
+        self._optional_fields = [(field, group) for literal, field, group in self.parts
+                                 if group is not None and field is not None]
+
+    def _format(self, dropped):
+        """str.format pattern for one combination of dropped groups, built once"""
+        key = frozenset(dropped)
+        pattern = self._formats.get(key)
+        if pattern is None:
+            out = []
+            for literal, field, group in self.parts:
+                if group is not None and group in key:
+                    continue
+                out.append(literal.replace('{', '{{').replace('}', '}}') if field is None else f'{{{field}}}')
+            pattern = self._formats[key] = ''.join(out)
+        return pattern
+
+    def _join(self, values, dropped):
+        text = self._format(dropped).format_map(values)
+        if '  ' in text or '\t' in text:
+            text = _SPACES.sub(' ', text)
+        return text.strip()
+
+    def render(self, card):
+        """(text, truncated) for a card's field values"""
+        values = {field: str(card.get(field) or '').strip() for field in self.fields}
+        dropped = {group for field, group in self._optional_fields if not values[field]}
+        text = self._join(values, dropped)
+        if len(text) <= self.max_length:
+            return text, False
+
+        for group in reversed(range(self.groups)):
+            if group in dropped:
+                continue
+            dropped.add(group)
+            text = self._join(values, dropped)
+            if len(text) <= self.max_length:
+                return text, True
+
+        cut = text[:self.max_length + 1].rsplit(' ', 1)[0] if ' ' in text[:self.max_length + 1] else ''
+        return (cut or text[:self.max_length]).rstrip(' ,-/#'), True
+
+
+@functools.lru_cache(maxsize=64)
+def compile_template(text, max_length=MAX_TITLE_LENGTH):
+    """Parse a template once; repeated calls with the same text are free"""
+    return CompiledTemplate(text, max_length)
+
+
+def render_listing(card, title_template=DEFAULT_TITLE_TEMPLATE,
+                   description_template=DEFAULT_DESCRIPTION_TEMPLATE):
+    """Title and description for one card's details"""
+    title, title_cut = compile_template(title_template, MAX_TITLE_LENGTH).render(card)
+    description, description_cut = compile_template(description_template, MAX_DESCRIPTION_LENGTH).render(card)
+    return {'title': title, 'description': description, 'truncated': title_cut or description_cut}
+
+
+def render_batch(cards, title_template=DEFAULT_TITLE_TEMPLATE,
+                 description_template=DEFAULT_DESCRIPTION_TEMPLATE):
+    """render_listing for many cards, compiling each template only once"""
+    title = compile_template(title_template, MAX_TITLE_LENGTH)
+    description = compile_template(description_template, MAX_DESCRIPTION_LENGTH)
+    results = []
+    for card in cards:
+        title_text, title_cut = title.render(card)
+        description_text, description_cut = description.render(card)
+        results.append({'title': title_text, 'description': description_text,
+                        'truncated': title_cut or description_cut})
+    return results
+
+
+def templates_from_defaults(defaults):
+    return (defaults.get('title_template') or DEFAULT_TITLE_TEMPLATE,
+            defaults.get('description_template') or DEFAULT_DESCRIPTION_TEMPLATE)
@@ -0,0 +1,168 @@
+import re
+
+# eBay Inventory API limits for a fixed-price listing
+MAX_TITLE_LENGTH = 80
+MAX_DESCRIPTION_LENGTH = 500000
+MAX_IMAGES = 24
+MAX_QUANTITY = 10000
+MAX_PRICE = 99999999.99
+
+CONDITIONS = (
+    'NEW',
+    'LIKE_NEW',
+    'NEW_OTHER',
+    'NEW_WITH_DEFECTS',
+    'USED_EXCELLENT',
+    'USED_VERY_GOOD',
+    'USED_GOOD',
+    'USED_ACCEPTABLE',
+    'FOR_PARTS_OR_NOT_WORKING',
+)
+
+# Rules are compiled once at import so validating a payload is just a few
+# dictionary lookups and regex matches
+_PRICE_RE = re.compile(r'^\d+(\.\d{1,2})?$')
+_CATEGORY_RE = re.compile(r'^\d{1,10}$')
+_CONTROL_CHARS_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_CONDITION_SET = frozenset(CONDITIONS)
+
+
+def _check_title(value):
+    title = (value or '').strip()
+    if not title:
+        return None, 'Title is required'
+    if len(title) > MAX_TITLE_LENGTH:
+        return None, f'Title is {len(title)} characters (max {MAX_TITLE_LENGTH})'
+    if _CONTROL_CHARS_RE.search(title):
+        return None, 'Title contains invalid characters'
+    return title, None
+
+
+def _check_description(value):
+    description = (value or '').strip()
+    if not description:
+        return None, 'Description is required'
+    if len(description) > MAX_DESCRIPTION_LENGTH:
+        return None, f'Description is too long (max {MAX_DESCRIPTION_LENGTH} characters)'
+    return description, None
+
+
+def _check_price(value):
+    text = str(value if value is not None else '').strip().lstrip('$')
+    if not text:
+        return None, 'Price is required'
+    if not _PRICE_RE.match(text):
+        return None, 'Price must be a number with at most 2 decimal places'
+    price = float(text)
+    if price <= 0:
+        return None, 'Price must be greater than 0'
+    if price > MAX_PRICE:
+        return None, 'Price is too large'
+    return price, None
+
+
+def _check_quantity(value):
+    if value is None or str(value).strip() == '':
+        return 1, None
+    try:
+        quantity = int(str(value).strip())
+    except ValueError:
+        return None, 'Quantity must be a whole number'
+    if quantity < 1 or quantity > MAX_QUANTITY:
+        return None, f'Quantity must be between 1 and {MAX_QUANTITY}'
+    return quantity, None
+
+
+def _check_category(value):
+    category_id = str(value or '').strip()
+    if not category_id:
+        return None, 'Category ID is required'
+    if not _CATEGORY_RE.match(category_id):
+        return None, 'Category ID must be numeric (e.g., 261328)'
+    return category_id, None
+
+
+def _check_condition(value):
+    condition = str(value or 'NEW').strip().upper()
+    if condition not in _CONDITION_SET:
+        return None, f'Condition must be one of: {", ".join(CONDITIONS)}'
+    return condition, None
+
+
+def _check_aspects(value):
+    # Inventory API expects {"Name": ["value", ...]}
+    if not value:
+        return {}, None
+    if not isinstance(value, dict):
+        return None, 'Item specifics must be name/value pairs'
+    aspects = {}
+    for name, values in value.items():
+        name = str(name).strip()
+        if isinstance(values, (list, tuple)):
+            values = [str(v).strip() for v in values if str(v).strip()]
+        else:
+            values = [str(values).strip()] if str(values).strip() else []
+        if name and values:
+            aspects[name] = values
+    return aspects, None
+
+
+def _check_images(value):
+    images = [img for img in (value or []) if img]
+    if not images:
+        return None, 'At least one image is required'
+    if len(images) > MAX_IMAGES:
+        return None, f'{len(images)} images selected (max {MAX_IMAGES})'
+    return images, None
+
+
+_RULES = (
+    ('title', _check_title),
+    ('description', _check_description),
+    ('price', _check_price),
+    ('quantity', _check_quantity),
+    ('category_id', _check_category),
+    ('condition', _check_condition),
+    ('aspects', _check_aspects),
+)
+
+
+def validate_listing(data, image_field='images'):
+    """Check a listing payload against eBay's constraints without a network call
+
+    Returns (cleaned, errors). cleaned holds normalized values for every field
+    that passed; errors maps each failing field to a message, so callers can
+    report every problem at once. image_field names the key holding the
+    pictures ('images' for filenames, 'image_urls' for URLs).
+    """
+    data = data or {}
+    cleaned = {}
+    errors = {}
+
+    for field, check in _RULES:
+        value, error = check(data.get(field))
+        if error:
+            errors[field] = error
+        else:
+            cleaned[field] = value
+
+    images, error = _check_images(data.get(image_field))
+    if error:
+        errors[image_field] = error
+    else:
+        cleaned[image_field] = images
+
+    return cleaned, errors
+
+
+def format_errors(errors):
+    """Join validation errors into a single human readable message"""
+    return '\n'.join(f'- {message}' for message in errors.values())
+
+
+class ListingValidationError(Exception):
+    """Raised when a listing payload fails local validation"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"Invalid listing:\n{format_errors(errors)}")
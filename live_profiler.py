@@ -0,0 +1,234 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from datetime import datetime
+from storage_maintenance import DERIVED_DIRNAME
+
+PROFILES_SUBDIR = os.path.join(DERIVED_DIRNAME, 'profiles')
+MAX_PROFILE_SECONDS = 300
+SAMPLE_INTERVAL_SECONDS = 0.005
+# Frames kept per tracemalloc allocation; more is slower and uses more memory
+TRACEMALLOC_FRAMES = 10
+TOP_LIMIT = 30
+
+
+def _stamp():
+    return datetime.now().strftime('%Y%m%d_%H%M%S')
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def thread_stacks():
+    """Current stack of every thread as text, named like threading reports them"""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    out = io.StringIO()
+    out.write(f"Thread stacks at {datetime.now().isoformat(timespec='seconds')}\n")
+    for ident, frame in sys._current_frames().items():
+        out.write(f"\n--- {names.get(ident, 'unknown')} (id {ident}) ---\n")
+        out.write(''.join(traceback.format_stack(frame)))
+    return out.getvalue()
+
+
+class LiveProfiler:
+    """Profiling for the running server, one session at a time
+
+    Two session modes:
+    - 'sample' polls every thread's stack every few milliseconds, so it
+      sees background workers too at a low, fixed overhead. It writes
+      collapsed stacks ("frame;frame;frame count"), which flame graph
+      tools read directly.
+    - 'cprofile' runs cProfile around each request handled while the
+      session is open (cProfile only sees the thread that enables it)
+      and writes the merged stats as a .prof file for pstats/snakeviz.
+
+    Sessions stop by themselves after the requested seconds. tracemalloc
+    snapshots are independent of sessions. Output files go to
+    uploads/derived/profiles, where storage maintenance can evict them.
+    """
+
+    def __init__(self, upload_folder):
+        self.folder = os.path.join(upload_folder, PROFILES_SUBDIR)
+        self._lock = threading.Lock()
+        self._session = None
+        self._stop = threading.Event()
+        self._profiles = []
+        self._local = threading.local()
+        self._last_snapshot = None
+        self.last_result = None
+
+    def path(self, name):
+        return os.path.join(self.folder, os.path.basename(name))
+
+    def _write(self, name, text):
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.path(name), 'w', encoding='utf-8') as f:
+            f.write(text)
+        return name
+
+    # Sessions
+
+    def start(self, seconds, mode='sample', interval=SAMPLE_INTERVAL_SECONDS):
+        """Open a session; returns False if one is already running"""
+        if mode not in ('sample', 'cprofile'):
+            raise ValueError("mode must be 'sample' or 'cprofile'")
+        seconds = max(1.0, min(float(seconds), MAX_PROFILE_SECONDS))
+        with self._lock:
+            if self._session is not None:
+                return False
+            self._stop.clear()
+            self._profiles = []
+            self._session = {'mode': mode, 'started': time.time(), 'seconds': seconds}
+        target = self._sample if mode == 'sample' else self._wait_cprofile
+        threading.Thread(target=target, args=(seconds, max(0.001, float(interval))),
+                         name='live-profiler', daemon=True).start()
+        return True
+
+    def stop(self):
+        """End the running session early; its files are still written"""
+        self._stop.set()
+
+    def status(self):
+        with self._lock:
+            session = dict(self._session) if self._session else None
+        if session:
+            session['remaining'] = round(max(0.0, session['started'] + session['seconds'] - time.time()), 1)
+        return {'running': session is not None, 'session': session, 'last_result': self.last_result,
+                'tracemalloc': tracemalloc.is_tracing(), 'files': self.files()}
+
+    def _finish(self, result):
+        with self._lock:
+            self._session = None
+        self.last_result = result
+
+    def _sample(self, seconds, interval):
+        me = threading.get_ident()
+        counts = {}
+        samples = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        try:
+            while time.perf_counter() < deadline and not self._stop.wait(interval):
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, 'thread'))
+                    key = ';'.join(reversed(stack))
+                    counts[key] = counts.get(key, 0) + 1
+                samples += 1
+        finally:
+            elapsed = time.perf_counter() - started
+            collapsed = '\n'.join(f"{stack} {count}" for stack, count in
+                                  sorted(counts.items(), key=lambda item: item[1], reverse=True))
+            name = self._write(f"sample_{_stamp()}.txt", collapsed + '\n')
+            # Leaf frames where threads spent the most samples
+            leaves = {}
+            for stack, count in counts.items():
+                leaf = stack.rsplit(';', 1)[-1]
+                leaves[leaf] = leaves.get(leaf, 0) + count
+            top = sorted(leaves.items(), key=lambda item: item[1], reverse=True)[:TOP_LIMIT]
+            self._finish({'mode': 'sample', 'file': name, 'seconds': round(elapsed, 2), 'samples': samples,
+                          'top': [{'frame': frame, 'samples': count} for frame, count in top]})
+
+    def _wait_cprofile(self, seconds, interval):
+        started = time.perf_counter()
+        try:
+            self._stop.wait(seconds)
+        finally:
+            with self._lock:
+                profiles, self._profiles = self._profiles, []
+            elapsed = time.perf_counter() - started
+            name = f"cprofile_{_stamp()}.prof"
+            result = {'mode': 'cprofile', 'file': None, 'seconds': round(elapsed, 2), 'requests': len(profiles)}
+            if profiles:
+                stats = pstats.Stats(profiles[0])
+                for profile in profiles[1:]:
+                    stats.add(profile)
+                os.makedirs(self.folder, exist_ok=True)
+                stats.dump_stats(self.path(name))
+                text = io.StringIO()
+                stats.stream = text
+                stats.sort_stats('cumulative').print_stats(TOP_LIMIT)
+                result['file'] = name
+                result['report'] = self._write(name.replace('.prof', '.txt'), text.getvalue())
+            self._finish(result)
+
+    def request_started(self):
+        """Call at the start of each request (Flask before_request)"""
+        session = self._session
+        if session is None or session['mode'] != 'cprofile' or self._stop.is_set():
+            return
+        profile = cProfile.Profile()
+        self._local.profile = profile
+        profile.enable()
+
+    def request_finished(self):
+        """Call at the end of each request (Flask teardown_request)"""
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            return
+        profile.disable()
+        self._local.profile = None
+        with self._lock:
+            if self._session is not None and self._session['mode'] == 'cprofile':
+                self._profiles.append(profile)
+
+    # Memory
+
+    def stop_tracemalloc(self):
+        tracemalloc.stop()
+        self._last_snapshot = None
+
+    def snapshot(self, limit=TOP_LIMIT):
+        """Allocations grown since the previous snapshot, biggest first
+
+        Starts tracing on first use; that call has nothing to compare with
+        and reports the current top allocations instead.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._last_snapshot = None
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ))
+        previous, self._last_snapshot = self._last_snapshot, snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        if previous is not None:
+            stats = snapshot.compare_to(previous, 'lineno')
+            top = [{'where': str(stat.traceback), 'size_diff': stat.size_diff, 'size': stat.size,
+                    'count_diff': stat.count_diff} for stat in stats[:limit]]
+        else:
+            stats = snapshot.statistics('lineno')
+            top = [{'where': str(stat.traceback), 'size_diff': stat.size, 'size': stat.size,
+                    'count_diff': stat.count} for stat in stats[:limit]]
+        lines = [f"tracemalloc at {datetime.now().isoformat(timespec='seconds')}: "
+                 f"{current / 1e6:.1f} MB traced, {peak / 1e6:.1f} MB peak",
+                 'since previous snapshot' if previous is not None else 'first snapshot (no diff)', '']
+        lines += [f"{entry['size_diff'] / 1024:+10.1f} KiB {entry['count_diff']:+8d} blocks  {entry['where']}"
+                  for entry in top]
+        name = self._write(f"memory_{_stamp()}.txt", '\n'.join(lines) + '\n')
+        return {'file': name, 'traced_bytes': current, 'peak_bytes': peak, 'compared': previous is not None,
+                'top': top}
+
+    def dump_stacks(self):
+        text = thread_stacks()
+        return {'file': self._write(f"stacks_{_stamp()}.txt", text), 'text': text}
+
+    def files(self):
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted(os.listdir(self.folder), reverse=True)
@@ -0,0 +1,659 @@
+"""
+Load and soak test for the upload server
+Run: python load_test.py [--clients N[,N...]] [--duration S] [--ramp S] [--think MS] [--poll S]
+                         [--mix upload=5,fetch=4,delete=1] [--photos DIR] [--timeout S]
+                         [--url URL [--pid PID]] [--exe path/to/KingCyrusCardsUploader]
+                         [--label TEXT] [--out report.json] [--keep] [--json]
+     python load_test.py --compare base.json new.json [...]
+
+Simulates phones using the upload page at the same time. Each phone
+uploads photos, polls /images?since= on the page's 5 second interval
+(plus /images/quality for new photos), loads photos it has seen with the
+headers a browser sends, and deletes some of its own uploads. Between
+actions it waits --think milliseconds (randomized), --mix weights the
+actions and --ramp spreads the phones' start over that many seconds.
+
+By default every run starts a fresh server (app.py --headless, or --exe)
+in a scratch folder, so runs start from the same empty state; --keep
+leaves the folder and server log behind. --url targets a server that is
+already running instead; pass --pid to sample its memory, and the
+phones' leftover uploads are deleted at the end. A comma-separated
+--clients runs one step per count, to find where uploads start to stall.
+
+The report has throughput, latency percentiles, status codes and errors
+per request type, a timeline per --interval seconds, and the server's
+memory (RSS), open file descriptors and threads over the run, so slow
+growth shows up in long (soak) runs. Each run is saved as JSON (--out,
+default load_report_<time>.json) and --compare prints saved runs side by
+side. Photos are generated (deterministically) unless --photos points at
+a folder of JPEGs.
+"""
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_URL = 'http://127.0.0.1:5000'
+DEFAULT_MIX = {'upload': 5, 'fetch': 4, 'delete': 1}
+# The upload page syncs every SYNC_INTERVAL_MS = 5000
+POLL_SECONDS = 5.0
+SAMPLE_SECONDS = 5.0
+# Growth trends leave out the start of the run, when caches and pools fill up
+WARM_UP_SECONDS = 30.0
+# Generated photos: what the page sends after resizing to 2400px, plus a
+# full-size photo from a phone that skipped resizing
+PHOTO_SIZES = [(2400, 1800), (1800, 2400), (1600, 1200), (1200, 1600), (4032, 3024)]
+PHOTO_COUNT = 10
+# What a phone browser sends for <img> requests
+IMAGE_ACCEPT = 'image/avif,image/webp,image/*,*/*;q=0.8'
+# Requests are errors unless they end with one of these
+OK_STATUSES = {
+    'upload': (200,),
+    'poll': (200,),
+    'quality': (200,),
+    'fetch': (200, 304, 404),  # 404: another phone deleted it since the last poll
+    'delete': (200,),
+}
+
+
+def _option(args, name, default, cast=str):
+    return cast(args[args.index(name) + 1]) if name in args else default
+
+
+def parse_mix(text):
+    """'upload=5,fetch=4,delete=1' -> {'upload': 5.0, ...}"""
+    mix = {}
+    for part in text.split(','):
+        action, _, weight = part.partition('=')
+        if action.strip() not in DEFAULT_MIX:
+            raise ValueError(f"Unknown action in --mix: {action} (use {', '.join(DEFAULT_MIX)})")
+        mix[action.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(values, p):
+    """p-th percentile of sorted values, interpolating between ranks"""
+    if not values:
+        return None
+    position = (len(values) - 1) * p / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+# Photos
+
+def synthetic_photos(count=PHOTO_COUNT, seed=1):
+    """[(name, jpeg bytes)] of noisy photos; the same bytes on every run"""
+    from PIL import Image
+    rng = random.Random(seed)
+    photos = []
+    for i in range(count):
+        width, height = PHOTO_SIZES[i % len(PHOTO_SIZES)]
+        # Upscaled coarse noise compresses like a real photo, not like a flat card scan
+        channels = []
+        for _ in range(3):
+            size = (width // 6, height // 6)
+            coarse = Image.frombytes('L', size, rng.randbytes(size[0] * size[1]))
+            channels.append(coarse.resize((width, height), Image.BICUBIC))
+        buffer = io.BytesIO()
+        Image.merge('RGB', channels).save(buffer, 'JPEG', quality=85)
+        photos.append((f"IMG_{1000 + i}.jpg", buffer.getvalue()))
+    return photos
+
+
+def folder_photos(folder):
+    names = sorted(f for f in os.listdir(folder) if f.lower().endswith(('.jpg', '.jpeg')))
+    if not names:
+        raise RuntimeError(f"No JPEGs in {folder}")
+    photos = []
+    for name in names:
+        with open(os.path.join(folder, name), 'rb') as f:
+            photos.append((name, f.read()))
+    return photos
+
+
+# Server
+
+def _server_is_up(url):
+    try:
+        with urllib.request.urlopen(url + '/upload/config', timeout=0.5) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def start_server(command, folder, url, timeout=60):
+    """Launch the server in folder and wait until it answers"""
+    if _server_is_up(url):
+        raise RuntimeError(f"Something is already serving at {url}; stop it first or pass --url")
+    log = open(os.path.join(folder, 'server.log'), 'wb')
+    process = subprocess.Popen(command, cwd=folder, stdout=log, stderr=subprocess.STDOUT)
+    log.close()
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}; see {folder}/server.log")
+        if _server_is_up(url):
+            return process
+        time.sleep(0.05)
+    stop_server(process)
+    raise RuntimeError(f"Server did not answer within {timeout}s")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def process_stats(pid):
+    """{'rss_mb', 'fds', 'threads'} of pid; None where the OS won't say
+
+    Uses psutil when it is installed (also counting child processes, e.g.
+    the crop pool or a packaged build's bootloader), else /proc (Linux),
+    else ps (RSS only).
+    """
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            parent = psutil.Process(pid)
+            processes = [parent] + parent.children(recursive=True)
+            rss = fds = threads = 0
+            for process in processes:
+                with process.oneshot():
+                    rss += process.memory_info().rss
+                    fds += process.num_fds() if hasattr(process, 'num_fds') else process.num_handles()
+                    threads += process.num_threads()
+            return {'rss_mb': round(rss / 1e6, 1), 'fds': fds, 'threads': threads}
+        except psutil.Error:
+            return {'rss_mb': None, 'fds': None, 'threads': None}
+
+    proc = f"/proc/{pid}"
+    if os.path.isdir(proc):
+        stats = {'rss_mb': None, 'fds': None, 'threads': None}
+        try:
+            with open(f"{proc}/status") as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        stats['rss_mb'] = round(int(line.split()[1]) * 1024 / 1e6, 1)
+                    elif line.startswith('Threads:'):
+                        stats['threads'] = int(line.split()[1])
+            stats['fds'] = len(os.listdir(f"{proc}/fd"))
+        except OSError:
+            pass
+        return stats
+
+    try:
+        rss_kb = subprocess.run(['ps', '-o', 'rss=', '-p', str(pid)], capture_output=True, text=True).stdout
+        return {'rss_mb': round(int(rss_kb.strip()) * 1024 / 1e6, 1), 'fds': None, 'threads': None}
+    except (OSError, ValueError):
+        return {'rss_mb': None, 'fds': None, 'threads': None}
+
+
+def folder_mb(folder):
+    total = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return round(total / 1e6, 1)
+
+
+# Phones
+
+class Recorder:
+    """Every finished request as (finished_s, action, latency_s, status, ok, bytes)
+
+    Phones append from their own threads; list.append is atomic, so the
+    sampler can read a prefix of the list while phones keep adding.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.events = []
+
+    def record(self, action, started, status, ok, size=0):
+        finished = time.perf_counter()
+        self.events.append((finished - self.started, action, finished - started, status, ok, size))
+
+
+class Phone(threading.Thread):
+    """One phone with the upload page open"""
+
+    def __init__(self, number, url, photos, recorder, deadline, settings):
+        super().__init__(name=f"phone-{number}", daemon=True)
+        self.number = number
+        self.url = url
+        self.photos = photos
+        self.recorder = recorder
+        self.deadline = deadline
+        self.settings = settings
+        self.rng = random.Random(number)
+        self.session = None
+        self.token = None
+        self.gallery = set()
+        self.uploaded = []
+        self.etags = {}
+        self.shots = 0
+
+    def request(self, action, method, path, **kwargs):
+        import requests
+        started = time.perf_counter()
+        sent = len(kwargs['files']['file'][1]) if 'files' in kwargs else 0
+        try:
+            response = self.session.request(method, self.url + path, timeout=self.settings['timeout'], **kwargs)
+            body = response.content
+        except requests.RequestException as e:
+            self.recorder.record(action, started, type(e).__name__, False, sent)
+            return None
+        self.recorder.record(action, started, response.status_code,
+                             response.status_code in OK_STATUSES[action], sent + len(body))
+        return response
+
+    def run(self):
+        import requests
+        time.sleep(self.settings['ramp'] * self.number / max(1, self.settings['clients']))
+        self.session = requests.Session()
+        actions = list(self.settings['mix'])
+        weights = [self.settings['mix'][action] for action in actions]
+        self.load_gallery()
+        next_poll = time.monotonic() + self.settings['poll']
+        try:
+            while time.monotonic() < self.deadline:
+                if time.monotonic() >= next_poll:
+                    self.sync()
+                    next_poll += self.settings['poll']
+                    continue
+                getattr(self, self.rng.choices(actions, weights)[0])()
+                think = self.settings['think'] * self.rng.uniform(0.5, 1.5)
+                time.sleep(max(0.0, min(think, next_poll - time.monotonic(), self.deadline - time.monotonic())))
+        finally:
+            self.session.close()
+
+    def load_gallery(self):
+        response = self.request('poll', 'GET', '/images')
+        if response is not None and response.ok:
+            data = response.json()
+            self.gallery = set(data['images'])
+            self.token = data['token']
+
+    def sync(self):
+        if self.token is None:
+            self.load_gallery()
+            return
+        response = self.request('poll', 'GET', f"/images?since={self.token}")
+        if response is None or not response.ok:
+            return
+        data = response.json()
+        if data.get('reset'):
+            self.load_gallery()
+            return
+        self.token = data['token']
+        self.gallery.update(data['added'])
+        self.gallery.difference_update(data['deleted'])
+        changed = data['added'] + data['updated']
+        if changed:
+            self.request('quality', 'GET', '/images/quality', params={'names': ','.join(changed)})
+
+    def upload(self):
+        name, data = self.photos[self.shots % len(self.photos)]
+        self.shots += 1
+        response = self.request('upload', 'POST', '/upload', files={'file': (name, data, 'image/jpeg')})
+        if response is not None and response.ok:
+            filename = response.json()['filename']
+            self.uploaded.append(filename)
+            self.gallery.add(filename)
+
+    def fetch(self):
+        if not self.gallery:
+            return self.upload()
+        filename = self.rng.choice(sorted(self.gallery))
+        headers = {'Accept': IMAGE_ACCEPT}
+        if filename in self.etags:
+            headers['If-None-Match'] = self.etags[filename]
+        response = self.request('fetch', 'GET', f"/uploads/{filename}", headers=headers)
+        if response is None:
+            return
+        if response.status_code == 404:
+            self.gallery.discard(filename)
+            self.etags.pop(filename, None)
+        elif response.headers.get('ETag'):
+            self.etags[filename] = response.headers['ETag']
+
+    def delete(self):
+        if not self.uploaded:
+            return self.upload()
+        filename = self.uploaded.pop(self.rng.randrange(len(self.uploaded)))
+        self.request('delete', 'DELETE', f"/delete/{filename}")
+        self.gallery.discard(filename)
+        self.etags.pop(filename, None)
+
+    def clean_up(self):
+        """Delete this phone's remaining uploads (not recorded)"""
+        import requests
+        with requests.Session() as session:
+            for filename in self.uploaded:
+                try:
+                    session.delete(f"{self.url}/delete/{filename}", timeout=self.settings['timeout'])
+                except requests.RequestException:
+                    pass
+
+
+# Summaries
+
+def summarize(events, seconds):
+    """Counts, throughput and latency percentiles (successful requests, ms) for events"""
+    latencies = sorted(latency for _, _, latency, _, ok, _ in events if ok)
+    errors = sum(1 for event in events if not event[4])
+    statuses = {}
+    for event in events:
+        statuses[str(event[3])] = statuses.get(str(event[3]), 0) + 1
+    return {
+        'count': len(events),
+        'errors': errors,
+        'error_rate': round(errors / len(events), 4) if events else 0.0,
+        'per_second': round(len(events) / seconds, 2) if seconds else 0.0,
+        'mb_per_second': round(sum(event[5] for event in events) / 1e6 / seconds, 2) if seconds else 0.0,
+        'mean_ms': _ms(statistics.fmean(latencies)) if latencies else None,
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p90_ms': _ms(percentile(latencies, 90)),
+        'p95_ms': _ms(percentile(latencies, 95)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+        'max_ms': _ms(latencies[-1]) if latencies else None,
+        'statuses': dict(sorted(statuses.items())),
+    }
+
+
+def _slope_per_hour(points):
+    """Least-squares slope of (seconds, value) points, per hour"""
+    points = [(t, v) for t, v in points if v is not None]
+    if len(points) < 3:
+        return None
+    mean_t = statistics.fmean(t for t, _ in points)
+    mean_v = statistics.fmean(v for _, v in points)
+    spread = sum((t - mean_t) ** 2 for t, _ in points)
+    if not spread:
+        return None
+    return round(sum((t - mean_t) * (v - mean_v) for t, v in points) / spread * 3600, 1)
+
+
+def summarize_server(timeline):
+    """Start/end/max of each server metric and the growth trend after warm-up
+
+    per_hour is None for runs too short to have a trend after warm-up.
+    """
+    server = {}
+    warm_up = max(WARM_UP_SECONDS, timeline[-1]['t'] / 10) if timeline else 0
+    warm = [sample for sample in timeline if sample['t'] >= warm_up]
+    for key in ('rss_mb', 'fds', 'threads', 'uploads_mb'):
+        values = [sample[key] for sample in timeline if sample.get(key) is not None]
+        if not values:
+            continue
+        server[key] = {'start': values[0], 'end': values[-1], 'max': max(values),
+                       'growth': round(values[-1] - values[0], 1),
+                       'per_hour': _slope_per_hour((sample['t'], sample.get(key)) for sample in warm)}
+    return server
+
+
+class Sampler(threading.Thread):
+    """Adds a timeline entry every interval: traffic since the last one plus server stats"""
+
+    def __init__(self, recorder, interval, pid=None, folder=None):
+        super().__init__(name='sampler', daemon=True)
+        self.recorder = recorder
+        self.interval = interval
+        self.pid = pid
+        self.folder = folder
+        self.timeline = []
+        self._seen = 0
+        self._last = 0.0
+        self._done = threading.Event()
+
+    def sample(self):
+        now = time.perf_counter() - self.recorder.started
+        events = self.recorder.events[self._seen:]
+        self._seen += len(events)
+        window = now - self._last
+        self._last = now
+        entry = {'t': round(now, 1)}
+        overall = summarize(events, window)
+        entry.update({key: overall[key] for key in ('count', 'errors', 'per_second', 'p50_ms', 'p95_ms')})
+        entry['upload_p95_ms'] = summarize([e for e in events if e[1] == 'upload'], window)['p95_ms']
+        if self.pid:
+            entry.update(process_stats(self.pid))
+        if self.folder:
+            entry['uploads_mb'] = folder_mb(os.path.join(self.folder, 'uploads'))
+        self.timeline.append(entry)
+
+    def run(self):
+        self.sample()
+        while not self._done.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.sample()
+
+
+# Runs
+
+def _git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR,
+                                capture_output=True, text=True, timeout=5)
+        return result.stdout.strip() or None
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+
+def run(clients=10, duration=60.0, ramp=5.0, think=0.5, poll=POLL_SECONDS, mix=None, timeout=30.0,
+        photos=None, url=None, pid=None, exe=None, interval=SAMPLE_SECONDS, keep=False, label=None):
+    """Run one load test and return its report"""
+    mix = mix or dict(DEFAULT_MIX)
+    photos = photos or synthetic_photos()
+    settings = {'clients': clients, 'duration_s': duration, 'ramp_s': ramp, 'think_ms': round(think * 1000),
+                'poll_s': poll, 'mix': mix, 'timeout_s': timeout}
+    folder = process = command = None
+    if url is None:
+        url = DEFAULT_URL
+        command = [exe, '--headless'] if exe else [sys.executable, os.path.join(SCRIPT_DIR, 'app.py'), '--headless']
+        folder = tempfile.mkdtemp(prefix='kingcyrus_load_')
+        process = start_server(command, folder, url)
+        pid = process.pid
+
+    recorder = Recorder()
+    sampler = Sampler(recorder, interval, pid, folder)
+    deadline = time.monotonic() + duration
+    phone_settings = {'clients': clients, 'ramp': ramp, 'think': think, 'poll': poll, 'mix': mix,
+                      'timeout': timeout}
+    phones = [Phone(i, url, photos, recorder, deadline, phone_settings) for i in range(clients)]
+    sampler.start()
+    try:
+        for phone in phones:
+            phone.start()
+        for phone in phones:
+            phone.join()
+        sampler.stop()
+        elapsed = time.perf_counter() - recorder.started
+        if process is None:
+            for phone in phones:
+                phone.clean_up()
+    finally:
+        if process is not None:
+            stop_server(process)
+            if not keep:
+                shutil.rmtree(folder, ignore_errors=True)
+
+    events = recorder.events
+    sizes = [len(data) for _, data in photos]
+    return {
+        'label': label,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'target': url,
+        'command': ' '.join(command) if command else None,
+        'folder': folder if keep else None,
+        'settings': settings,
+        'photos': {'count': len(photos), 'mean_kb': round(statistics.fmean(sizes) / 1024),
+                   'min_kb': round(min(sizes) / 1024), 'max_kb': round(max(sizes) / 1024)},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count(), 'commit': _git_commit()},
+        'elapsed_s': round(elapsed, 1),
+        'totals': summarize(events, elapsed),
+        'requests': {action: summarize([e for e in events if e[1] == action], elapsed)
+                     for action in OK_STATUSES if any(e[1] == action for e in events)},
+        'server': summarize_server(sampler.timeline),
+        'timeline': sampler.timeline,
+    }
+
+
+# Output
+
+def _fmt(value, suffix=''):
+    return '-' if value is None else f"{value}{suffix}"
+
+
+def print_report(report):
+    settings = report['settings']
+    print(f"{report['label'] or 'Load test'}: {settings['clients']} phones for {report['elapsed_s']}s "
+          f"against {report['target']} (commit {report['environment']['commit'] or 'unknown'})")
+    print(f"Photos: {report['photos']['count']} of {report['photos']['min_kb']}-{report['photos']['max_kb']} KB; "
+          f"think {settings['think_ms']} ms, poll {settings['poll_s']}s, mix {settings['mix']}")
+    totals = report['totals']
+    print(f"\n{totals['count']} requests, {totals['per_second']}/s, {totals['mb_per_second']} MB/s, "
+          f"{totals['errors']} errors ({totals['error_rate']:.2%})")
+    print(f"\n{'':<10}{'count':>8}{'/s':>8}{'errors':>8}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for action, stats in report['requests'].items():
+        print(f"{action:<10}{stats['count']:>8}{stats['per_second']:>8}{stats['errors']:>8}"
+              f"{_fmt(stats['p50_ms']):>9}{_fmt(stats['p90_ms']):>9}{_fmt(stats['p95_ms']):>9}"
+              f"{_fmt(stats['p99_ms']):>9}{_fmt(stats['max_ms']):>9}")
+    for action, stats in report['requests'].items():
+        unexpected = {status: n for status, n in stats['statuses'].items()
+                      if not status.isdigit() or int(status) not in OK_STATUSES[action]}
+        if unexpected:
+            print(f"  {action} failures: {unexpected}")
+    if report['server']:
+        print("\nServer: start -> end (max, change, trend after warm-up)")
+        for key, stats in report['server'].items():
+            print(f"  {key:<11} {_fmt(stats['start']):>8} -> {_fmt(stats['end']):>8} (max {stats['max']}, "
+                  f"{stats['growth']:+}, {_fmt(stats['per_hour'], '/h')})")
+    print(f"\n{'t (s)':>7}{'req/s':>8}{'errors':>8}{'p95':>9}{'upload p95':>12}{'RSS MB':>9}{'fds':>6}{'threads':>9}")
+    for sample in report['timeline']:
+        print(f"{sample['t']:>7}{sample['per_second']:>8}{sample['errors']:>8}{_fmt(sample['p95_ms']):>9}"
+              f"{_fmt(sample['upload_p95_ms']):>12}{_fmt(sample.get('rss_mb')):>9}{_fmt(sample.get('fds')):>6}"
+              f"{_fmt(sample.get('threads')):>9}")
+
+
+COMPARE_ROWS = [
+    ('phones', lambda r: r['settings']['clients']),
+    ('requests/s', lambda r: r['totals']['per_second']),
+    ('error rate %', lambda r: round(r['totals']['error_rate'] * 100, 2)),
+    ('uploads/s', lambda r: r['requests'].get('upload', {}).get('per_second')),
+    ('upload p50 ms', lambda r: r['requests'].get('upload', {}).get('p50_ms')),
+    ('upload p95 ms', lambda r: r['requests'].get('upload', {}).get('p95_ms')),
+    ('upload p99 ms', lambda r: r['requests'].get('upload', {}).get('p99_ms')),
+    ('poll p95 ms', lambda r: r['requests'].get('poll', {}).get('p95_ms')),
+    ('fetch p95 ms', lambda r: r['requests'].get('fetch', {}).get('p95_ms')),
+    ('delete p95 ms', lambda r: r['requests'].get('delete', {}).get('p95_ms')),
+    ('RSS end MB', lambda r: r['server'].get('rss_mb', {}).get('end')),
+    ('RSS MB/hour', lambda r: r['server'].get('rss_mb', {}).get('per_hour')),
+    ('fds growth', lambda r: r['server'].get('fds', {}).get('growth')),
+    ('threads growth', lambda r: r['server'].get('threads', {}).get('growth')),
+]
+
+
+def print_comparison(reports, names):
+    """Key numbers of each report, with the change from the first"""
+    width = max(14, *(len(name) + 2 for name in names))
+    print(f"{'':<16}" + ''.join(f"{name:>{width}}" for name in names))
+    for title, get in COMPARE_ROWS:
+        values = []
+        for report in reports:
+            try:
+                values.append(get(report))
+            except (KeyError, TypeError):
+                values.append(None)
+        cells = []
+        for i, value in enumerate(values):
+            cell = _fmt(value)
+            base = values[0]
+            if i and isinstance(value, (int, float)) and isinstance(base, (int, float)) and base:
+                cell += f" ({(value - base) / base:+.0%})"
+            cells.append(f"{cell:>{width}}")
+        print(f"{title:<16}" + ''.join(cells))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if '--compare' in args:
+        paths = args[args.index('--compare') + 1:]
+        if len(paths) < 2:
+            print(__doc__.strip())
+            sys.exit(1)
+        reports = []
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                reports.append(json.load(f))
+        print_comparison(reports, [report.get('label') or os.path.basename(path)
+                                   for report, path in zip(reports, paths)])
+        sys.exit(0)
+
+    steps = [int(n) for n in _option(args, '--clients', '10').split(',')]
+    photos_dir = _option(args, '--photos', None)
+    options = {
+        'duration': _option(args, '--duration', 60.0, float),
+        'ramp': _option(args, '--ramp', 5.0, float),
+        'think': _option(args, '--think', 500.0, float) / 1000,
+        'poll': _option(args, '--poll', POLL_SECONDS, float),
+        'mix': _option(args, '--mix', None, parse_mix),
+        'timeout': _option(args, '--timeout', 30.0, float),
+        'photos': folder_photos(photos_dir) if photos_dir else synthetic_photos(),
+        'url': _option(args, '--url', None),
+        'pid': _option(args, '--pid', None, int),
+        'exe': _option(args, '--exe', None),
+        'interval': _option(args, '--interval', SAMPLE_SECONDS, float),
+        'keep': '--keep' in args,
+    }
+    label = _option(args, '--label', None)
+    out = _option(args, '--out', f"load_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+
+    reports, paths = [], []
+    for clients in steps:
+        step_label = f"{label or 'run'} x{clients}" if len(steps) > 1 else label
+        report = run(clients=clients, label=step_label, **options)
+        path = out if len(steps) == 1 else f"{os.path.splitext(out)[0]}_{clients}phones.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        reports.append(report)
+        paths.append(path)
+        if '--json' in args:
+            print(json.dumps(report, indent=2))
+        else:
+            print_report(report)
+            print(f"\nSaved {path}\n")
+    if len(reports) > 1 and '--json' not in args:
+        print_comparison(reports, [f"{report['settings']['clients']} phones" for report in reports])
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+from card_crop import crop_path
+from storage_maintenance import DERIVED_DIRNAME
+
+COLLAGES_SUBDIR = os.path.join(DERIVED_DIRNAME, 'collages')
+# Longest edge of a collage; matches what phones upload (CLIENT_MAX_DIMENSION)
+COLLAGE_MAX_EDGE = 2400
+COLLAGE_QUALITY = 88
+MAX_COLLAGE_IMAGES = 48
+# Tiles are card shaped (2.5" x 3.5")
+TILE_ASPECT = 2.5 / 3.5
+TILE_PADDING = 12
+LABEL_HEIGHT = 36
+BACKGROUND = (255, 255, 255)
+
+
+def collage_path(upload_folder, name):
+    return os.path.join(upload_folder, COLLAGES_SUBDIR, name)
+
+
+def grid_size(count, columns=None):
+    """(columns, rows) for count tiles, as close to square as card tiles allow"""
+    if columns:
+        columns = max(1, min(int(columns), count))
+    else:
+        # A square canvas of portrait tiles wants a few more columns than rows
+        columns = max(1, min(count, round(math.sqrt(count / TILE_ASPECT))))
+    return columns, math.ceil(count / columns)
+
+
+def tile_size(columns, rows, labels):
+    """Largest card-shaped tile that keeps the canvas within COLLAGE_MAX_EDGE"""
+    label_height = LABEL_HEIGHT if labels else 0
+    width = (COLLAGE_MAX_EDGE - TILE_PADDING * (columns + 1)) // columns
+    height = int(width / TILE_ASPECT)
+    max_height = (COLLAGE_MAX_EDGE - TILE_PADDING * (rows + 1)) // rows - label_height
+    if height > max_height:
+        height = max_height
+        width = int(height * TILE_ASPECT)
+    return max(1, width), max(1, height)
+
+
+def load_tile(path, size):
+    """Decode an image scaled to fit inside size, keeping its aspect ratio"""
+    with Image.open(path) as img:
+        img.draft('RGB', size)  # JPEG decodes straight to roughly the tile size
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        img.thumbnail(size, Image.LANCZOS)
+        return img
+
+
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has one fixed-size default font
+        return ImageFont.load_default()
+
+
+def compose(tiles, columns, rows, size, labels=None):
+    """Paste tiles centred in a grid; labels is a list of strings or None"""
+    tile_width, tile_height = size
+    label_height = LABEL_HEIGHT if labels else 0
+    canvas = Image.new('RGB', (columns * tile_width + (columns + 1) * TILE_PADDING,
+                               rows * (tile_height + label_height) + (rows + 1) * TILE_PADDING), BACKGROUND)
+    draw = ImageDraw.Draw(canvas)
+    font = _font(LABEL_HEIGHT - 12) if labels else None
+    for index, tile in enumerate(tiles):
+        column, row = index % columns, index // columns
+        left = TILE_PADDING + column * (tile_width + TILE_PADDING)
+        top = TILE_PADDING + row * (tile_height + label_height + TILE_PADDING)
+        canvas.paste(tile, (left + (tile_width - tile.width) // 2, top + (tile_height - tile.height) // 2))
+        if labels and labels[index]:
+            draw.text((left + tile_width // 2, top + tile_height + label_height // 2), labels[index],
+                      fill=(40, 40, 40), font=font, anchor='mm')
+    return canvas
+
+
+class CollageBuilder:
+    """Grid collages of uploads for lot listings
+
+    Tiles are decoded and scaled on a thread pool (Pillow releases the GIL
+    while decoding and resampling). Results are cached in
+    uploads/derived/collages under a key made from the inputs' content
+    hashes and the layout, so rebuilding the same lot is a file lookup and
+    storage maintenance can evict old collages like other derived files.
+    """
+
+    def __init__(self, catalog, image_server, workers=None):
+        self.catalog = catalog
+        self.image_server = image_server
+        self.folder = os.path.join(catalog.upload_folder, COLLAGES_SUBDIR)
+        self._executor = ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1),
+                                            thread_name_prefix='collage')
+        self._building = {}  # cache key -> Event for builds in progress
+        self._lock = threading.Lock()
+
+    def source_path(self, filename):
+        """Use the deskewed crop when there is one"""
+        cropped = crop_path(self.catalog.upload_folder, filename)
+        if os.path.exists(cropped):
+            return cropped
+        return os.path.join(self.catalog.upload_folder, filename)
+
+    def cache_key(self, filenames, columns, labels):
+        inputs = []
+        for filename in filenames:
+            original = os.path.join(self.catalog.upload_folder, filename)
+            entry = [self.image_server.content_hash(filename, original)]
+            source = self.source_path(filename)
+            if source != original:
+                # Crops are rewritten in place by a forced re-crop
+                stat = os.stat(source)
+                entry += [stat.st_size, stat.st_mtime]
+            inputs.append(entry)
+        layout = {'columns': columns, 'labels': labels, 'edge': COLLAGE_MAX_EDGE, 'quality': COLLAGE_QUALITY}
+        digest = hashlib.sha256(json.dumps([inputs, layout]).encode()).hexdigest()
+        return digest[:24]
+
+    def build(self, filenames, columns=None, labels=True):
+        """Build (or fetch from cache) a collage; returns a result dict
+
+        labels: True numbers the tiles, a list gives one label per image,
+        False leaves them off.
+        """
+        if not filenames:
+            raise ValueError("Select at least one image")
+        if len(filenames) > MAX_COLLAGE_IMAGES:
+            raise ValueError(f"At most {MAX_COLLAGE_IMAGES} images per collage")
+        for filename in filenames:
+            if not os.path.isfile(os.path.join(self.catalog.upload_folder, filename)):
+                raise ValueError(f"Image not found: {filename}")
+        if labels is True:
+            labels = [str(i + 1) for i in range(len(filenames))]
+        elif labels:
+            labels = [str(label or '') for label in labels][:len(filenames)]
+            labels += [''] * (len(filenames) - len(labels))
+        else:
+            labels = None
+
+        started = time.perf_counter()
+        key = self.cache_key(filenames, columns, labels)
+        name = f"{key}.jpg"
+        path = collage_path(self.catalog.upload_folder, name)
+
+        # One build per key; concurrent requests for the same lot wait for it
+        while True:
+            if os.path.exists(path):
+                return self._result(name, path, len(filenames), True, started)
+            with self._lock:
+                pending = self._building.get(key)
+                if pending is None:
+                    self._building[key] = threading.Event()
+                    break
+            pending.wait()
+
+        try:
+            cols, rows = grid_size(len(filenames), columns)
+            size = tile_size(cols, rows, labels)
+            tiles = list(self._executor.map(lambda f: load_tile(self.source_path(f), size), filenames))
+            canvas = compose(tiles, cols, rows, size, labels)
+            os.makedirs(self.folder, exist_ok=True)
+            tmp_path = path + '.tmp'
+            canvas.save(tmp_path, 'JPEG', quality=COLLAGE_QUALITY, optimize=True, progressive=True)
+            os.replace(tmp_path, path)
+        finally:
+            with self._lock:
+                self._building.pop(key).set()
+        return self._result(name, path, len(filenames), False, started)
+
+    def _result(self, name, path, count, cached, started):
+        with Image.open(path) as img:
+            size = list(img.size)
+        return {
+            'collage': name,
+            'url': f"uploads/collages/{name}",
+            'images': count,
+            'size': size,
+            'bytes': os.path.getsize(path),
+            'cached': cached,
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+
+    def exists(self, name):
+        return os.path.isfile(collage_path(self.catalog.upload_folder, os.path.basename(name)))
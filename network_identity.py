@@ -0,0 +1,149 @@
+import socket
+import threading
+import time
+
+# How often the background watcher re-checks the LAN address
+POLL_SECONDS = 5
+FALLBACK_ADDRESS = "127.0.0.1"
+MDNS_SERVICE_TYPE = "_http._tcp.local."
+
+
+def detect_local_ip():
+    """LAN address of the interface that routes to the internet
+
+    connect() on a UDP socket only picks a route; no packet is sent.
+    """
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+        finally:
+            s.close()
+    except OSError:
+        return FALLBACK_ADDRESS
+
+
+class NetworkIdentity:
+    """Cached LAN address of this machine, kept current in the background
+
+    address is a plain attribute read, so request handlers never touch a
+    socket. A watcher thread re-detects it every POLL_SECONDS and, when it
+    changes (the laptop joined another Wi-Fi network), updates the mDNS
+    registration and notifies subscribers.
+
+    With an mDNS hostname (e.g. "kingcyruscards" -> kingcyruscards.local)
+    phones can keep using one URL across networks. That needs the optional
+    zeroconf package; without it the hostname is ignored and URLs use the
+    IP address.
+    """
+
+    def __init__(self, port, mdns_hostname=None, poll_seconds=POLL_SECONDS):
+        self.port = port
+        self.poll_seconds = poll_seconds
+        self.mdns_hostname = mdns_hostname
+        self.address = detect_local_ip()
+        self.changed_at = time.time()
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._zeroconf = None
+        self._service = None
+
+    def start(self):
+        if self._thread is None:
+            if self.mdns_hostname:
+                self._register_mdns()
+            self._thread = threading.Thread(target=self._watch, name='network-identity', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._zeroconf is not None:
+            self._zeroconf.unregister_all_services()
+            self._zeroconf.close()
+            self._zeroconf = None
+
+    def subscribe(self, callback):
+        """callback(new_address, old_address) runs on the watcher thread after a change"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    @property
+    def hostname(self):
+        """mDNS name phones can use, or None when it isn't being advertised"""
+        if self._service is None:
+            return None
+        return f"{self.mdns_hostname}.local"
+
+    def url(self):
+        """Upload page URL for phones: the mDNS name when advertised, else the IP"""
+        return f"http://{self.hostname or self.address}:{self.port}"
+
+    def ip_url(self):
+        return f"http://{self.address}:{self.port}"
+
+    def refresh(self):
+        """Re-detect the address now; returns True if it changed
+
+        A failed detection (no route while the network is down) keeps the
+        last LAN address, so queued listings and the QR code don't switch
+        to loopback and back every time Wi-Fi drops.
+        """
+        address = detect_local_ip()
+        with self._lock:
+            old = self.address
+            if address == old or (address == FALLBACK_ADDRESS and old != FALLBACK_ADDRESS):
+                return False
+            self.address = address
+            self.changed_at = time.time()
+            subscribers = list(self._subscribers)
+        print(f"🌐 Network address changed: {old} -> {address}")
+        if self._service is not None:
+            self._update_mdns()
+        for callback in subscribers:
+            try:
+                callback(address, old)
+            except Exception as e:
+                print(f"Network change callback error: {e}")
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            self.refresh()
+
+    def _service_info(self):
+        from zeroconf import ServiceInfo
+        return ServiceInfo(
+            MDNS_SERVICE_TYPE,
+            f"{self.mdns_hostname}.{MDNS_SERVICE_TYPE}",
+            addresses=[socket.inet_aton(self.address)],
+            port=self.port,
+            server=f"{self.mdns_hostname}.local.",
+            properties={'path': '/'})
+
+    def _register_mdns(self):
+        try:
+            from zeroconf import Zeroconf
+        except ImportError:
+            print("mDNS hostname needs the zeroconf package (pip install zeroconf); using the IP address")
+            return
+        try:
+            self._zeroconf = Zeroconf()
+            self._service = self._service_info()
+            self._zeroconf.register_service(self._service, allow_name_change=True)
+        except Exception as e:
+            print(f"mDNS registration failed: {e}")
+            self._service = None
+
+    def _update_mdns(self):
+        try:
+            self._service = self._service_info()
+            self._zeroconf.update_service(self._service)
+        except Exception as e:
+            print(f"mDNS update failed: {e}")
+
+    def status(self):
+        return {'address': self.address, 'hostname': self.hostname, 'url': self.url(),
+                'changed_at': self.changed_at}
@@ -0,0 +1,388 @@
+"""
+Price suggestions from imported sold-listing history
+Run: python price_comps.py import <sold.csv> [...]
+     python price_comps.py suggest "<title>"
+
+Sold history exports (eBay sold-item CSV downloads, Terapeak, spreadsheets)
+are streamed into a SQLite store next to the eBay config. Lookups use an
+in-memory inverted index over title words plus a trigram index over the
+word vocabulary, so "jordon" still finds "jordan" and the word being typed
+matches by prefix.
+"""
+import array
+import bisect
+import csv
+import functools
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from ebay_config import CONFIG_DIR, ensure_config_dir
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+SOLD_HISTORY_FILE = CONFIG_DIR / "sold_history.db"
+IMPORT_BATCH = 5000
+# Header names recognised in exports, most specific first (compared lower-cased)
+TITLE_COLUMNS = ('title', 'item title', 'listing title', 'item name', 'name')
+PRICE_COLUMNS = ('sold price', 'sold for', 'sale price', 'total price', 'item price', 'price')
+DATE_COLUMNS = ('sold date', 'sale date', 'date sold', 'end date', 'date')
+# Columns identifying one sale. Item numbers aren't among them: a listing
+# with quantity sells many times under one item number.
+SALE_ID_COLUMNS = ('transaction id', 'order number', 'order id', 'sales record number', 'record number')
+
+# Each entry upgrades the store by one version; never edit old entries
+_MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS sales (
+        id INTEGER PRIMARY KEY, title TEXT NOT NULL, price REAL NOT NULL, sold_at TEXT, source TEXT,
+        UNIQUE (title, price, sold_at)
+    );
+    """,
+    """
+    CREATE TABLE sales_by_row (
+        id INTEGER PRIMARY KEY, title TEXT NOT NULL, price REAL NOT NULL, sold_at TEXT, source TEXT,
+        row_key TEXT NOT NULL UNIQUE
+    );
+    INSERT INTO sales_by_row (id, title, price, sold_at, source, row_key)
+        SELECT id, title, price, sold_at, source, 'legacy:' || id FROM sales;
+    DROP TABLE sales;
+    ALTER TABLE sales_by_row RENAME TO sales;
+    """,
+]
+
+# Comps must score at least this share of the best match
+MATCH_RATIO = 0.75
+# ...and match at least this share of the title's words (by weight)
+MIN_COVERAGE = 0.5
+MAX_COMPS = 50
+EXAMPLES = 5
+# Vocabulary words this similar (trigram Jaccard) count as the same word
+FUZZY_MIN_SIMILARITY = 0.5
+FUZZY_MIN_LENGTH = 4
+PREFIX_MATCHES = 20
+PREFIX_SIMILARITY = 0.9
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_PRICE_RE = re.compile(r"[^\d.]")
+
+
+def _tokenize(text):
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def _trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _parse_price(value):
+    try:
+        price = float(_PRICE_RE.sub('', value or ''))
+    except ValueError:
+        return None
+    return price if price > 0 else None
+
+
+def _find_column(fieldnames, candidates):
+    lookup = {name.strip().lower(): name for name in fieldnames if name}
+    return next((lookup[c] for c in candidates if c in lookup), None)
+
+
+class _Index:
+    """Search structures built from one read of the store; never modified"""
+
+    def __init__(self, rows):
+        self.size = len(rows)
+        self.ids = np.empty(self.size, dtype=np.int64)
+        self.prices = np.empty(self.size, dtype=np.float32)
+        vocabulary = {}
+        token_ids = array.array('i')
+        docs = array.array('i')
+        for doc, (row_id, title, price) in enumerate(rows):
+            self.ids[doc] = row_id
+            self.prices[doc] = price
+            for token in set(_tokenize(title)):
+                token_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                docs.append(doc)
+
+        # Group documents by word with one sort instead of a Python list per word
+        token_ids = np.frombuffer(token_ids, dtype=np.int32)
+        docs = np.frombuffer(docs, dtype=np.int32)
+        sorted_docs = docs[np.argsort(token_ids, kind='stable')]
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(token_ids, minlength=len(vocabulary)))))
+        self.postings = {token: sorted_docs[bounds[i]:bounds[i + 1]] for token, i in vocabulary.items()}
+        self.idf = {token: math.log(1 + self.size / len(matches)) for token, matches in self.postings.items()}
+        self.vocabulary = sorted(self.postings)
+
+        self.grams = {}
+        for token in self.vocabulary:
+            if len(token) >= FUZZY_MIN_LENGTH and token.isalpha():
+                for gram in _trigrams(token):
+                    self.grams.setdefault(gram, []).append(token)
+        # Operators retype the same words constantly
+        self.expand = functools.lru_cache(maxsize=4096)(self._expand)
+
+    def _expand(self, word, prefix):
+        """[(token, similarity)] vocabulary words standing in for a title word
+
+        Words with digits (years, card numbers, grades, serials) only match
+        exactly. With prefix, words starting with the given one match too.
+        """
+        matches = {}
+        if word in self.postings:
+            matches[word] = 1.0
+        if not word.isalpha():
+            return list(matches.items())
+        if prefix:
+            start = bisect.bisect_left(self.vocabulary, word)
+            for token in self.vocabulary[start:start + PREFIX_MATCHES]:
+                if not token.startswith(word):
+                    break
+                matches.setdefault(token, PREFIX_SIMILARITY)
+        if len(word) >= FUZZY_MIN_LENGTH:
+            word_grams = _trigrams(word)
+            shared = {}
+            for gram in word_grams:
+                for token in self.grams.get(gram, ()):
+                    shared[token] = shared.get(token, 0) + 1
+            for token, count in shared.items():
+                similarity = count / (len(word_grams) + len(_trigrams(token)) - count)
+                if similarity >= FUZZY_MIN_SIMILARITY and similarity > matches.get(token, 0):
+                    matches[token] = similarity
+        return list(matches.items())
+
+    def search(self, title):
+        """(document numbers, match scores 0-1) of the closest sales, best first"""
+        words = list(dict.fromkeys(_tokenize(title)))
+        if not words or not self.size:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        # While typing, the last word may be incomplete
+        typing = not title[-1:].isspace()
+        scores = np.zeros(self.size, dtype=np.float32)
+        total = 0.0
+        for position, word in enumerate(words):
+            matches = self.expand(word, typing and position == len(words) - 1)
+            if not matches:
+                continue
+            weight = max(self.idf[token] for token, _ in matches)
+            total += weight
+            # A sale scores a word once, through its closest variant
+            word_scores = np.zeros(self.size, dtype=np.float32)
+            for token, similarity in matches:
+                docs = self.postings[token]
+                word_scores[docs] = np.maximum(word_scores[docs], weight * similarity)
+            scores += word_scores
+        if not total:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        threshold = max(float(scores.max()) * MATCH_RATIO, total * MIN_COVERAGE)
+        candidates = np.flatnonzero(scores >= threshold)
+        if len(candidates) > MAX_COMPS:
+            candidates = candidates[np.argpartition(scores[candidates], -MAX_COMPS)[-MAX_COMPS:]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return candidates, scores[candidates] / total
+
+
+class PriceComps:
+    """Sold-listing history with a fuzzy title search for price suggestions
+
+    The index is built in the background on first use and rebuilt after
+    each import; suggest() answers {'ready': False} until it is available
+    rather than making the caller wait.
+    """
+
+    def __init__(self, path=SOLD_HISTORY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._conn = None
+        self._index = None
+        self._building = False
+        self.built_at = None
+        self.build_seconds = None
+
+    def _open(self):
+        ensure_config_dir()
+        conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for number, script in enumerate(_MIGRATIONS[version:], start=version + 1):
+            conn.executescript(f"BEGIN; {script}; PRAGMA user_version = {number}; COMMIT;")
+        return conn
+
+    def _connection(self):
+        """Connection for lookups; imports write through their own"""
+        if self._conn is None:
+            self._conn = self._open()
+        return self._conn
+
+    def import_csv(self, file, source=None):
+        """Stream a sold-history CSV (path or text file object) into the store
+
+        Each sale is stored once: exports with a transaction/order number
+        column are keyed by it, so overlapping exports merge. Otherwise a
+        row is keyed by its content (title, price, date) and how many times
+        that content already appeared in the file: re-importing an export
+        adds nothing, repeat sales at the same price and date are all kept,
+        and the file's name plays no part (monthly exports often share one).
+        source is only recorded. Returns row counts.
+
+        Writes go through a connection of their own, committed per batch,
+        so suggest() keeps answering during a long import.
+        """
+        if isinstance(file, (str, bytes)) or hasattr(file, '__fspath__'):
+            with open(file, 'r', newline='', encoding='utf-8-sig') as f:
+                return self.import_csv(f, source or os.path.basename(os.fsdecode(file)))
+        source = source or os.path.basename(str(getattr(file, 'name', '') or 'csv'))
+
+        started = time.perf_counter()
+        reader = csv.DictReader(file)
+        fieldnames = reader.fieldnames or []
+        title_column = _find_column(fieldnames, TITLE_COLUMNS)
+        price_column = _find_column(fieldnames, PRICE_COLUMNS)
+        date_column = _find_column(fieldnames, DATE_COLUMNS)
+        id_column = _find_column(fieldnames, SALE_ID_COLUMNS)
+        if not title_column or not price_column:
+            raise ValueError(f"CSV needs a title and a price column; found: {', '.join(fieldnames)}")
+
+        counts = {'rows': 0, 'imported': 0, 'skipped': 0}
+        batch = []
+        occurrences = {}
+        conn = self._open()
+        try:
+            for row in reader:
+                counts['rows'] += 1
+                title = ' '.join((row.get(title_column) or '').split())
+                price = _parse_price(row.get(price_column))
+                if not title or price is None:
+                    counts['skipped'] += 1
+                    continue
+                sold_at = (row.get(date_column) or '').strip() if date_column else ''
+                sale_id = (row.get(id_column) or '').strip() if id_column else ''
+                if sale_id:
+                    row_key = f"id:{sale_id}"
+                else:
+                    content = f"{title.lower()}|{price:.2f}|{sold_at}"
+                    occurrences[content] = occurrences.get(content, 0) + 1
+                    row_key = f"row:{content}|{occurrences[content]}"
+                batch.append((title, price, sold_at, source, row_key))
+                if len(batch) >= IMPORT_BATCH:
+                    counts['imported'] += self._insert(conn, batch)
+                    batch = []
+            if batch:
+                counts['imported'] += self._insert(conn, batch)
+        finally:
+            conn.close()
+        counts['duplicates'] = counts['rows'] - counts['skipped'] - counts['imported']
+        counts['seconds'] = round(time.perf_counter() - started, 2)
+        if counts['imported']:
+            self.rebuild()
+        return counts
+
+    def _insert(self, conn, batch):
+        before = conn.total_changes
+        with conn:
+            conn.executemany('INSERT OR IGNORE INTO sales (title, price, sold_at, source, row_key) '
+                             'VALUES (?, ?, ?, ?, ?)', batch)
+        return conn.total_changes - before
+
+    def rebuild(self, wait=False):
+        """Rebuild the index from the store (in the background unless wait)"""
+        if wait:
+            self._build()
+        else:
+            threading.Thread(target=self._build, name='price-comps-index', daemon=True).start()
+
+    def _build(self):
+        with self._build_lock:
+            self._building = True
+            try:
+                started = time.perf_counter()
+                conn = self._open()
+                try:
+                    rows = conn.execute('SELECT id, title, price FROM sales').fetchall()
+                finally:
+                    conn.close()
+                self._index = _Index(rows)
+                self.built_at = time.time()
+                self.build_seconds = round(time.perf_counter() - started, 2)
+            except Exception as e:
+                print(f"Error building price comps index: {e}")
+            finally:
+                self._building = False
+
+    def _ready_index(self):
+        index = self._index
+        if index is None and not self._building:
+            self._building = True
+            self.rebuild()
+        return index
+
+    def suggest(self, title):
+        """Price range of the sales whose titles best match title"""
+        started = time.perf_counter()
+        index = self._ready_index()
+        if index is None:
+            return {'ready': False, 'count': 0}
+        docs, scores = index.search(title or '')
+        result = {'ready': True, 'count': int(len(docs))}
+        if len(docs):
+            prices = index.prices[docs].astype(float)
+            low, median, high = np.percentile(prices, [25, 50, 75])
+            result.update({
+                'low': round(float(low), 2),
+                'median': round(float(median), 2),
+                'high': round(float(high), 2),
+                'min': round(float(prices.min()), 2),
+                'max': round(float(prices.max()), 2),
+                'examples': self._examples(index.ids[docs[:EXAMPLES]], scores[:EXAMPLES])
+            })
+        result['ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    def _examples(self, row_ids, scores):
+        ids = [int(row_id) for row_id in row_ids]
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT id, title, price, sold_at FROM sales WHERE id IN ({','.join('?' for _ in ids)})",
+                ids).fetchall()
+        by_id = {row[0]: row for row in rows}
+        return [{'title': by_id[i][1], 'price': by_id[i][2], 'sold_at': by_id[i][3], 'match': round(float(s), 2)}
+                for i, s in zip(ids, scores) if i in by_id]
+
+    def status(self):
+        with self._lock:
+            sales = self._connection().execute('SELECT COUNT(*) FROM sales').fetchone()[0]
+        return {'sales': sales, 'indexed': self._index.size if self._index else 0, 'building': self._building,
+                'built_at': self.built_at, 'build_seconds': self.build_seconds}
+
+
+_comps = None
+_comps_lock = threading.Lock()
+
+
+def get_price_comps():
+    """Return the process-wide sold history"""
+    global _comps
+    with _comps_lock:
+        if _comps is None:
+            _comps = PriceComps()
+        return _comps
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in ('import', 'suggest'):
+        print(__doc__.strip())
+        sys.exit(1)
+    comps = get_price_comps()
+    if args[0] == 'import':
+        for path in args[1:]:
+            print(path, comps.import_csv(path))
+    else:
+        comps.rebuild(wait=True)
+        print(comps.suggest(' '.join(args[1:])))
@@ -1,12 +1,18 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox, scrolledtext, filedialog
 import qrcode
 from PIL import ImageTk, Image
-from ebay_config import load_config, save_config, is_configured, load_defaults, save_defaults
-from ebay_uploader import eBayUploader
+from ebay_config import load_config, save_config, is_configured, load_defaults, save_defaults, list_accounts, default_account, set_default_account
+from listing_validator import validate_listing, format_errors, CONDITIONS
+from ebay_taxonomy import get_taxonomy_cache
+from listing_templates import FIELDS as CARD_FIELDS, render_listing, templates_from_defaults
+from price_comps import get_price_comps
+import threading
 import webbrowser
 import requests
 import io
+import queue
+import time
 from pathlib import Path
 
 def create_listings_interface(parent):
@@ -39,21 +45,188 @@ def create_listings_interface(parent):
     images_container = tk.Frame(scrollable_frame, bg='white')
     images_container.pack(pady=5, padx=20, fill='x')
     
-    images_listbox = tk.Listbox(images_container, height=5, font=("Arial", 10))
+    images_listbox = tk.Listbox(images_container, height=5, font=("Arial", 10), selectmode='extended', exportselection=False)
     images_listbox.pack(side='left', fill='both', expand=True)
     
     images_scroll = ttk.Scrollbar(images_container, orient='vertical', command=images_listbox.yview)
     images_scroll.pack(side='right', fill='y')
     images_listbox.config(yscrollcommand=images_scroll.set)
     
+    # Card drafts grouped automatically from the upload stream
+    drafts_frame = tk.Frame(scrollable_frame, bg='white')
+    drafts_frame.pack(pady=5, padx=20, fill='x')
+    tk.Label(drafts_frame, text="Card:", font=("Arial", 10, "bold"), bg='white').pack(side='left')
+    draft_var = tk.StringVar()
+    draft_menu = ttk.Combobox(drafts_frame, textvariable=draft_var, state='readonly', width=40, font=("Arial", 10))
+    draft_menu.pack(side='left', padx=5)
+    drafts_state = {'drafts': [], 'current': None}
+    
+    def select_draft(index):
+        drafts = drafts_state['drafts']
+        images_listbox.selection_clear(0, tk.END)
+        if not drafts:
+            drafts_state['current'] = None
+            draft_var.set("No card drafts - select images manually")
+            return
+        index = max(0, min(index, len(drafts) - 1))
+        draft = drafts[index]
+        drafts_state['current'] = draft
+        draft_menu.current(index)
+        names = images_listbox.get(0, tk.END)
+        for i, name in enumerate(names):
+            if name in draft['images']:
+                images_listbox.selection_set(i)
+                images_listbox.see(i)
+        show_quality_warnings(draft['images'])
+        show_card_fields(draft.get('fields', {}))
+        if draft.get('fields') and not title_entry.get().strip():
+            fill_from_template()
+    
+    def load_drafts(index=0):
+        load_images(images_listbox)
+        try:
+            response = requests.get('http://localhost:5000/drafts')
+            drafts_state['drafts'] = response.json().get('drafts', [])
+        except Exception as e:
+            print(f"Error loading drafts: {e}")
+            drafts_state['drafts'] = []
+        total = len(drafts_state['drafts'])
+        draft_menu['values'] = [
+            f"Card {i + 1} of {total} ({len(d['images'])} photo{'s' if len(d['images']) != 1 else ''})"
+            for i, d in enumerate(drafts_state['drafts'])
+        ]
+        select_draft(index)
+    
+    def skip_draft():
+        draft = drafts_state['current']
+        if not draft:
+            return
+        try:
+            requests.post(f"http://localhost:5000/drafts/{draft['id']}", json={'status': 'dismissed'})
+        except Exception as e:
+            print(f"Error dismissing draft: {e}")
+        load_drafts(draft_menu.current())
+    
+    quality_label = tk.Label(scrollable_frame, text="", font=("Arial", 9), fg='#b8860b', bg='white',
+                             wraplength=450, justify='left')
+    
+    def fetch_quality_warnings(images):
+        """{filename: [messages]} for images the server flagged"""
+        try:
+            response = requests.get('http://localhost:5000/images/quality',
+                                    params={'names': ','.join(images)})
+            data = response.json()
+        except Exception as e:
+            print(f"Error loading photo quality: {e}")
+            return {}
+        messages = data.get('messages', {})
+        return {img: [messages.get(w, w) for w in scores['warnings']]
+                for img, scores in data.get('quality', {}).items() if scores['warnings']}
+    
+    def show_quality_warnings(images):
+        warnings = fetch_quality_warnings(images) if images else {}
+        quality_label.config(text="\n".join(f"⚠ {img}: {', '.join(msgs)}" for img, msgs in warnings.items()))
+    
+    draft_menu.bind('<<ComboboxSelected>>', lambda e: select_draft(draft_menu.current()))
+    tk.Button(drafts_frame, text="Skip Card", command=skip_draft,
+              font=("Arial", 9), bg='#e0e0e0', relief='flat', cursor='hand2').pack(side='left', padx=5)
+    
     refresh_btn = tk.Button(scrollable_frame, text="🔄 Refresh Images", 
-                           command=lambda: load_images(images_listbox),
+                           command=lambda: load_drafts(max(draft_menu.current(), 0)),
                            font=("Arial", 9), bg='#e0e0e0', relief='flat', cursor='hand2')
     refresh_btn.pack(pady=5, padx=20, anchor='w')
+    quality_label.pack(padx=20, anchor='w')
+    
+    def crop_images():
+        """Crop and deskew every image that hasn't been processed yet"""
+        try:
+            result = requests.post('http://localhost:5000/crops', json={}).json()
+            if result.get('success'):
+                status_label.config(text="✂️ Cropping cards in the background...", fg='orange')
+            else:
+                messagebox.showerror("Error", result.get('error', 'Unknown error'))
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to start cropping:\n{str(e)}")
+    
+    tools_frame = tk.Frame(scrollable_frame, bg='white')
+    tools_frame.pack(pady=5, padx=20, anchor='w')
+    crop_btn = tk.Button(tools_frame, text="✂️ Auto-Crop Cards", command=crop_images,
+                         font=("Arial", 9), bg='#e0e0e0', relief='flat', cursor='hand2')
+    crop_btn.pack(side='left')
+    
+    # Lot listings lead with a collage of the selected photos
+    collage_state = {'name': None, 'images': None}
+    
+    def build_collage():
+        selected_images = [images_listbox.get(i) for i in images_listbox.curselection()]
+        if len(selected_images) < 2:
+            messagebox.showerror("Error", "Select at least two images for a lot collage")
+            return
+        status_label.config(text="🧩 Building collage...", fg='orange')
+        status_label.update_idletasks()
+        try:
+            result = requests.post('http://localhost:5000/collages',
+                                   json={'images': selected_images, 'labels': True}).json()
+        except Exception as e:
+            status_label.config(text="✗ Error", fg='red')
+            messagebox.showerror("Error", f"Failed to build collage:\n{str(e)}")
+            return
+        if not result.get('success'):
+            status_label.config(text="✗ Collage failed", fg='red')
+            messagebox.showerror("Error", result.get('error', 'Unknown error'))
+            return
+        collage_state.update(name=result['collage'], images=set(selected_images))
+        status_label.config(text=f"🧩 Collage of {result['images']} photos ready - it will lead this listing",
+                            fg='green')
+    
+    tk.Button(tools_frame, text="🧩 Build Lot Collage", command=build_collage,
+              font=("Arial", 9), bg='#e0e0e0', relief='flat', cursor='hand2').pack(side='left', padx=5)
     
     # Form fields
     ttk.Separator(scrollable_frame, orient='horizontal').pack(fill='x', pady=15, padx=20)
     
+    # Card details feed the title/description templates from the listing defaults
+    tk.Label(scrollable_frame, text="Card Details", font=("Arial", 10, "bold"), bg='white').pack(anchor='w', padx=20, pady=(5, 0))
+    card_frame = tk.Frame(scrollable_frame, bg='white')
+    card_frame.pack(anchor='w', padx=20, pady=5)
+    card_entries = {}
+    for i, field in enumerate(CARD_FIELDS):
+        tk.Label(card_frame, text=field.replace('_', ' ').title(), font=("Arial", 9), bg='white').grid(
+            row=i // 3 * 2, column=i % 3, sticky='w', padx=(0, 8))
+        entry = tk.Entry(card_frame, width=18, font=("Arial", 10))
+        entry.grid(row=i // 3 * 2 + 1, column=i % 3, sticky='w', padx=(0, 8), pady=(0, 4))
+        card_entries[field] = entry
+    
+    def card_fields():
+        return {field: entry.get().strip() for field, entry in card_entries.items() if entry.get().strip()}
+    
+    def show_card_fields(fields):
+        for field, entry in card_entries.items():
+            entry.delete(0, tk.END)
+            entry.insert(0, fields.get(field, ''))
+    
+    def fill_from_template():
+        """Render the saved templates and remember the details on the draft"""
+        fields = card_fields()
+        rendered = render_listing(fields, *templates_from_defaults(load_defaults()))
+        title_entry.delete(0, tk.END)
+        title_entry.insert(0, rendered['title'])
+        description_text.delete("1.0", tk.END)
+        description_text.insert("1.0", rendered['description'])
+        schedule_comps()
+        if rendered['truncated']:
+            status_label.config(text="Template output was shortened to fit eBay's limits", fg='#b8860b')
+        draft = drafts_state['current']
+        if draft:
+            draft['fields'] = fields
+            try:
+                requests.post(f"http://localhost:5000/drafts/{draft['id']}", json={'fields': fields})
+            except Exception as e:
+                print(f"Error saving card details: {e}")
+    
+    tk.Button(scrollable_frame, text="📝 Fill From Template", command=fill_from_template,
+              font=("Arial", 9), bg='#e0e0e0', relief='flat', cursor='hand2').pack(anchor='w', padx=20, pady=(0, 5))
+    
     # Title
     tk.Label(scrollable_frame, text="Title *", font=("Arial", 10, "bold"), bg='white').pack(anchor='w', padx=20, pady=(5, 0))
     title_entry = tk.Entry(scrollable_frame, width=60, font=("Arial", 10))
@@ -69,6 +242,76 @@ def create_listings_interface(parent):
     price_entry = tk.Entry(scrollable_frame, width=20, font=("Arial", 10))
     price_entry.pack(anchor='w', padx=20, pady=5)
     
+    # Sold comps follow the title as it's typed; clicking fills in the median
+    comps_frame = tk.Frame(scrollable_frame, bg='white')
+    comps_frame.pack(anchor='w', padx=20)
+    comps_label = tk.Label(comps_frame, text="", font=("Arial", 9), bg='white', fg='#555', cursor='hand2')
+    comps_label.pack(side='left')
+    comps_state = {'after': None, 'median': None}
+    
+    def update_comps():
+        comps_state['after'] = None
+        title = title_entry.get()
+        if not title.strip():
+            comps_label.config(text="")
+            comps_state['median'] = None
+            return
+        result = get_price_comps().suggest(title)
+        if not result['ready']:
+            comps_label.config(text="Comps: indexing sold history...")
+            comps_state['after'] = parent.after(1000, update_comps)
+        elif not result['count']:
+            comps_label.config(text="Comps: no matching sales")
+            comps_state['median'] = None
+        else:
+            comps_label.config(text=f"Comps: ${result['low']:.2f}-${result['high']:.2f} "
+                                    f"(median ${result['median']:.2f}, {result['count']} sales) - click to use")
+            comps_state['median'] = result['median']
+    
+    def schedule_comps(event=None):
+        if comps_state['after']:
+            parent.after_cancel(comps_state['after'])
+        comps_state['after'] = parent.after(250, update_comps)
+    
+    def use_median(event=None):
+        if comps_state['median'] is not None:
+            price_entry.delete(0, tk.END)
+            price_entry.insert(0, f"{comps_state['median']:.2f}")
+    
+    def import_sold_history():
+        path = filedialog.askopenfilename(title="Import sold listings CSV",
+                                          filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not path:
+            return
+        status_label.config(text="📈 Importing sold history...", fg='orange')
+        result = {}
+        
+        def run():
+            try:
+                result['counts'] = get_price_comps().import_csv(path)
+            except (ValueError, OSError, UnicodeDecodeError) as e:
+                result['error'] = str(e)
+        
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        
+        def poll():
+            if worker.is_alive():
+                parent.after(200, poll)
+            elif 'error' in result:
+                status_label.config(text=f"✗ Import failed: {result['error']}", fg='red')
+            else:
+                counts = result['counts']
+                status_label.config(text=f"📈 Imported {counts['imported']} sales ({counts['duplicates']} already "
+                                         f"known, {counts['skipped']} skipped)", fg='green')
+                schedule_comps()
+        parent.after(200, poll)
+    
+    comps_label.bind('<Button-1>', use_median)
+    title_entry.bind('<KeyRelease>', schedule_comps)
+    tk.Button(comps_frame, text="📈 Import Sold History", command=import_sold_history,
+              font=("Arial", 8), bg='#e0e0e0', relief='flat', cursor='hand2').pack(side='left', padx=(8, 0))
+    
     # Quantity
     tk.Label(scrollable_frame, text="Quantity *", font=("Arial", 10, "bold"), bg='white').pack(anchor='w', padx=20, pady=(10, 0))
     quantity_spinbox = tk.Spinbox(scrollable_frame, from_=1, to=999, width=18, font=("Arial", 10))
@@ -76,16 +319,83 @@ def create_listings_interface(parent):
     
     # Category ID
     tk.Label(scrollable_frame, text="Category ID *", font=("Arial", 10, "bold"), bg='white').pack(anchor='w', padx=20, pady=(10, 0))
-    category_entry = tk.Entry(scrollable_frame, width=30, font=("Arial", 10))
+    category_entry = ttk.Combobox(scrollable_frame, width=58, font=("Arial", 10))
     category_entry.pack(anchor='w', padx=20, pady=5)
-    tk.Label(scrollable_frame, text="e.g., 261328 for Sports Cards", 
+    category_hint = tk.Label(scrollable_frame, text="Type a category name or ID (e.g., 261328 for Sports Cards)", 
+            font=("Arial", 9), fg='gray', bg='white', wraplength=450, justify='left')
+    category_hint.pack(anchor='w', padx=20)
+    
+    # Item specifics
+    tk.Label(scrollable_frame, text="Item Specifics", font=("Arial", 10, "bold"), bg='white').pack(anchor='w', padx=20, pady=(10, 0))
+    aspects_text = scrolledtext.ScrolledText(scrollable_frame, width=58, height=4, font=("Arial", 10))
+    aspects_text.pack(anchor='w', padx=20, pady=5)
+    tk.Label(scrollable_frame, text="One per line, e.g. Sport: Baseball", 
             font=("Arial", 9), fg='gray', bg='white').pack(anchor='w', padx=20)
     
+    def selected_category_id():
+        # Autocomplete entries look like "261328 - Sports Trading Cards"
+        return category_entry.get().split(' - ', 1)[0].strip()
+    
+    def autocomplete_category(event):
+        if event.keysym in ('Up', 'Down', 'Return', 'Escape', 'Tab'):
+            return
+        query = category_entry.get().strip()
+        if len(query) < 2:
+            return
+        matches = get_taxonomy_cache().search(query, limit=15)
+        category_entry['values'] = [f"{c['id']} - {c['name']}" for c in matches]
+    
+    def show_required_aspects(aspects):
+        required = [a['name'] for a in (aspects or []) if a['required']]
+        category = get_taxonomy_cache().get_category(selected_category_id())
+        text = category['path'] if category else "Category not in local cache"
+        if required:
+            text += f"\nRequired specifics: {', '.join(required)}"
+        category_hint.config(text=text)
+    
+    def on_category_selected(event=None):
+        category_id = selected_category_id()
+        if not category_id.isdigit():
+            return
+        aspects = get_taxonomy_cache().get_aspects(category_id, fetch=False)
+        if aspects is not None or not is_configured():
+            show_required_aspects(aspects)
+            return
+        
+        # Fetch aspects once off the UI thread; later lookups are served from cache
+        category_hint.config(text="Loading category details...")
+        result = {}
+        worker = threading.Thread(
+            target=lambda: result.update(aspects=get_taxonomy_cache().get_aspects(category_id)),
+            daemon=True)
+        worker.start()
+        
+        def poll():
+            if worker.is_alive():
+                parent.after(100, poll)
+            else:
+                show_required_aspects(result.get('aspects'))
+        parent.after(100, poll)
+    
+    category_entry.bind('<KeyRelease>', autocomplete_category)
+    category_entry.bind('<<ComboboxSelected>>', on_category_selected)
+    category_entry.bind('<FocusOut>', on_category_selected)
+    
+    def parse_aspects():
+        aspects = {}
+        for line in aspects_text.get("1.0", tk.END).splitlines():
+            if ':' not in line:
+                continue
+            name, value = line.split(':', 1)
+            if name.strip() and value.strip():
+                aspects.setdefault(name.strip(), []).append(value.strip())
+        return aspects
+    
     # Condition
     tk.Label(scrollable_frame, text="Condition *", font=("Arial", 10, "bold"), bg='white').pack(anchor='w', padx=20, pady=(10, 0))
     condition_var = tk.StringVar(value='NEW')
     condition_menu = ttk.Combobox(scrollable_frame, textvariable=condition_var, 
-                                  values=['NEW', 'LIKE_NEW', 'USED_EXCELLENT', 'USED_GOOD', 'USED_ACCEPTABLE'],
+                                  values=list(CONDITIONS),
                                   state='readonly', width=28, font=("Arial", 10))
     condition_menu.pack(anchor='w', padx=20, pady=5)
     
@@ -95,6 +405,7 @@ def create_listings_interface(parent):
         if defaults.get('category_id'):
             category_entry.delete(0, tk.END)
             category_entry.insert(0, defaults['category_id'])
+            on_category_selected()
         if defaults.get('condition'):
             condition_var.set(defaults['condition'])
         if defaults.get('quantity'):
@@ -106,6 +417,15 @@ def create_listings_interface(parent):
                             font=("Arial", 9), bg='#6c757d', fg='white', relief='flat', cursor='hand2', padx=10, pady=5)
     defaults_btn.pack(pady=10, padx=20, anchor='w')
     
+    # Seller account the listing goes out on (see eBay Settings)
+    account_frame = tk.Frame(scrollable_frame, bg='white')
+    account_frame.pack(pady=(10, 0), padx=20, anchor='w')
+    tk.Label(account_frame, text="eBay Account:", font=("Arial", 10), bg='white').pack(side='left')
+    account_var = tk.StringVar(value=default_account())
+    account_menu = ttk.Combobox(account_frame, textvariable=account_var, state='readonly', width=25,
+                                font=("Arial", 10), postcommand=lambda: account_menu.config(values=list_accounts()))
+    account_menu.pack(side='left', padx=5)
+    
     # Status label
     status_label = tk.Label(scrollable_frame, text="", font=("Arial", 10), bg='white', fg='green')
     status_label.pack(pady=5, padx=20)
@@ -125,21 +445,8 @@ def create_listings_interface(parent):
         description = description_text.get("1.0", tk.END).strip()
         price = price_entry.get().strip()
         quantity = quantity_spinbox.get().strip()
-        category = category_entry.get().strip()
-        
-        if not all([title, description, price, category]):
-            messagebox.showerror("Error", "Please fill in all required fields (*)")
-            return
-        
-        try:
-            price_float = float(price)
-            quantity_int = int(quantity)
-        except ValueError:
-            messagebox.showerror("Error", "Price and Quantity must be numbers")
-            return
-        
-        # Create listing via API
-        status_label.config(text="Creating listing...", fg='orange')
+        category = selected_category_id()
+        aspects = parse_aspects()
         
         listing_data = {
             'title': title,
@@ -148,22 +455,70 @@ def create_listings_interface(parent):
             'quantity': quantity,
             'category_id': category,
             'condition': condition_var.get(),
-            'images': selected_images
+            'aspects': aspects,
+            'images': selected_images,
+            'account': account_var.get()
         }
+        draft = drafts_state['current']
+        if draft and set(draft['images']) <= set(selected_images):
+            listing_data['draft_id'] = draft['id']
+        if collage_state['name'] and collage_state['images'] == set(selected_images):
+            listing_data['collage'] = collage_state['name']
+        
+        # Report every problem at once instead of waiting on eBay
+        _, errors = validate_listing(listing_data)
+        missing = get_taxonomy_cache().missing_required_aspects(category, aspects) if not errors else []
+        if missing:
+            errors['aspects'] = f"Missing required item specifics: {', '.join(missing)}"
+        if errors:
+            messagebox.showerror("Error", f"Please fix the following:\n{format_errors(errors)}")
+            return
+        
+        warnings = fetch_quality_warnings(selected_images)
+        if warnings and not messagebox.askyesno(
+                "Photo Quality",
+                "Some photos may need a retake:\n" +
+                "\n".join(f"- {img}: {', '.join(msgs)}" for img, msgs in warnings.items()) +
+                "\n\nCreate the listing anyway?"):
+            return
+        
+        # Create listing via API
+        status_label.config(text="Creating listing...", fg='orange')
         
         try:
             response = requests.post('http://localhost:5000/ebay/create-listing', json=listing_data)
             result = response.json()
             
-            if result.get('success'):
+            if result.get('duplicates'):
+                matches = "\n".join(f"- {d['image']} looks like {d['matches']}" for d in result['duplicates'])
+                if not messagebox.askyesno("Possible Duplicate",
+                                           f"This card may already be listed:\n{matches}\n\nList it anyway?"):
+                    status_label.config(text="Listing cancelled", fg='gray')
+                    return
+                listing_data['allow_duplicates'] = True
+                response = requests.post('http://localhost:5000/ebay/create-listing', json=listing_data)
+                result = response.json()
+            
+            if result.get('duplicate_submission'):
+                status_label.config(text="✓ Already submitted - no second listing created", fg='green')
+            elif result.get('queued'):
+                status_label.config(text="📤 eBay unreachable - listing saved to the outbox", fg='#b8860b')
+                refresh_outbox()
+            elif result.get('success'):
                 status_label.config(text="✓ Listing created successfully!", fg='green')
                 messagebox.showinfo("Success", "Listing created on eBay!")
+            if result.get('success'):
                 # Clear form
                 title_entry.delete(0, tk.END)
                 description_text.delete("1.0", tk.END)
                 price_entry.delete(0, tk.END)
+                collage_state.update(name=None, images=None)
+                # Move on to the next card in the queue
+                load_drafts(max(draft_menu.current(), 0))
             else:
                 error_msg = result.get('error', 'Unknown error')
+                if result.get('errors'):
+                    error_msg = format_errors(result['errors'])
                 status_label.config(text="✗ Failed to create listing", fg='red')
                 messagebox.showerror("Error", f"Failed to create listing:\n{error_msg}")
         except Exception as e:
@@ -176,37 +531,120 @@ def create_listings_interface(parent):
                           relief='flat', cursor='hand2', padx=20, pady=12)
     create_btn.pack(pady=20, padx=20)
     
+    # Listings waiting for connectivity
+    outbox_frame = tk.Frame(scrollable_frame, bg='white')
+    outbox_frame.pack(pady=(0, 10), padx=20, fill='x')
+    outbox_label = tk.Label(outbox_frame, text="", font=("Arial", 9), bg='white', fg='gray',
+                            wraplength=400, justify='left')
+    outbox_label.pack(side='left')
+    
+    def refresh_outbox():
+        try:
+            state = requests.get('http://localhost:5000/outbox', params={'limit': 20}).json()
+        except Exception:
+            outbox_label.config(text="")
+            return
+        counts = state['counts']
+        waiting = counts['pending'] + counts['sending']
+        if not waiting and not counts['failed']:
+            outbox_label.config(text=f"📤 Outbox empty ({counts['sent']} sent)" if counts['sent'] else "", fg='gray')
+            return
+        parts = []
+        if waiting:
+            parts.append(f"{waiting} waiting")
+        if counts['failed']:
+            parts.append(f"{counts['failed']} rejected")
+        text = f"📤 Outbox: {', '.join(parts)}"
+        if state['offline']:
+            text += " - eBay unreachable"
+            if state['next_attempt_at']:
+                text += f", retrying in {max(0, int(state['next_attempt_at'] - time.time()))}s"
+        failed = [e for e in state['entries'] if e['status'] == 'failed']
+        if failed:
+            text += "\n" + "\n".join(f"✗ {e['title']}: {e['last_error']}" for e in failed[:3])
+        outbox_label.config(text=text, fg='red' if counts['failed'] else '#b8860b')
+    
+    def flush_outbox():
+        try:
+            requests.post('http://localhost:5000/outbox/flush')
+        except Exception as e:
+            print(f"Error flushing outbox: {e}")
+        parent.after(2000, refresh_outbox)
+    
+    tk.Button(outbox_frame, text="Send Now", command=flush_outbox,
+              font=("Arial", 9), bg='#e0e0e0', relief='flat', cursor='hand2').pack(side='right')
+    
+    def poll_outbox():
+        refresh_outbox()
+        parent.after(5000, poll_outbox)
+    
     canvas.pack(side="left", fill="both", expand=True)
     scrollbar.pack(side="right", fill="y")
     
-    # Load images on startup
-    load_images(images_listbox)
+    # Load images and card drafts on startup
+    load_drafts()
     load_form_defaults()
+    poll_outbox()
+
+# Change token per listbox so refreshes only fetch what changed
+_image_sync_tokens = {}
 
 def load_images(listbox):
-    """Load uploaded images from server"""
+    """Load uploaded images from server, applying only changes after the first load"""
+    key = str(listbox)
     try:
+        token = _image_sync_tokens.get(key)
+        if token is not None:
+            data = requests.get('http://localhost:5000/images', params={'since': token}).json()
+            if not data.get('reset'):
+                _apply_image_changes(listbox, data.get('added', []), data.get('deleted', []))
+                _image_sync_tokens[key] = data.get('token')
+                return list(listbox.get(0, tk.END))
+        
         response = requests.get('http://localhost:5000/images')
         data = response.json()
         images = data.get('images', [])
+        _image_sync_tokens[key] = data.get('token')
         
         listbox.delete(0, tk.END)
         for img in images:
             listbox.insert(tk.END, img)
-        
-        # Select all by default
-        for i in range(len(images)):
-            listbox.selection_set(i)
+        return images
     except Exception as e:
         print(f"Error loading images: {e}")
+        return list(listbox.get(0, tk.END))
 
-def show_qr_code(url):
-    """Display QR code in a tkinter window with settings"""
-    # Generate QR code
+def _apply_image_changes(listbox, added, deleted):
+    """Insert/remove rows in place so the current selection is kept"""
+    deleted = set(deleted)
+    for i in reversed(range(listbox.size())):
+        if listbox.get(i) in deleted:
+            listbox.delete(i)
+    
+    known = set(listbox.get(0, tk.END))
+    for img in sorted(set(added) - known, reverse=True):
+        # Rows are kept newest first, matching the server order
+        index = 0
+        while index < listbox.size() and listbox.get(index) > img:
+            index += 1
+        listbox.insert(index, img)
+
+def make_qr_image(url):
     qr = qrcode.QRCode(version=1, box_size=10, border=5)
     qr.add_data(url)
     qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
+    return qr.make_image(fill_color="black", back_color="white")
+
+def show_qr_code(url, network=None, update_results=None):
+    """Display QR code in a tkinter window with settings
+    
+    With a NetworkIdentity the code is regenerated whenever the upload URL
+    changes, e.g. after the laptop joins another Wi-Fi network.
+    update_results is a queue the background update check puts its result
+    on; a newer release is offered in a dialog.
+    """
+    # Generate QR code
+    img = make_qr_image(url)
     
     # Create tkinter window
     root = tk.Tk()
@@ -242,6 +680,39 @@ def show_qr_code(url):
                           font=("Arial", 10), fg="gray", bg='white')
     instruction.pack(pady=5)
     
+    def follow_network():
+        # Tk isn't thread-safe, so poll the watcher's cached URL from the Tk loop
+        nonlocal url
+        new_url = network.url()
+        if new_url != url:
+            url = new_url
+            new_photo = ImageTk.PhotoImage(make_qr_image(url))
+            label.config(image=new_photo)
+            label.image = new_photo  # Keep a reference so Tk doesn't drop it
+            url_label.config(text=f"Or visit: {url}")
+            instruction.config(text="Network changed - scan the new QR code with your phone")
+        root.after(2000, follow_network)
+    
+    if network is not None:
+        root.after(2000, follow_network)
+    
+    def offer_update():
+        # The check runs on a worker thread; dialogs have to come from the Tk loop
+        try:
+            update_info = update_results.get_nowait()
+        except queue.Empty:
+            root.after(1000, offer_update)
+            return
+        if update_info and messagebox.askyesno(
+                "Update Available",
+                f"Version {update_info['latest_version']} is available "
+                f"(you have {update_info['current_version']}).\n\n"
+                f"{(update_info.get('release_notes') or '')[:200]}\n\nOpen the download page?"):
+            webbrowser.open(update_info['download_url'])
+    
+    if update_results is not None:
+        root.after(1000, offer_update)
+    
     # Create Listings Tab
     listings_frame = tk.Frame(notebook, bg='white')
     notebook.add(listings_frame, text='Create Listing')
@@ -271,17 +742,37 @@ def show_qr_code(url):
                            font=("Arial", 14, "bold"), bg='white')
     config_label.pack(pady=(10, 5), anchor='w', padx=20)
     
+    # Seller account being edited; type a new name to add one
+    account_frame = tk.Frame(scrollable_frame, bg='white')
+    account_frame.pack(pady=5, anchor='w', padx=20)
+    tk.Label(account_frame, text="Account:", font=("Arial", 10), bg='white').pack(side='left')
+    settings_account_var = tk.StringVar(value=default_account())
+    settings_account_menu = ttk.Combobox(account_frame, textvariable=settings_account_var, values=list_accounts(),
+                                         width=25, font=("Arial", 10))
+    settings_account_menu.pack(side='left', padx=5)
+    
+    def selected_account():
+        return settings_account_var.get().strip() or default_account()
+    
+    def make_default_account():
+        if set_default_account(selected_account()):
+            settings_account_menu.config(values=list_accounts())
+            messagebox.showinfo("Success", f"'{selected_account()}' is now the default account")
+    
+    tk.Button(account_frame, text="Make Default", command=make_default_account,
+              font=("Arial", 9), bg='#e0e0e0', relief='flat', cursor='hand2').pack(side='left', padx=5)
+    
     # Load existing config
-    config = load_config()
+    config = load_config(selected_account())
     
     # Status indicator
     status_frame = tk.Frame(scrollable_frame, bg='white')
     status_frame.pack(pady=5, anchor='w', padx=20)
     
     config_status_label = tk.Label(status_frame, 
-                           text="✓ Configured" if is_configured() else "✗ Not Configured",
+                           text="✓ Configured" if is_configured(selected_account()) else "✗ Not Configured",
                            font=("Arial", 10, "bold"),
-                           fg="green" if is_configured() else "red",
+                           fg="green" if is_configured(selected_account()) else "red",
                            bg='white')
     config_status_label.pack(side='left')
     
@@ -322,6 +813,18 @@ def show_qr_code(url):
     tk.Radiobutton(env_frame, text="Production (Live)", variable=env_var, value='production',
                    font=("Arial", 10), bg='white').pack(side='left')
     
+    def show_account_status(event=None):
+        account_config = load_config(selected_account())
+        configured = is_configured(selected_account())
+        config_status_label.config(text="✓ Configured" if configured else "✗ Not Configured",
+                                   fg="green" if configured else "red")
+        authenticated = bool(account_config.get('user_token'))
+        auth_status_label.config(text=" | ✓ Authenticated" if authenticated else " | ✗ Not Logged In",
+                                 fg="green" if authenticated else "orange")
+        env_var.set(account_config.get('environment', 'sandbox'))
+    
+    settings_account_menu.bind('<<ComboboxSelected>>', show_account_status)
+    
     def save_ebay_config():
         config_data = {
             'app_id': app_id_entry.get().strip(),
@@ -334,8 +837,9 @@ def show_qr_code(url):
             messagebox.showerror("Error", "Please fill in all fields")
             return
         
-        if save_config(config_data):
-            messagebox.showinfo("Success", "eBay configuration saved!")
+        if save_config(config_data, selected_account()):
+            settings_account_menu.config(values=list_accounts())
+            messagebox.showinfo("Success", f"eBay configuration saved for '{selected_account()}'!")
             config_status_label.config(text="✓ Configured", fg="green")
             # Clear sensitive fields
             app_id_entry.delete(0, tk.END)
@@ -348,7 +852,7 @@ def show_qr_code(url):
         """Open browser for eBay OAuth login"""
         import requests as req
         try:
-            response = req.get(f"http://localhost:5000/ebay/login")
+            response = req.get("http://localhost:5000/ebay/login", params={'account': selected_account()})
             data = response.json()
             if data.get('success'):
                 webbrowser.open(data['auth_url'])
@@ -390,7 +894,7 @@ def show_qr_code(url):
     tk.Label(scrollable_frame, text="Default Condition:", font=("Arial", 10), bg='white').pack(anchor='w', padx=20, pady=(10, 0))
     condition_var = tk.StringVar(value=defaults.get('condition', 'NEW'))
     condition_menu = ttk.Combobox(scrollable_frame, textvariable=condition_var, 
-                                  values=['NEW', 'LIKE_NEW', 'USED_EXCELLENT', 'USED_GOOD', 'USED_ACCEPTABLE'],
+                                  values=list(CONDITIONS),
                                   state='readonly', width=47, font=("Arial", 10))
     condition_menu.pack(anchor='w', padx=20, pady=5)
     
@@ -0,0 +1,140 @@
+"""
+Measure how long the app takes to start
+Run: python startup_benchmark.py [--runs N] [--exe path/to/KingCyrusCardsUploader] [--json]
+
+Reports import time per module (parsed from python -X importtime) and
+time-to-first-request: from launching the server until GET /upload/config
+answers. --exe times a packaged build instead of the source tree.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# First-party modules, reported individually even when they are cheap
+LOCAL_MODULES = {os.path.splitext(f)[0] for f in os.listdir(SCRIPT_DIR) if f.endswith('.py')}
+PROBE_URL = 'http://127.0.0.1:5000/upload/config'
+
+
+def parse_importtime(stderr):
+    """[{module, self_us, cumulative_us, depth}] from -X importtime output"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        entries.append({
+            'module': name.strip(),
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us),
+            'depth': depth
+        })
+    return entries
+
+
+def import_times(module='app'):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=SCRIPT_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def summarize_imports(entries, top=15):
+    """Total, the slowest top-level packages and every local module"""
+    total = next((e['cumulative_us'] for e in reversed(entries) if e['depth'] == 0 and e['module'] == 'app'),
+                 sum(e['self_us'] for e in entries))
+    packages = {}
+    for entry in entries:
+        root = entry['module'].split('.')[0]
+        packages[root] = packages.get(root, 0) + entry['self_us']
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    local = sorted(((e['module'], e['cumulative_us']) for e in entries if e['module'] in LOCAL_MODULES),
+                   key=lambda item: item[1], reverse=True)
+    return {
+        'total_ms': round(total / 1000, 1),
+        'slowest_packages_ms': {name: round(us / 1000, 1) for name, us in slowest},
+        'local_modules_ms': {name: round(us / 1000, 1) for name, us in local}
+    }
+
+
+def _server_is_up():
+    try:
+        with urllib.request.urlopen(PROBE_URL, timeout=0.5) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def time_to_first_request(command, timeout=60):
+    """Seconds from launching command until the server answers"""
+    if _server_is_up():
+        raise RuntimeError("Something is already serving on port 5000; stop it first")
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=SCRIPT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            if _server_is_up():
+                return time.perf_counter() - started
+            time.sleep(0.02)
+        raise RuntimeError(f"Server did not answer within {timeout}s")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def run(runs=5, exe=None):
+    command = [exe, '--headless'] if exe else [sys.executable, 'app.py', '--headless']
+    first_request = [time_to_first_request(command) for _ in range(runs)]
+    report = {
+        'command': ' '.join(command),
+        'runs': runs,
+        'first_request_s': {
+            'median': round(statistics.median(first_request), 3),
+            'min': round(min(first_request), 3),
+            'max': round(max(first_request), 3)
+        }
+    }
+    if not exe:
+        # Median import profile across runs by total time
+        profiles = sorted((summarize_imports(import_times()) for _ in range(runs)), key=lambda p: p['total_ms'])
+        report['imports'] = profiles[len(profiles) // 2]
+    return report
+
+
+def print_report(report):
+    print(f"Command: {report['command']} ({report['runs']} runs)")
+    timing = report['first_request_s']
+    print(f"Time to first request: {timing['median']}s median "
+          f"(min {timing['min']}s, max {timing['max']}s)")
+    imports = report.get('imports')
+    if imports:
+        print(f"\nImporting app: {imports['total_ms']} ms")
+        print("Slowest packages (self time):")
+        for name, ms in imports['slowest_packages_ms'].items():
+            print(f"  {name:<30} {ms:>8} ms")
+        print("Local modules (cumulative):")
+        for name, ms in imports['local_modules_ms'].items():
+            print(f"  {name:<30} {ms:>8} ms")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    runs = int(args[args.index('--runs') + 1]) if '--runs' in args else 5
+    exe = args[args.index('--exe') + 1] if '--exe' in args else None
+    report = run(runs, exe)
+    if '--json' in args:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
@@ -0,0 +1,216 @@
+import os
+import threading
+import time
+import zipfile
+from datetime import datetime
+from ebay_config import load_storage_settings
+
+ARCHIVE_DIRNAME = 'archive'
+# Thumbnails, conversions and other files that can be regenerated from originals
+DERIVED_DIRNAME = 'derived'
+
+MB = 1024 * 1024
+DAY = 24 * 3600
+
+
+def _walk_files(folder):
+    """Yield (path, stat) for every regular file under folder"""
+    stack = [folder]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry.path, entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+
+
+def folder_size(folder):
+    return sum(stat.st_size for _, stat in _walk_files(folder))
+
+
+class StorageMaintenance:
+    """Keeps the uploads folder under its quota and age policy
+
+    Each run, in order:
+    1. archives listed images older than archive_after_days into per-day zips
+    2. deletes archive bundles older than delete_archives_after_days (if set)
+    3. evicts derived files, least recently used first, while over quota
+    4. archives the oldest remaining listed images while still over quota
+
+    Unlisted originals are never touched.
+    """
+
+    def __init__(self, catalog, grouper):
+        self.catalog = catalog
+        self.grouper = grouper
+        self.upload_folder = catalog.upload_folder
+        self.archive_folder = os.path.join(self.upload_folder, ARCHIVE_DIRNAME)
+        self.derived_folder = os.path.join(self.upload_folder, DERIVED_DIRNAME)
+        self.last_report = None
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                report = self.run()
+                if report['reclaimed_bytes']:
+                    print(f"🧹 Storage maintenance reclaimed {report['reclaimed_bytes'] / MB:.1f} MB "
+                          f"({report['archived']} archived, {report['evicted']} derived files evicted)")
+            except Exception as e:
+                print(f"Storage maintenance error: {e}")
+            interval = load_storage_settings().get('maintenance_interval_minutes', 30)
+            self._stop.wait(max(1, interval) * 60)
+
+    def usage(self):
+        """Current bytes used by originals, derived files and archives"""
+        usage = {'originals': 0, 'derived': 0, 'archives': 0}
+        for path, stat in _walk_files(self.upload_folder):
+            if path.startswith(self.derived_folder + os.sep):
+                usage['derived'] += stat.st_size
+            elif path.startswith(self.archive_folder + os.sep):
+                usage['archives'] += stat.st_size
+            else:
+                usage['originals'] += stat.st_size
+        usage['total'] = sum(usage.values())
+        return usage
+
+    def run(self, settings=None):
+        """Run one maintenance pass and return a report"""
+        settings = settings or load_storage_settings()
+        quota = settings.get('quota_mb', 0) * MB
+        started = time.time()
+
+        with self._run_lock:
+            before = self.usage()
+            archived = self.archive_listed(older_than=started - settings.get('archive_after_days', 7) * DAY)
+            deleted_bundles = self.delete_old_archives(settings.get('delete_archives_after_days', 0))
+
+            evicted = 0
+            if quota:
+                total = self.usage()['total']
+                if total > quota:
+                    evicted = self.evict_derived(total - quota)
+                    total = self.usage()['total']
+                if total > quota:
+                    archived += self.archive_listed(over_bytes=total - quota)
+
+            after = self.usage()
+            self.last_report = {
+                'ran_at': started,
+                'duration': round(time.time() - started, 3),
+                'archived': archived,
+                'evicted': evicted,
+                'deleted_bundles': deleted_bundles,
+                'before': before,
+                'after': after,
+                'reclaimed_bytes': max(0, before['total'] - after['total']),
+                'over_quota': bool(quota) and after['total'] > quota
+            }
+            return self.last_report
+
+    def _listed_images(self):
+        return self.catalog.execute(
+            """SELECT i.filename, i.uploaded_at, i.size, i.phash FROM images i
+               JOIN drafts d ON d.id = i.draft_id
+               WHERE d.status = 'listed'
+               ORDER BY i.uploaded_at""")
+
+    def archive_listed(self, older_than=None, over_bytes=None):
+        """Move listed images into per-day zip bundles
+
+        With older_than, archives images uploaded before that timestamp; with
+        over_bytes, archives the oldest listed images until that many bytes
+        are freed. Returns the number of images archived.
+        """
+        candidates = []
+        freed = 0
+        for row in self._listed_images():
+            if older_than is not None and row['uploaded_at'] >= older_than:
+                break
+            if over_bytes is not None and freed >= over_bytes:
+                break
+            candidates.append(row)
+            freed += row['size']
+
+        # Group by upload day so each bundle is opened once
+        by_day = {}
+        for row in candidates:
+            day = datetime.fromtimestamp(row['uploaded_at']).strftime('%Y-%m-%d')
+            by_day.setdefault(day, []).append(row)
+
+        os.makedirs(self.archive_folder, exist_ok=True)
+        archived = 0
+        for day, rows in by_day.items():
+            bundle = os.path.join(self.archive_folder, f"{day}.zip")
+            # Rows whose file is in the bundle, written now or by an earlier run
+            bundled = []
+            with zipfile.ZipFile(bundle, 'a', compression=zipfile.ZIP_DEFLATED) as zf:
+                existing = set(zf.namelist())
+                for row in rows:
+                    filepath = os.path.join(self.upload_folder, row['filename'])
+                    if row['filename'] in existing:
+                        bundled.append(row)
+                    elif os.path.exists(filepath):
+                        zf.write(filepath, row['filename'])
+                        bundled.append(row)
+                    else:
+                        print(f"Not archiving {row['filename']}: the original is missing")
+            # Only delete originals once the bundle is closed and flushed
+            for row in bundled:
+                filepath = os.path.join(self.upload_folder, row['filename'])
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                self.catalog.execute(
+                    'INSERT OR REPLACE INTO archived_images (filename, bundle, uploaded_at, archived_at, phash) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (row['filename'], os.path.basename(bundle), row['uploaded_at'], time.time(), row['phash']))
+                self.grouper.remove_image(row['filename'])
+                archived += 1
+        return archived
+
+    def delete_old_archives(self, max_age_days):
+        if not max_age_days or not os.path.isdir(self.archive_folder):
+            return 0
+        cutoff = time.time() - max_age_days * DAY
+        deleted = 0
+        for name in os.listdir(self.archive_folder):
+            path = os.path.join(self.archive_folder, name)
+            if name.endswith('.zip') and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                self.catalog.execute('DELETE FROM archived_images WHERE bundle = ?', (name,))
+                deleted += 1
+        return deleted
+
+    def evict_derived(self, bytes_needed):
+        """Delete derived files, least recently used first, until bytes_needed are freed"""
+        if not os.path.isdir(self.derived_folder):
+            return 0
+        files = sorted(_walk_files(self.derived_folder),
+                       key=lambda item: max(item[1].st_atime, item[1].st_mtime))
+        freed = 0
+        evicted = 0
+        for path, stat in files:
+            if freed >= bytes_needed:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            freed += stat.st_size
+            evicted += 1
+        return evicted